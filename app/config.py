@@ -11,11 +11,91 @@ HF_API_KEY = os.getenv('HF_API_KEY', '')
 
 # LLM Configuration
 LLM_MODEL = os.getenv('LLM_MODEL', 'google/flan-t5-large')
+# "hub" calls the Hugging Face Inference API, "local" runs LLM_MODEL in-process on CPU
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'hub').lower()
+LOCAL_LLM_QUANTIZE = os.getenv('LOCAL_LLM_QUANTIZE', 'false').lower() in ('1', 'true', 'yes')
+LOCAL_LLM_MAX_BATCH_SIZE = int(os.getenv('LOCAL_LLM_MAX_BATCH_SIZE', 8))
+LOCAL_LLM_MAX_WAIT_MS = float(os.getenv('LOCAL_LLM_MAX_WAIT_MS', 10))
+LOCAL_LLM_MAX_INPUT_TOKENS = int(os.getenv('LOCAL_LLM_MAX_INPUT_TOKENS', 512))
+LOCAL_LLM_THREADS = int(os.getenv('LOCAL_LLM_THREADS', 0))  # 0 lets torch decide
+
+# Inference API Client (used by the hub backend)
+LLM_API_URL = os.getenv('LLM_API_URL', 'https://api-inference.huggingface.co/models')
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))  # Retries of 429/503 responses, timeouts and dropped connections
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', 0.5))  # Base delay in seconds, doubled each retry
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 16))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))  # Failed requests in a row that open the circuit
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))  # Seconds to fail fast before trying again
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 
-# Vector Database
+# Embedding Backend ("torch" or "onnx")
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_MAX_LENGTH = int(os.getenv('EMBEDDING_MAX_LENGTH', 256))
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', 0))  # 0 lets ONNX Runtime decide
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', './data/onnx')
+ONNX_QUANTIZE = os.getenv('ONNX_QUANTIZE', 'true').lower() in ('1', 'true', 'yes')
+
+# Vector Database ("local" embedded files, "memory" for tests, or "remote" Qdrant server)
+QDRANT_MODE = os.getenv('QDRANT_MODE', 'local').lower()
+QDRANT_URL = os.getenv('QDRANT_URL', 'http://localhost:6333')
+QDRANT_API_KEY = os.getenv('QDRANT_API_KEY', '')
+QDRANT_PREFER_GRPC = os.getenv('QDRANT_PREFER_GRPC', 'false').lower() in ('1', 'true', 'yes')
+QDRANT_GRPC_PORT = int(os.getenv('QDRANT_GRPC_PORT', 6334))
+QDRANT_TIMEOUT = float(os.getenv('QDRANT_TIMEOUT', 10))
+QDRANT_POOL_SIZE = int(os.getenv('QDRANT_POOL_SIZE', 32))
+
+# Collection Settings (applied to new collections; run `python run.py --migrate` to rebuild existing ones)
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none').lower()  # none, scalar (int8) or binary
+QUANTIZATION_ALWAYS_RAM = os.getenv('QUANTIZATION_ALWAYS_RAM', 'true').lower() in ('1', 'true', 'yes')
+QUANTIZATION_RESCORE = os.getenv('QUANTIZATION_RESCORE', 'true').lower() in ('1', 'true', 'yes')
+QUANTIZATION_OVERSAMPLING = float(os.getenv('QUANTIZATION_OVERSAMPLING', 2.0))
+VECTORS_ON_DISK = os.getenv('VECTORS_ON_DISK', 'false').lower() in ('1', 'true', 'yes')
+HNSW_M = int(os.getenv('HNSW_M', 16))
+HNSW_EF_CONSTRUCT = int(os.getenv('HNSW_EF_CONSTRUCT', 100))
+# Search-time beam width; 0 keeps the server default
+HNSW_EF = int(os.getenv('HNSW_EF', 0))
 VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', './data/vector_db')
 COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'personal_assistant')
+CONVERSATION_COLLECTION_NAME = os.getenv('CONVERSATION_COLLECTION_NAME', f'{COLLECTION_NAME}_conversations')
+
+# Retrieval (results per collection, merged by score)
+RETRIEVAL_DOCUMENT_K = int(os.getenv('RETRIEVAL_DOCUMENT_K', 5))
+RETRIEVAL_CONVERSATION_K = int(os.getenv('RETRIEVAL_CONVERSATION_K', 2))
+
+# Hybrid Retrieval ("hybrid" fuses dense and BM25 results by reciprocal rank, "dense" uses vectors only)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid').lower()
+HYBRID_DENSE_WEIGHT = float(os.getenv('HYBRID_DENSE_WEIGHT', 1.0))
+HYBRID_SPARSE_WEIGHT = float(os.getenv('HYBRID_SPARSE_WEIGHT', 1.0))
+RRF_K = int(os.getenv('RRF_K', 60))
+LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', os.path.join(os.path.dirname(os.path.normpath(VECTOR_DB_PATH)), 'lexical_index.db'))
+
+# Reranking (a local cross-encoder re-scores a wider candidate set and keeps the best few)
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 20))
+RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', 3))
+RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 8))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', 150))
+
+# Conversation Indexing (write-behind, flushed by size or interval)
+CONVERSATION_INDEX_BATCH_SIZE = int(os.getenv('CONVERSATION_INDEX_BATCH_SIZE', 32))
+CONVERSATION_INDEX_INTERVAL = float(os.getenv('CONVERSATION_INDEX_INTERVAL', 2.0))
+CONVERSATION_INDEX_QUEUE_SIZE = int(os.getenv('CONVERSATION_INDEX_QUEUE_SIZE', 1000))
+
+# Embedding Cache
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(os.path.dirname(os.path.normpath(VECTOR_DB_PATH)), 'embedding_cache.db'))
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv('EMBEDDING_CACHE_MEMORY_SIZE', 10000))
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv('EMBEDDING_CACHE_DISK_SIZE', 500000))
+
+# Answer Cache (per process; re-ingestions are shared through the ingest manifest)
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1000))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
 
 # Application Settings
 DEFAULT_TEMPERATURE = float(os.getenv('DEFAULT_TEMPERATURE', 0.7))
@@ -23,6 +103,70 @@ CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
 CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
 MAX_TOKENS = int(os.getenv('MAX_TOKENS', 512))
 
+# Streaming Ingestion (files are parsed page by page or row by row; new chunks are stored in batches of this size)
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 128))
+
+# Uploads (streamed to data/documents in fixed-size blocks; larger uploads are rejected with 413)
+MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', 50))
+
+# Context Packing (retrieved chunks are merged, deduplicated and packed into a token budget)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 300))
+# Leave empty to use the LLM's tokenizer
+CONTEXT_TOKENIZER = os.getenv('CONTEXT_TOKENIZER') or LLM_MODEL
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', 0.9))
+
+# RAG Pipeline ("condense" rephrases follow-ups with an extra LLM call, "single" calls the LLM once)
+RAG_MODE = os.getenv('RAG_MODE', 'single').lower()
+# Query rewrite for "single" mode: "none", "heuristic" or "embedding"
+QUERY_REWRITE = os.getenv('QUERY_REWRITE', 'heuristic').lower()
+
+# Conversation Memory ("window" drops the oldest exchanges, "summary" folds them into a rolling summary)
+MEMORY_MODE = os.getenv('MEMORY_MODE', 'window').lower()
+MEMORY_MAX_TOKENS = int(os.getenv('MEMORY_MAX_TOKENS', 1000))
+SESSION_IDLE_TIMEOUT = float(os.getenv('SESSION_IDLE_TIMEOUT', 1800))
+# Leave empty to keep sessions in memory only
+SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', '')
+SESSION_RETENTION = float(os.getenv('SESSION_RETENTION', 30 * 24 * 3600))
+
+# Bulk Ingestion
+BULK_INGEST_WORKERS = int(os.getenv('BULK_INGEST_WORKERS', os.cpu_count() or 1))
+BULK_INGEST_BATCH_SIZE = int(os.getenv('BULK_INGEST_BATCH_SIZE', 256))
+BULK_INGEST_QUEUE_SIZE = int(os.getenv('BULK_INGEST_QUEUE_SIZE', 32))
+BULK_INGEST_STATE_PATH = os.getenv('BULK_INGEST_STATE_PATH', './data/bulk_ingest_state.jsonl')
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv('QDRANT_UPSERT_BATCH_SIZE', 64))
+INGEST_MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', os.path.join(os.path.dirname(os.path.normpath(VECTOR_DB_PATH)), 'ingest_manifest.db'))
+
+# Shared Resources
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+
+# API Concurrency
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 4))
+QUERY_MAX_IN_FLIGHT = int(os.getenv('QUERY_MAX_IN_FLIGHT', 16))
+QUERY_TIMEOUT = float(os.getenv('QUERY_TIMEOUT', 120))
+RETRY_AFTER_SECONDS = int(os.getenv('RETRY_AFTER_SECONDS', 5))
+
+# Ingestion Jobs (/ingest/* queue jobs in SQLite; each API or UI process runs INGESTION_WORKERS of them at a time)
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))
+INGEST_JOB_DB_PATH = os.getenv('INGEST_JOB_DB_PATH', os.path.join(os.path.dirname(os.path.normpath(VECTOR_DB_PATH)), 'ingest_jobs.db'))
+INGEST_JOB_QUEUE_SIZE = int(os.getenv('INGEST_JOB_QUEUE_SIZE', 1000))
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv('INGEST_JOB_MAX_ATTEMPTS', 3))
+INGEST_JOB_RETRY_DELAY = float(os.getenv('INGEST_JOB_RETRY_DELAY', 10))
+# A running job whose worker stops renewing its lease for this long is picked up again
+INGEST_JOB_LEASE = float(os.getenv('INGEST_JOB_LEASE', 60))
+INGEST_JOB_RETENTION = float(os.getenv('INGEST_JOB_RETENTION', 7 * 24 * 3600))
+
+# Batch Queries (/query/batch)
+QUERY_BATCH_MAX_SIZE = int(os.getenv('QUERY_BATCH_MAX_SIZE', 500))
+QUERY_BATCH_PARALLELISM = int(os.getenv('QUERY_BATCH_PARALLELISM', 4))  # LLM calls in flight per batch
+QUERY_BATCH_MAX_IN_FLIGHT = int(os.getenv('QUERY_BATCH_MAX_IN_FLIGHT', 2))
+QUERY_BATCH_TIMEOUT = float(os.getenv('QUERY_BATCH_TIMEOUT', 1800))
+
+# Observability (Prometheus metrics at /metrics, per-request trace IDs in the logs)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Add a Server-Timing header with each request's stage breakdown
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
 # Create a template .env file if it doesn't exist
 def create_env_example():
     if not os.path.exists('.env.example'):
@@ -34,13 +178,152 @@ HF_API_KEY=your_huggingface_api_key_here
 LLM_MODEL=google/flan-t5-large  # Free model with good performance
 EMBEDDING_MODEL=sentence-transformers/all-MiniLM-L6-v2
 
-# Vector Database
+# LLM Backend (hub or local; local batches concurrent requests for up to LOCAL_LLM_MAX_WAIT_MS)
+LLM_BACKEND=hub
+LOCAL_LLM_QUANTIZE=false
+LOCAL_LLM_MAX_BATCH_SIZE=8
+LOCAL_LLM_MAX_WAIT_MS=10
+LOCAL_LLM_MAX_INPUT_TOKENS=512
+LOCAL_LLM_THREADS=0
+
+# Inference API Client (timeouts in seconds; the circuit opens after LLM_BREAKER_THRESHOLD failures in a row)
+LLM_API_URL=https://api-inference.huggingface.co/models
+LLM_CONNECT_TIMEOUT=5
+LLM_READ_TIMEOUT=60
+LLM_MAX_RETRIES=3
+LLM_RETRY_BACKOFF=0.5
+LLM_POOL_SIZE=16
+LLM_BREAKER_THRESHOLD=5
+LLM_BREAKER_COOLDOWN=30
+
+# Embedding Backend (torch or onnx)
+EMBEDDING_BACKEND=torch
+EMBEDDING_BATCH_SIZE=64
+EMBEDDING_MAX_LENGTH=256
+EMBEDDING_THREADS=0
+ONNX_MODEL_DIR=./data/onnx
+ONNX_QUANTIZE=true
+
+# Vector Database (local, memory or remote; remote is needed for several API workers or API + UI together)
+QDRANT_MODE=local
+QDRANT_URL=http://localhost:6333
+QDRANT_API_KEY=
+QDRANT_PREFER_GRPC=false
+QDRANT_GRPC_PORT=6334
+QDRANT_TIMEOUT=10
+QDRANT_POOL_SIZE=32
+
+# Collection Settings (quantization: none, scalar or binary; rebuild with `python run.py --migrate`)
+VECTOR_QUANTIZATION=none
+QUANTIZATION_ALWAYS_RAM=true
+QUANTIZATION_RESCORE=true
+QUANTIZATION_OVERSAMPLING=2.0
+VECTORS_ON_DISK=false
+HNSW_M=16
+HNSW_EF_CONSTRUCT=100
+HNSW_EF=0
 VECTOR_DB_PATH=./data/vector_db
 COLLECTION_NAME=personal_assistant
+CONVERSATION_COLLECTION_NAME=personal_assistant_conversations
+
+# Retrieval (results per collection, merged by score)
+RETRIEVAL_DOCUMENT_K=5
+RETRIEVAL_CONVERSATION_K=2
+
+# Hybrid Retrieval (hybrid or dense; weights are per ranking in reciprocal rank fusion)
+RETRIEVAL_MODE=hybrid
+HYBRID_DENSE_WEIGHT=1.0
+HYBRID_SPARSE_WEIGHT=1.0
+RRF_K=60
+LEXICAL_INDEX_PATH=./data/lexical_index.db
+
+# Reranking (candidates are scored in batches until the per-request budget runs out)
+RERANK_ENABLED=false
+RERANK_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2
+RERANK_CANDIDATES=20
+RERANK_TOP_N=3
+RERANK_BATCH_SIZE=8
+RERANK_BUDGET_MS=150
+
+# Conversation Indexing (write-behind, flushed by size or interval)
+CONVERSATION_INDEX_BATCH_SIZE=32
+CONVERSATION_INDEX_INTERVAL=2.0
+CONVERSATION_INDEX_QUEUE_SIZE=1000
+
+# Embedding Cache
+EMBEDDING_CACHE_ENABLED=true
+EMBEDDING_CACHE_PATH=./data/embedding_cache.db
+EMBEDDING_CACHE_MEMORY_SIZE=10000
+EMBEDDING_CACHE_DISK_SIZE=500000
+
+# Answer Cache (kept in each process for up to ANSWER_CACHE_TTL seconds; re-ingestion anywhere invalidates it through the ingest manifest)
+ANSWER_CACHE_ENABLED=true
+ANSWER_CACHE_SIZE=1000
+ANSWER_CACHE_TTL=3600
+ANSWER_CACHE_SIMILARITY=0.95
 
 # Application Settings
 DEFAULT_TEMPERATURE=0.7
 CHUNK_SIZE=1000
 CHUNK_OVERLAP=200
 MAX_TOKENS=512
+
+# Streaming Ingestion (chunks embedded and stored per batch, so large files become searchable as they are parsed)
+INGEST_BATCH_SIZE=128
+
+# Uploads (largest accepted file, in megabytes)
+MAX_UPLOAD_MB=50
+
+# Context Packing (budget in tokens of CONTEXT_TOKENIZER; leave it empty to use the LLM's tokenizer)
+CONTEXT_TOKEN_BUDGET=300
+CONTEXT_TOKENIZER=
+CONTEXT_DEDUP_THRESHOLD=0.9
+
+# RAG Pipeline (condense or single; query rewrite: none, heuristic or embedding)
+RAG_MODE=single
+QUERY_REWRITE=heuristic
+
+# Conversation Memory (window or summary; set SESSION_STORE_PATH to keep sessions on disk)
+MEMORY_MODE=window
+MEMORY_MAX_TOKENS=1000
+SESSION_IDLE_TIMEOUT=1800
+SESSION_STORE_PATH=
+SESSION_RETENTION=2592000
+
+# Bulk Ingestion
+BULK_INGEST_WORKERS=4
+BULK_INGEST_BATCH_SIZE=256
+BULK_INGEST_QUEUE_SIZE=32
+BULK_INGEST_STATE_PATH=./data/bulk_ingest_state.jsonl
+QDRANT_UPSERT_BATCH_SIZE=64
+INGEST_MANIFEST_PATH=./data/ingest_manifest.db
+
+# Shared Resources
+WARMUP_ON_STARTUP=true
+
+# API Concurrency
+INFERENCE_WORKERS=4
+QUERY_MAX_IN_FLIGHT=16
+QUERY_TIMEOUT=120
+RETRY_AFTER_SECONDS=5
+
+# Ingestion Jobs (failed jobs are retried after INGEST_JOB_RETRY_DELAY seconds, doubling per attempt; finished jobs are kept for INGEST_JOB_RETENTION seconds)
+INGESTION_WORKERS=2
+INGEST_JOB_DB_PATH=./data/ingest_jobs.db
+INGEST_JOB_QUEUE_SIZE=1000
+INGEST_JOB_MAX_ATTEMPTS=3
+INGEST_JOB_RETRY_DELAY=10
+INGEST_JOB_LEASE=60
+INGEST_JOB_RETENTION=604800
+
+# Batch Queries (QUERY_BATCH_PARALLELISM LLM calls per batch, QUERY_BATCH_MAX_IN_FLIGHT batches at once)
+QUERY_BATCH_MAX_SIZE=500
+QUERY_BATCH_PARALLELISM=4
+QUERY_BATCH_MAX_IN_FLIGHT=2
+QUERY_BATCH_TIMEOUT=1800
+
+# Observability (Prometheus metrics at /metrics; Server-Timing adds each request's stage breakdown)
+METRICS_ENABLED=true
+SERVER_TIMING_ENABLED=false
+LOG_LEVEL=INFO
 """) 
\ No newline at end of file
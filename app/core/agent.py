@@ -1,20 +1,51 @@
 import sys
 import os
-from typing import List, Dict, Any
+import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
+import numpy as np
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document, HumanMessage, BaseMessage, format_document, get_buffer_string
+from langchain.llms.base import BaseLLM
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import ANSWER_CACHE_ENABLED, RAG_MODE, QUERY_REWRITE, QUERY_BATCH_PARALLELISM
 from app.core.memory import MemoryManager
-from app.core.llm import get_llm
+from app.core.sessions import SessionMemory, count_tokens
+from app.core.metrics import stage, LLM_TOKENS
+from app.core.answer_cache import source_identity
+
+# Questions that only make sense given the conversation so far
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|its|this|that|these|those|they|them|their|he|she|him|her|there|then|above|previous|earlier)\b", re.IGNORECASE)
+
+# How much the previous question pulls an embedding-rewritten query towards it
+HISTORY_WEIGHT = 0.3
+
+RAG_MODES = ("condense", "single")
+# Conversation used by callers that don't pass a session ID
+DEFAULT_SESSION = "default"
+QUERY_REWRITES = ("none", "heuristic", "embedding")
 
 class AssistantAgent:
     """Orchestrates the assistant's functionality, managing RAG and tools."""
     
-    def __init__(self):
-        self.memory_manager = MemoryManager()
+    def __init__(self, memory_manager: MemoryManager = None, rag_mode: str = RAG_MODE, query_rewrite: str = QUERY_REWRITE):
+        if rag_mode not in RAG_MODES:
+            raise ValueError(f"Unsupported RAG mode: {rag_mode}")
+        if query_rewrite not in QUERY_REWRITES:
+            raise ValueError(f"Unsupported query rewrite: {query_rewrite}")
+        
+        self.rag_mode = rag_mode
+        self.query_rewrite = query_rewrite
+        self.memory_manager = memory_manager or MemoryManager()
         self.rag_chain = self.memory_manager.create_rag_chain()
-        self.llm = get_llm()
+        self.llm = self.memory_manager.llm
+        self.answer_cache = self.memory_manager.resources.answer_cache if ANSWER_CACHE_ENABLED else None
+        self.sessions = self.memory_manager.resources.sessions
+        self.context_assembler = self.memory_manager.resources.context_assembler
         
         # Define a system prompt template
         self.system_template = """You are a personal AI assistant that helps the user with their tasks and questions.
@@ -36,16 +67,248 @@ Assistant:"""
             template=self.system_template
         )
     
-    def query(self, question: str) -> Dict[str, Any]:
-        """Process a user query and return a response."""
-        # Use the RAG chain to get an answer
-        response = self.rag_chain({"question": question})
+    def query(
+        self,
+        question: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """Process a user query and return a response.
+        
+        In "condense" mode the question is first rephrased by the LLM, as
+        ConversationalRetrievalChain does; in "single" mode retrieval uses the
+        question as is (or a cheap local rewrite) and the LLM is called once.
+        The response includes the time spent in each stage, in seconds, and
+        how many tokens packing the retrieved chunks saved (see ContextAssembler).
+        filters restricts retrieval by chunk metadata (see build_filter) and
+        weights overrides the dense/sparse fusion weights of hybrid retrieval.
+        """
+        start = time.perf_counter()
+        memory = self.sessions.get(session_id)
+        
+        cached = self._get_cached(question, memory, filters, weights)
+        if cached is not None:
+            memory.save_context({"question": question}, {"answer": cached["answer"]})
+            return {**cached, "cached": True, "timings": {"total": round(time.perf_counter() - start, 4)}}
         
-        # Extract the answer and source documents
-        answer = response["answer"]
-        source_docs = response["source_documents"] if "source_documents" in response else []
+        chat_history = memory.load_memory_variables({})["chat_history"]
+        timings = {}
+        search_query, source_docs = self._retrieve(question, chat_history, timings, filters, weights)
+        source_docs, context = self._pack(source_docs, timings)
+        
+        with stage("generate", timings):
+            if self.rag_mode == "condense":
+                # The chain builds the prompt itself; its context and question make up nearly all of it
+                prompt = "\n\n".join([doc.page_content for doc in source_docs] + [search_query])
+                answer = self.rag_chain.combine_docs_chain.run(input_documents=source_docs, question=search_query)
+            else:
+                prompt = self._build_prompt(question, chat_history, source_docs)
+                answer = self.llm.invoke(prompt)
+        self._count_tokens(prompt, answer)
+        
+        result = {
+            "answer": answer,
+            "sources": self._format_sources(source_docs)
+        }
+        self._put_cached(question, result, source_docs, memory, filters, weights)
+        with stage("memory_write", timings):
+            memory.save_context({"question": question}, {"answer": answer})
+        timings["total"] = round(time.perf_counter() - start, 4)
+        return {**result, "cached": False, "timings": timings, "context": context}
+    
+    def query_batch(
+        self,
+        questions: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        retrieval_only: bool = False,
+        parallelism: int = QUERY_BATCH_PARALLELISM
+    ) -> Iterator[Dict[str, Any]]:
+        """Answer many independent questions, yielding each result as it completes.
         
-        # Format source documents for display
+        All questions are embedded in one batch and searched with one batch
+        request per collection, then up to parallelism LLM calls run at once.
+        The questions share no conversation: session memory and the answer
+        cache are neither read nor written. With retrieval_only the LLM is
+        skipped and results carry only the sources.
+        
+        Yields a "result" event per question, with its index in questions,
+        in completion order (a failed LLM call gives an "error" instead of
+        ending the batch), then a "done" event with the batch's timings.
+        """
+        start = time.perf_counter()
+        timings = {}
+        with stage("retrieve", timings):
+            retrieved = self.memory_manager.retrieve_batch(questions, filters, weights)
+        with stage("pack", timings):
+            packed = [self.context_assembler.assemble(docs) for docs in retrieved]
+        
+        def result(i: int, **fields) -> Dict[str, Any]:
+            docs, context = packed[i]
+            return {"type": "result", "index": i, "question": questions[i], "sources": self._format_sources(docs), "context": context, **fields}
+        
+        def generate(i: int) -> Tuple[str, Dict[str, float]]:
+            docs, item_timings = packed[i][0], {}
+            with stage("generate", item_timings):
+                if self.rag_mode == "condense":
+                    prompt = "\n\n".join([doc.page_content for doc in docs] + [questions[i]])
+                    answer = self.rag_chain.combine_docs_chain.run(input_documents=docs, question=questions[i])
+                else:
+                    prompt = self._build_prompt(questions[i], [], docs)
+                    answer = self.llm.invoke(prompt)
+            self._count_tokens(prompt, answer)
+            return answer, item_timings
+        
+        errors = 0
+        if retrieval_only:
+            for i in range(len(questions)):
+                yield result(i)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="batch-generate") as pool:
+                # Each call runs in its own copy of the caller's context, for the request's trace ID
+                futures = {pool.submit(contextvars.copy_context().run, generate, i): i for i in range(len(questions))}
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            answer, item_timings = future.result()
+                        except Exception as e:
+                            errors += 1
+                            yield result(futures[future], error=str(e))
+                            continue
+                        yield result(futures[future], answer=answer, timings=item_timings)
+                finally:
+                    # If the consumer stops early, questions not started yet are dropped
+                    for future in futures:
+                        future.cancel()
+        
+        timings["total"] = round(time.perf_counter() - start, 4)
+        yield {"type": "done", "questions": len(questions), "errors": errors, "timings": timings}
+    
+    def _retrieve(
+        self,
+        question: str,
+        chat_history: List[BaseMessage],
+        timings: Dict[str, float],
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[str, List[Document]]:
+        """Rewrite the question for search if needed and retrieve its documents."""
+        search_query, vector = question, None
+        with stage("rewrite", timings):
+            if chat_history:
+                if self.rag_mode == "condense":
+                    search_query = self.rag_chain.question_generator.run(
+                        question=question, chat_history=get_buffer_string(chat_history)
+                    )
+                elif self.query_rewrite == "heuristic":
+                    search_query = self._heuristic_rewrite(question, chat_history)
+                elif self.query_rewrite == "embedding":
+                    vector = self._embedding_rewrite(question, chat_history)
+        
+        with stage("retrieve", timings):
+            if vector is not None:
+                source_docs = self.memory_manager.retrieve_by_vector(vector, filters=filters, query=question, weights=weights)
+            else:
+                source_docs = self.memory_manager.retrieve(search_query, filters, weights)
+        return search_query, source_docs
+    
+    def _pack(self, source_docs: List[Document], timings: Dict[str, float]) -> Tuple[List[Document], Dict[str, int]]:
+        """Merge, deduplicate and trim the retrieved chunks to the context token budget."""
+        with stage("pack", timings):
+            packed, context = self.context_assembler.assemble(source_docs)
+        return packed, context
+    
+    def _count_tokens(self, prompt: str, answer: str):
+        """Add an LLM call's estimated prompt and completion tokens to the token counters."""
+        LLM_TOKENS.inc(count_tokens(prompt), direction="prompt")
+        LLM_TOKENS.inc(count_tokens(answer), direction="completion")
+    
+    def _last_question(self, chat_history: List[BaseMessage]) -> Optional[str]:
+        """Return the user's previous question, if any."""
+        for message in reversed(chat_history):
+            if isinstance(message, HumanMessage):
+                return message.content
+        return None
+    
+    def _heuristic_rewrite(self, question: str, chat_history: List[BaseMessage]) -> str:
+        """Prefix follow-up questions with the previous question so the search has a subject."""
+        last_question = self._last_question(chat_history)
+        if last_question and (FOLLOW_UP_PATTERN.search(question) or len(question.split()) <= 3):
+            return f"{last_question} {question}"
+        return question
+    
+    def _embedding_rewrite(self, question: str, chat_history: List[BaseMessage]) -> List[float]:
+        """Blend the question's embedding with the previous question's."""
+        embeddings = self.memory_manager.embeddings
+        vector = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+        last_question = self._last_question(chat_history)
+        if last_question:
+            vector = vector + HISTORY_WEIGHT * np.asarray(embeddings.embed_query(last_question), dtype=np.float32)
+        return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+    
+    def _build_prompt(self, question: str, chat_history: List[BaseMessage], source_docs: List[Document]) -> str:
+        """Fill the assistant's prompt with the retrieved context and the conversation."""
+        return self.rag_prompt.format(
+            context="\n\n".join(doc.page_content for doc in source_docs),
+            chat_history=get_buffer_string(chat_history),
+            question=question
+        )
+    
+    def _condensed_prompt(self, search_query: str, source_docs: List[Document]) -> str:
+        """Fill the RAG chain's answer prompt the way its combine-documents step does."""
+        chain = self.rag_chain.combine_docs_chain
+        return chain.llm_chain.prompt.format(**{
+            chain.document_variable_name: chain.document_separator.join(
+                format_document(doc, chain.document_prompt) for doc in source_docs
+            ),
+            "question": search_query
+        })
+    
+    def _cacheable(
+        self,
+        question: str,
+        memory: SessionMemory,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> bool:
+        """Whether a question's answer can be shared regardless of the conversation."""
+        # Answers are cached for default searches only
+        if self.answer_cache is None or filters or weights:
+            return False
+        if FOLLOW_UP_PATTERN.search(question):
+            return not memory.load_memory_variables({})["chat_history"]
+        return True
+    
+    def _get_cached(
+        self,
+        question: str,
+        memory: SessionMemory,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Look up an earlier answer to the same or a near-identical question."""
+        if not self._cacheable(question, memory, filters, weights):
+            return None
+        return self.answer_cache.get(question)
+    
+    def _put_cached(
+        self,
+        question: str,
+        result: Dict[str, Any],
+        source_docs: List[Document],
+        memory: SessionMemory,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ):
+        """Cache an answer along with the documents it was built from."""
+        if not self._cacheable(question, memory, filters, weights):
+            return
+        sources: Set[str] = {source_identity(doc.metadata) for doc in source_docs}
+        self.answer_cache.put(question, result, sources)
+    
+    def _format_sources(self, source_docs: List[Document]) -> List[Dict[str, Any]]:
+        """Format source documents for display."""
         sources = []
         for doc in source_docs:
             metadata = doc.metadata
@@ -56,18 +319,75 @@ Assistant:"""
                 "page": metadata.get("page", "N/A") if "page" in metadata else None
             })
         
-        return {
-            "answer": answer,
-            "sources": sources
-        }
+        return sources
+    
+    def stream_query(
+        self,
+        question: str,
+        session_id: str = DEFAULT_SESSION,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Process a user query as a stream of events.
+        
+        Yields a "sources" event as soon as retrieval is done, then "token"
+        events with pieces of the answer, then a final "done" event with the
+        full answer. LLMs that can't stream have their answer sent in chunks.
+        The prompt follows rag_mode as in query(): in "condense" mode it is
+        the RAG chain's prompt for the rephrased question.
+        """
+        start = time.perf_counter()
+        memory = self.sessions.get(session_id)
+        
+        cached = self._get_cached(question, memory, filters, weights)
+        if cached is not None:
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "text": cached["answer"]}
+            memory.save_context({"question": question}, {"answer": cached["answer"]})
+            yield {"type": "done", "answer": cached["answer"], "cached": True, "timings": {"total": round(time.perf_counter() - start, 4)}}
+            return
+        
+        chat_history = memory.load_memory_variables({})["chat_history"]
+        timings = {}
+        search_query, source_docs = self._retrieve(question, chat_history, timings, filters, weights)
+        source_docs, context = self._pack(source_docs, timings)
+        yield {"type": "sources", "sources": self._format_sources(source_docs)}
+        
+        if self.rag_mode == "condense":
+            prompt = self._condensed_prompt(search_query, source_docs)
+        else:
+            prompt = self._build_prompt(question, chat_history, source_docs)
+        stage_start = time.perf_counter()
+        pieces = []
+        with stage("generate", timings):
+            for piece in self._stream_llm(prompt):
+                if not pieces:
+                    timings["first_token"] = round(time.perf_counter() - stage_start, 4)
+                pieces.append(piece)
+                yield {"type": "token", "text": piece}
+        
+        answer = "".join(pieces)
+        self._count_tokens(prompt, answer)
+        self._put_cached(question, {"answer": answer, "sources": self._format_sources(source_docs)}, source_docs, memory, filters, weights)
+        with stage("memory_write", timings):
+            memory.save_context({"question": question}, {"answer": answer})
+        timings["total"] = round(time.perf_counter() - start, 4)
+        yield {"type": "done", "answer": answer, "cached": False, "timings": timings, "context": context}
+    
+    def _stream_llm(self, prompt: str) -> Iterator[str]:
+        """Stream the LLM's output, falling back to chunking the full answer."""
+        if type(self.llm)._stream is not BaseLLM._stream:
+            yield from self.llm.stream(prompt)
+            return
+        
+        # The backend can't stream, so send the finished answer word by word
+        answer = self.llm.invoke(prompt)
+        yield from re.findall(r"\s*\S+", answer)
     
     def add_conversation_to_memory(self, question: str, answer: str):
-        """Add a conversation exchange to the memory for future context."""
-        # Create metadata for the conversation
-        metadata = {
-            "type": "conversation",
-            "question": question
-        }
+        """Add a conversation exchange to the memory for future context.
         
-        # Add the exchange to the vector store
-        self.memory_manager.add_texts([answer], [metadata]) 
\ No newline at end of file
+        The exchange is queued and indexed into the conversations collection
+        in the background, so this returns at once.
+        """
+        self.memory_manager.resources.conversation_indexer.submit(question, answer)
\ No newline at end of file
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+import numpy as np
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY
+
+# Logged in the manifest for a change with no documents, which still invalidates answers without sources
+NO_SOURCES = ""
+
+def source_identity(metadata: Dict[str, Any]) -> str:
+    """Identify the document a chunk came from, stable across re-uploads."""
+    return metadata.get("original_name") or metadata.get("source") or "Unknown"
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact matching."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+class _Entry:
+    """One cached answer."""
+    
+    def __init__(self, response: Dict[str, Any], vector: Optional[np.ndarray], sources: Set[str]):
+        self.response = response
+        self.vector = vector
+        self.sources = sources
+        self.created_at = time.time()
+
+class AnswerCache:
+    """Caches answers for repeated and near-duplicate questions.
+    
+    A question matches an entry on its normalized text, or when the cosine
+    similarity of the query embeddings is above the threshold. Entries expire
+    after a TTL, the least recently used ones are evicted first, and entries
+    are dropped when a document they cite is re-ingested.
+    
+    The entries live in this process, but with a manifest, re-ingestions
+    are logged in it and every lookup first catches up on the changes
+    logged since the last one, so ingesting in one process (a worker, a
+    bulk ingest) invalidates the answers cached by all of them.
+    """
+    
+    def __init__(
+        self,
+        embeddings,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        manifest=None
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.manifest = manifest
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = manifest.changes_since(0)[0] if manifest is not None else 0
+        self.hits = 0
+        self.misses = 0
+    
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """Embed a question as a unit vector, or None if semantic matching is off."""
+        if self.similarity >= 1:
+            return None
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+    
+    def _expire(self):
+        """Drop entries older than the TTL."""
+        cutoff = time.time() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry.created_at < cutoff]:
+            del self._entries[key]
+    
+    def _sync(self) -> int:
+        """Drop the answers citing documents changed, in any process, since the last sync."""
+        if self.manifest is None:
+            return 0
+        generation, changed = self.manifest.changes_since(self._generation)
+        if generation == self._generation:
+            return 0
+        dropped = self._drop(changed)
+        with self._lock:
+            self._generation = max(self._generation, generation)
+        return dropped
+    
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for a question, if there is one."""
+        self._sync()
+        key = normalize_question(question)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry.vector is not None]
+        
+        vector = self._embed(question) if candidates else None
+        if vector is not None:
+            scores = np.stack([entry.vector for _, entry in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                with self._lock:
+                    best_key, entry = candidates[best]
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                        self.hits += 1
+                        return entry.response
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, question: str, response: Dict[str, Any], sources: Iterable[str]):
+        """Cache a response together with the documents it was built from."""
+        entry = _Entry(response, self._embed(question), set(sources))
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """Drop answers built from any of the given documents, and answers with no sources.
+        
+        Answers without sources are dropped too, since new content may be
+        exactly what they were missing. With a manifest the change is logged
+        there for the other processes. Returns the number of entries dropped.
+        """
+        sources = set(sources)
+        if self.manifest is None:
+            return self._drop(sources)
+        # Logged even with no documents, so every process drops its answers without sources
+        self.manifest.record_changes(sources or {NO_SOURCES}, keep=self.ttl)
+        return self._sync()
+    
+    def _drop(self, sources: Iterable[str]) -> int:
+        sources = set(sources)
+        with self._lock:
+            stale: List[str] = [
+                key for key, entry in self._entries.items()
+                if not entry.sources or entry.sources & sources
+            ]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+    
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the number of entries."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    BULK_INGEST_WORKERS,
+    BULK_INGEST_BATCH_SIZE,
+    BULK_INGEST_QUEUE_SIZE,
+    BULK_INGEST_STATE_PATH
+)
+from app.core.ingestion import LOADERS, DocumentProcessor, load_and_split
+from app.core.memory import MemoryManager
+from app.core.metrics import stage, INGESTED_CHUNKS
+from app.utils.helpers import file_sha256
+
+# Marks the end of the chunk stream
+_DONE = object()
+# Seconds a full queue is waited on before checking that the embedding thread is still running
+QUEUE_PUT_TIMEOUT = 1.0
+
+def file_fingerprint(file_path: str) -> str:
+    """Identify a file version by its path, size and modification time."""
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def parse_file(file_path: str) -> Tuple[str, List[str], List[Dict[str, Any]]]:
+    """Hash, load and split a file in a pool worker."""
+    texts, metadatas = load_and_split(file_path)
+    return file_sha256(file_path), texts, metadatas
+
+def print_progress(completed: int, total: int, file_path: str, error: Optional[str] = None):
+    """Default progress reporter for bulk ingestion."""
+    status = f"failed: {error}" if error else "done"
+    print(f"[{completed}/{total}] {file_path} {status}")
+
+class BulkIngestor:
+    """Ingests whole directories of documents.
+    
+    Files are parsed and split in a process pool, their chunks flow through
+    a bounded queue into batched embedding, and the vectors are upserted into
+    Qdrant in fixed-size batches. Every finished file is checkpointed so an
+    interrupted run resumes where it stopped, and files go through the same
+    manifest as DocumentProcessor so only new or changed chunks are embedded.
+    """
+    
+    def __init__(
+        self,
+        memory_manager: MemoryManager,
+        workers: int = None,
+        batch_size: int = BULK_INGEST_BATCH_SIZE,
+        queue_size: int = BULK_INGEST_QUEUE_SIZE,
+        state_path: str = BULK_INGEST_STATE_PATH,
+        progress: Callable[[int, int, str, Optional[str]], None] = None
+    ):
+        self.memory_manager = memory_manager
+        self.processor = DocumentProcessor(memory_manager)
+        self.workers = max(1, workers or BULK_INGEST_WORKERS)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.state_path = state_path
+        self.progress = progress or print_progress
+    
+    def find_files(self, directory: str) -> List[str]:
+        """Return every supported file under a directory."""
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        
+        file_paths = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in LOADERS:
+                    file_paths.append(os.path.join(root, name))
+        return sorted(file_paths)
+    
+    def _load_state(self) -> Set[str]:
+        """Read the fingerprints of files finished by earlier runs."""
+        if not os.path.exists(self.state_path):
+            return set()
+        
+        done = set()
+        with open(self.state_path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["fingerprint"])
+                except (ValueError, KeyError):
+                    # A torn last line from a crash; that file will simply be redone
+                    continue
+        return done
+    
+    def _mark_done(self, fingerprint: str):
+        """Checkpoint a file once all of its chunks are stored."""
+        with open(self.state_path, "a") as f:
+            f.write(json.dumps({"fingerprint": fingerprint, "finished_at": time.time()}) + "\n")
+    
+    def ingest_directory(self, directory: str) -> Dict[str, Any]:
+        """Ingest every supported file under a directory and return a summary.
+        
+        If the embedding thread dies, parsing stops and its error is raised.
+        """
+        files = self.find_files(directory)
+        done = self._load_state()
+        pending = [(path, fingerprint) for path, fingerprint in ((path, file_fingerprint(path)) for path in files)
+                   if fingerprint not in done]
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        summary = {
+            "files": len(files),
+            "skipped": len(files) - len(pending),
+            "ingested": 0,
+            "chunks": 0,
+            "failed": {},
+            "seconds": 0.0
+        }
+        start = time.perf_counter()
+        
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        consumer_errors = []
+        
+        def consume():
+            try:
+                self._consume(chunk_queue, summary, len(pending))
+            except BaseException as e:
+                consumer_errors.append(e)
+        
+        consumer = threading.Thread(target=consume, daemon=True)
+        consumer.start()
+        
+        def put(item):
+            # Without a consumer a full queue never drains, so don't wait on it forever
+            while True:
+                try:
+                    chunk_queue.put(item, timeout=QUEUE_PUT_TIMEOUT)
+                    return
+                except queue.Full:
+                    if not consumer.is_alive():
+                        raise RuntimeError("Bulk ingestion stopped: the embedding thread died") from (consumer_errors or [None])[0]
+        
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                remaining = iter(pending)
+                in_flight = {}
+                
+                def submit_next():
+                    item = next(remaining, None)
+                    if item is not None:
+                        in_flight[pool.submit(parse_file, item[0])] = item
+                
+                # Keep only a small window of files parsing ahead of the embedder
+                for _ in range(self.workers * 2):
+                    submit_next()
+                
+                while in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        path, fingerprint = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            put(("error", path, fingerprint, str(e)))
+                        else:
+                            put(("chunks", path, fingerprint, result))
+                        submit_next()
+        finally:
+            if consumer.is_alive():
+                put(_DONE)
+            consumer.join()
+        if consumer_errors:
+            raise consumer_errors[0]
+        
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        return summary
+    
+    def _consume(self, chunk_queue: queue.Queue, summary: Dict[str, Any], total: int):
+        """Embed and upsert chunks from the queue in batches."""
+        batch = []
+        remaining = {}
+        fingerprints = {}
+        commits = {}
+        completed = 0
+        
+        def finish(path: str, error: Optional[str] = None):
+            nonlocal completed
+            completed += 1
+            commit = commits.pop(path, None)
+            if error is None and commit is not None:
+                try:
+                    self.processor.commit_chunks(*commit)
+                except Exception as e:
+                    error = str(e)
+            if error:
+                summary["failed"][path] = error
+            else:
+                summary["ingested"] += 1
+                self._mark_done(fingerprints[path])
+            self.progress(completed, total, path, error)
+        
+        def flush():
+            if not batch:
+                return
+            paths, texts, metadatas, ids = zip(*batch)
+            batch.clear()
+            try:
+                with stage("embed"):
+                    vectors = self.memory_manager.embeddings.embed_documents(list(texts))
+                self.memory_manager.add_embeddings(list(texts), vectors, list(metadatas), list(ids))
+                INGESTED_CHUNKS.inc(len(texts))
+            except Exception as e:
+                for path in set(paths):
+                    if path in remaining:
+                        del remaining[path]
+                        finish(path, str(e))
+                return
+            
+            for path in paths:
+                summary["chunks"] += 1
+                remaining[path] -= 1
+                if remaining[path] == 0:
+                    del remaining[path]
+                    finish(path)
+        
+        while True:
+            item = chunk_queue.get()
+            if item is _DONE:
+                break
+            
+            kind, path, fingerprint, result = item
+            fingerprints[path] = fingerprint
+            if kind == "error":
+                finish(path, result)
+                continue
+            
+            content_hash, texts, metadatas = result
+            source_key = self.processor.source_key(path)
+            if self.processor.manifest.get_content_hash(source_key) == content_hash:
+                # Same content as the stored version (e.g. only the mtime changed)
+                finish(path)
+                continue
+            
+            try:
+                ids, new_indices, stale_ids = self.processor.plan_chunks(source_key, texts, metadatas)
+            except Exception as e:
+                finish(path, str(e))
+                continue
+            
+            commits[path] = (source_key, content_hash, ids, metadatas, stale_ids)
+            if not new_indices:
+                finish(path)
+                continue
+            
+            remaining[path] = len(new_indices)
+            for i in new_indices:
+                # Deterministic IDs make re-running a partially stored file idempotent
+                batch.append((path, texts[i], metadatas[i], ids[i]))
+                if len(batch) >= self.batch_size:
+                    flush()
+                    if path not in remaining:
+                        # The file failed in this flush; drop the rest of its chunks
+                        break
+        
+        flush()
@@ -0,0 +1,151 @@
+import os
+import sys
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+# Returned by next() once a generator is exhausted
+_END = object()
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import RETRY_AFTER_SECONDS
+
+class Overloaded(Exception):
+    """Raised when an endpoint already has its maximum number of requests in flight."""
+    
+    def __init__(self, name: str, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(f"Too many concurrent {name} requests, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class StreamSlot:
+    """A slot held for one streamed response.
+    
+    EndpointLimiter.stream releases it when the stream ends. A response whose
+    body never starts, e.g. because the client disconnected first, never
+    runs the stream, so release_if_unused must be called once it is over.
+    """
+    
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+        self._lock = threading.Lock()
+        self._released = False
+        self.started = False
+    
+    def release(self, _future=None):
+        """Give the slot back; later calls do nothing."""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+    
+    def release_if_unused(self):
+        """Give the slot back unless a stream took it over."""
+        if not self.started:
+            self.release()
+
+class EndpointLimiter:
+    """Runs an endpoint's blocking work on an executor with bounded concurrency.
+    
+    Requests beyond max_in_flight (running plus queued) are rejected at once
+    instead of piling up, and each call is bounded by a timeout.
+    """
+    
+    def __init__(self, name: str, executor: ThreadPoolExecutor, max_in_flight: int, timeout: Optional[float] = None):
+        self.name = name
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently running or queued."""
+        return self._in_flight
+    
+    def acquire(self):
+        """Take a slot for one request, raising Overloaded if none is free."""
+        if not self._slots.acquire(blocking=False):
+            raise Overloaded(self.name)
+        with self._lock:
+            self._in_flight += 1
+    
+    def acquire_stream(self) -> StreamSlot:
+        """Take a slot for a streamed response, raising Overloaded if none is free."""
+        self.acquire()
+        return StreamSlot(self._release)
+    
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+    
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the executor and await its result.
+        
+        Raises Overloaded when the endpoint is full and asyncio.TimeoutError
+        when the call takes longer than the timeout.
+        """
+        self.acquire()
+        
+        try:
+            # Run in the caller's context so the request's trace ID and stage timings carry over
+            future = self.executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        
+        # The slot is only freed once the work has actually stopped
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # Drops the call if it is still queued; a running call finishes in the background
+            future.cancel()
+            raise
+    
+    async def stream(self, slot: StreamSlot, func: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Iterate a blocking generator on the executor, one item at a time.
+        
+        slot comes from acquire_stream() and is released when the stream
+        ends. The timeout applies to the stream as a whole.
+        """
+        slot.started = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        # Every step runs in the caller's context, one at a time
+        context = contextvars.copy_context()
+        iterator = None
+        pending = None
+        
+        def advance():
+            nonlocal iterator
+            if iterator is None:
+                iterator = iter(func(*args, **kwargs))
+            return next(iterator, _END)
+        
+        def finish(_future=None):
+            if iterator is not None:
+                iterator.close()
+            slot.release()
+        
+        try:
+            while True:
+                pending = self.executor.submit(context.run, advance)
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                item = await asyncio.wait_for(asyncio.wrap_future(pending), remaining)
+                if item is _END:
+                    break
+                yield item
+        finally:
+            if pending is not None and not pending.done() and not pending.cancel():
+                # Still producing an item; close the generator once that step returns
+                pending.add_done_callback(finish)
+            else:
+                finish()
@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain.schema import Document
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_DEDUP_THRESHOLD
+from app.core.sessions import count_tokens
+
+# Shortest text shared by two chunks that counts as their overlap
+MIN_OVERLAP_CHARS = 20
+
+logger = logging.getLogger(__name__)
+
+def load_token_counter(model_name: str = CONTEXT_TOKENIZER) -> Callable[[str], int]:
+    """Count tokens with the model's own tokenizer, or estimate them if it can't be loaded."""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        logger.warning("Could not load the %s tokenizer (%s); estimating token counts instead.", model_name, e)
+        return count_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+def merge_overlapping(first: str, second: str) -> Optional[str]:
+    """Join two consecutive chunks, writing the text they share only once.
+    
+    Returns None when the second chunk doesn't start with the end of the first.
+    """
+    head = second[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return None
+    # Longest overlap first: it is the one the splitter made
+    start = first.find(head, max(0, len(first) - len(second)))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(head, start + 1)
+    return None
+
+def word_set(text: str) -> set:
+    """Lowercase words of a text, for comparing passages."""
+    return set(re.findall(r"\w+", text.lower()))
+
+class ContextAssembler:
+    """Packs retrieved chunks into the prompt's context within a token budget.
+    
+    Consecutive chunks of the same source are merged into one passage, with
+    their overlap written once; passages nearly identical to a more relevant
+    one are dropped; the rest are added by relevance while they fit.
+    """
+    
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+        count: Callable[[str], int] = None
+    ):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.count = count or load_token_counter()
+    
+    def assemble(self, docs: List[Document]) -> Tuple[List[Document], Dict[str, int]]:
+        """Return the passages to put in the prompt, best first, and packing stats."""
+        passages, merged, repeated = self._merge(docs)
+        passages, duplicates = self._deduplicate(passages)
+        
+        packed, used, dropped = [], 0, 0
+        for passage in passages:
+            tokens = self.count(passage.page_content)
+            if used + tokens <= self.token_budget:
+                packed.append(passage)
+                used += tokens
+            elif not packed:
+                # Never send an empty context because the best passage is too long
+                passage = Document(page_content=self._truncate(passage.page_content, self.token_budget), metadata=passage.metadata)
+                packed.append(passage)
+                used += self.count(passage.page_content)
+            else:
+                dropped += 1
+        
+        retrieved = sum(self.count(doc.page_content) for doc in docs)
+        return packed, {
+            "retrieved_tokens": retrieved,
+            "context_tokens": used,
+            "saved_tokens": retrieved - used,
+            "merged": merged,
+            "duplicates": repeated + duplicates,
+            "dropped": dropped
+        }
+    
+    def _merge(self, docs: List[Document]) -> Tuple[List[Document], int, int]:
+        """Merge runs of consecutive chunks from the same document; a run ranks as its best chunk.
+        
+        Chunks belong to the same document when they share a source and an
+        ingestion time. Chunks stored without an ingestion time are only
+        merged when their texts visibly overlap.
+        """
+        documents: Dict[Any, List[Tuple[int, int, Document]]] = {}
+        passages: List[Tuple[int, Document]] = []
+        for rank, doc in enumerate(docs):
+            chunk_id = doc.metadata.get("chunk_id")
+            if isinstance(chunk_id, int) and doc.metadata.get("source") is not None:
+                key = (doc.metadata["source"], doc.metadata.get("ingested_at"))
+                documents.setdefault(key, []).append((chunk_id, rank, doc))
+            else:
+                passages.append((rank, doc))
+        
+        merged = duplicates = 0
+        for (_, ingested_at), chunks in documents.items():
+            chunks.sort(key=lambda chunk: chunk[:2])
+            run = None
+            for chunk_id, rank, doc in chunks:
+                if run is not None and chunk_id == run["chunk_ids"][-1]:
+                    # The same chunk retrieved twice
+                    duplicates += 1
+                    continue
+                if run is not None and chunk_id == run["chunk_ids"][-1] + 1:
+                    joined = merge_overlapping(run["text"], doc.page_content)
+                    if joined is None and ingested_at is not None:
+                        joined = f"{run['text']}\n{doc.page_content}"
+                    if joined is not None:
+                        run["text"] = joined
+                        run["chunk_ids"].append(chunk_id)
+                        run["rank"] = min(run["rank"], rank)
+                        merged += 1
+                        continue
+                if run is not None:
+                    passages.append(self._passage(run))
+                run = {"text": doc.page_content, "chunk_ids": [chunk_id], "rank": rank, "metadata": doc.metadata}
+            passages.append(self._passage(run))
+        
+        passages.sort(key=lambda passage: passage[0])
+        return [doc for _, doc in passages], merged, duplicates
+    
+    def _passage(self, run: Dict[str, Any]) -> Tuple[int, Document]:
+        """Turn a run of merged chunks into a ranked passage."""
+        metadata = run["metadata"] if len(run["chunk_ids"]) == 1 else {**run["metadata"], "chunk_ids": run["chunk_ids"]}
+        return run["rank"], Document(page_content=run["text"], metadata=metadata)
+    
+    def _deduplicate(self, passages: List[Document]) -> Tuple[List[Document], int]:
+        """Drop passages whose words nearly all appear in a more relevant passage."""
+        kept, kept_words, duplicates = [], [], 0
+        for passage in passages:
+            words = word_set(passage.page_content)
+            if any(len(words & other) / max(len(words | other), 1) >= self.dedup_threshold for other in kept_words):
+                duplicates += 1
+                continue
+            kept.append(passage)
+            kept_words.append(words)
+        return kept, duplicates
+    
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text at a word boundary so it fits in max_tokens."""
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
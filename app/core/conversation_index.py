@@ -0,0 +1,130 @@
+import os
+import sys
+import uuid
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from langchain.vectorstores import Qdrant
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    CONVERSATION_INDEX_BATCH_SIZE,
+    CONVERSATION_INDEX_INTERVAL,
+    CONVERSATION_INDEX_QUEUE_SIZE
+)
+from app.core.metrics import stage
+
+# Asks the worker to flush what it has
+_FLUSH = object()
+
+logger = logging.getLogger(__name__)
+
+class ConversationIndexer:
+    """Indexes conversation turns into their own collection in the background.
+    
+    Turns are queued and a worker thread embeds and upserts them in batches,
+    once batch_size turns are waiting or interval seconds have passed, so
+    answering a question never waits on an embedding or a Qdrant write.
+    """
+    
+    def __init__(
+        self,
+        vectorstore: Qdrant,
+        batch_size: int = CONVERSATION_INDEX_BATCH_SIZE,
+        interval: float = CONVERSATION_INDEX_INTERVAL,
+        queue_size: int = CONVERSATION_INDEX_QUEUE_SIZE
+    ):
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self.indexed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._worker = threading.Thread(target=self._run, name="conversation-indexer", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+    
+    def submit(self, question: str, answer: str, metadata: Dict[str, Any] = None):
+        """Queue a conversation turn for indexing and return at once."""
+        turn_metadata = {
+            "type": "conversation",
+            "source": "conversation",
+            "question": question
+        }
+        turn_metadata.update(metadata or {})
+        # The same exchange is only stored once
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"conversation:{question}\n{answer}"))
+        
+        with self._flushed:
+            if self._closed:
+                return
+            try:
+                self._queue.put_nowait((answer, turn_metadata, point_id))
+            except queue.Full:
+                # Never hold up a response; the turn is still in the session memory
+                self.dropped += 1
+                return
+            self._pending += 1
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued turn is written. Returns False on timeout."""
+        self._queue.put(_FLUSH)
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending == 0, timeout)
+    
+    def close(self, timeout: Optional[float] = 10.0):
+        """Write the remaining turns and stop accepting new ones."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._flushed:
+            self._closed = True
+    
+    def _run(self):
+        """Collect turns into batches and write them out."""
+        batch: List[tuple] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _FLUSH
+            
+            if item is not _FLUSH:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.interval
+                if len(batch) < self.batch_size:
+                    continue
+            
+            if batch:
+                self._write(batch)
+                with self._flushed:
+                    self._pending -= len(batch)
+                    self._flushed.notify_all()
+                batch = []
+            deadline = None
+    
+    def _write(self, batch: List[tuple]):
+        """Embed and upsert one batch of turns."""
+        texts, metadatas, ids = zip(*batch)
+        try:
+            with stage("conversation_index"):
+                self.vectorstore.add_texts(list(texts), list(metadatas), ids=list(ids), batch_size=self.batch_size)
+            self.indexed += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to index %d conversation turns", len(batch))
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the indexing counters and the number of queued turns."""
+        return {"indexed": self.indexed, "dropped": self.dropped, "failed": self.failed, "queued": self._pending}
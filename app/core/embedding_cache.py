@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE, EMBEDDING_CACHE_DISK_SIZE
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed embedding cache in front of another embeddings model.
+    
+    Vectors are keyed by (model name, text hash) and kept in two tiers: an
+    in-memory LRU and an on-disk SQLite table of float32 blobs that survives
+    restarts. Both tiers are size bounded and evict least recently used first.
+    """
+    
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+        disk_size: int = EMBEDDING_CACHE_DISK_SIZE
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._path = path if path and disk_size > 0 else None
+        self._db = self._init_db(self._path) if self._path else None
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if self._db else 0
+        
+        # A SQLite connection must not be shared with a forked worker
+        os.register_at_fork(after_in_child=self._reopen)
+        
+        # Hit/miss counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    def _reopen(self):
+        """Give a forked process its own lock and connection."""
+        self._lock = threading.Lock()
+        if self._path:
+            self._db = self._init_db(self._path)
+    
+    def _init_db(self, path: str) -> sqlite3.Connection:
+        """Open the on-disk cache, creating the table if needed."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        db.commit()
+        return db
+    
+    def _key(self, text: str, kind: str) -> str:
+        """Hash a text together with the model name and the embedding kind."""
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_name}\0{kind}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _remember(self, key: str, vector: List[float]):
+        """Put a vector in the memory tier, evicting the oldest entries."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for the given keys from both tiers."""
+        found = {}
+        disk_keys = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                elif self._db is not None:
+                    disk_keys.append(key)
+            
+            if disk_keys:
+                now = time.time()
+                for start in range(0, len(disk_keys), _SQL_BATCH):
+                    batch = disk_keys[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                    if rows:
+                        self._db.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows]
+                        )
+                self._db.commit()
+                self.disk_hits += sum(1 for key in disk_keys if key in found)
+            
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+    
+    def _store(self, vectors: Dict[str, List[float]]):
+        """Write freshly computed vectors to both tiers."""
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            
+            if self._db is None:
+                return
+            
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(key, self.model_name, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                 for key, vector in vectors.items()]
+            )
+            self._disk_count += len(vectors)
+            
+            # Evict the least recently used rows once the disk tier is over its bound
+            if self._disk_count > self.disk_size:
+                self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._disk_count - self.disk_size
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (excess,)
+                    )
+                    self._disk_count -= excess
+            self._db.commit()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, only computing the ones not already cached."""
+        return self._embed_many(texts, "document")
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in one batch, sharing cache entries with embed_query.
+        
+        The supported models embed queries and documents alike, so the
+        missing ones go through the wrapped model's batched embed_documents.
+        """
+        return self._embed_many(texts, "query")
+    
+    def _embed_many(self, texts: List[str], kind: str) -> List[List[float]]:
+        """Look up a batch of texts and embed the missing ones in a single call."""
+        keys = [self._key(text, kind) for text in texts]
+        found = self._lookup(keys)
+        
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        
+        return [list(found[key]) for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing a cached vector when possible."""
+        key = self._key(text, "query")
+        found = self._lookup([key])
+        if key not in found:
+            vector = self.embeddings.embed_query(text)
+            self._store({key: vector})
+            return list(vector)
+        return list(found[key])
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the cache hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count
+            }
@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from langchain.llms.base import LLM
+from langchain.llms.utils import enforce_stop_tokens
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    HF_API_KEY,
+    LLM_MODEL,
+    LLM_API_URL,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_POOL_SIZE,
+    LLM_BREAKER_THRESHOLD,
+    LLM_BREAKER_COOLDOWN,
+    DEFAULT_TEMPERATURE,
+    MAX_TOKENS
+)
+
+# Responses worth retrying: rate limited, or the model is still loading
+RETRY_STATUSES = (429, 503)
+# Longest Retry-After we are willing to wait inside one request, in seconds
+MAX_RETRY_AFTER = 10.0
+
+class InferenceError(Exception):
+    """Raised when the inference service can't produce a completion."""
+
+class CircuitOpen(InferenceError):
+    """Raised without calling the service while it is considered down."""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"The inference service is unavailable, retry in {int(retry_after) + 1}s")
+        self.retry_after = int(retry_after) + 1
+
+class CircuitBreaker:
+    """Stops calling a failing service for a while.
+    
+    After threshold consecutive failures the circuit opens and calls fail at
+    once. Once cooldown seconds have passed a single trial call is let
+    through: its success closes the circuit, its failure opens it again.
+    """
+    
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+    
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go through now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited < self.cooldown or self._trial:
+                raise CircuitOpen(max(self.cooldown - waited, 0.0))
+            self._trial = True
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+class InferenceClient:
+    """Client for the Hugging Face Inference API.
+    
+    Requests share a pool of keep-alive connections and have separate
+    connect and read timeouts. Rate-limited and loading responses are
+    retried with jittered exponential backoff, failures trip a circuit
+    breaker, and identical prompts already in flight share one request.
+    """
+    
+    def __init__(
+        self,
+        model: str = LLM_MODEL,
+        api_url: str = LLM_API_URL,
+        api_key: str = HF_API_KEY,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        read_timeout: float = LLM_READ_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF,
+        pool_size: int = LLM_POOL_SIZE,
+        breaker: CircuitBreaker = None
+    ):
+        self.url = f"{api_url.rstrip('/')}/{model}"
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+        self._client: Optional[httpx.Client] = None
+        self._in_flight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        # The client is shared by every request thread
+        self._counter_lock = threading.Lock()
+        # Pooled connections can't be shared with a forked process
+        os.register_at_fork(after_in_child=self._reset)
+    
+    def _reset(self):
+        self._client = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+    
+    @property
+    def client(self) -> httpx.Client:
+        """The pooled HTTP client, opened on first use in each process."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(headers=self.headers, timeout=self.timeout, limits=self.limits)
+        return self._client
+    
+    def generate(self, prompt: str, parameters: Dict[str, Any] = None) -> str:
+        """Return the completion of a prompt, sharing the request with identical ones in flight."""
+        parameters = parameters or {}
+        key = (prompt, tuple(sorted(parameters.items())))
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            with self._counter_lock:
+                self.coalesced += 1
+            return future.result()
+        
+        try:
+            text = self._request(prompt, parameters)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+    
+    def _request(self, prompt: str, parameters: Dict[str, Any]) -> str:
+        """Call the service, retrying rate-limited and loading responses."""
+        self.breaker.before_call()
+        payload = {"inputs": prompt, "parameters": parameters, "options": {"wait_for_model": False}}
+        for attempt in range(self.max_retries + 1):
+            with self._counter_lock:
+                self.requests += 1
+            try:
+                response = self.client.post(self.url, json=payload)
+            except httpx.TransportError as e:
+                # Covers connect and read timeouts as well as dropped connections
+                error: Exception = InferenceError(f"Inference request failed: {e!r}")
+                delay = self._backoff(attempt)
+            except Exception:
+                # Anything unexpected still has to settle a half-open circuit's trial call
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return self._completion(prompt, response.json())
+                if response.status_code not in RETRY_STATUSES and response.status_code < 500:
+                    # The request itself is wrong; retrying won't help, but the service answered, so it is up
+                    self.breaker.record_success()
+                    raise InferenceError(f"Inference request rejected ({response.status_code}): {response.text[:200]}")
+                error = InferenceError(f"Inference service returned {response.status_code}: {response.text[:200]}")
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+            
+            if attempt < self.max_retries:
+                with self._counter_lock:
+                    self.retries += 1
+                time.sleep(delay)
+        self.breaker.record_failure()
+        raise error
+    
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before the next attempt: the server's hint, or full-jitter exponential backoff."""
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return random.uniform(0, self.backoff * 2 ** attempt)
+    
+    def _completion(self, prompt: str, data: Any) -> str:
+        """Pull the generated text out of a response."""
+        if isinstance(data, list) and data and isinstance(data[0], dict) and "generated_text" in data[0]:
+            text = data[0]["generated_text"]
+        elif isinstance(data, dict) and "generated_text" in data:
+            text = data["generated_text"]
+        else:
+            raise InferenceError(f"Unexpected inference response: {str(data)[:200]}")
+        # Text-generation models echo the prompt before the completion
+        return text[len(prompt):] if text.startswith(prompt) else text
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return the request counters and the circuit state."""
+        with self._counter_lock:
+            counters = {"requests": self.requests, "retries": self.retries, "coalesced": self.coalesced}
+        return {**counters, "circuit": self.breaker.state}
+
+class HubLLM(LLM):
+    """LangChain LLM backed by the pooled, retrying Inference API client."""
+    
+    client: Any
+    temperature: float = DEFAULT_TEMPERATURE
+    max_length: int = MAX_TOKENS
+    
+    @property
+    def _llm_type(self) -> str:
+        return "huggingface-inference"
+    
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        text = self.client.generate(prompt, {"temperature": self.temperature, "max_length": self.max_length})
+        return enforce_stop_tokens(text, stop) if stop else text
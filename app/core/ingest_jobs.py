@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    INGESTION_WORKERS,
+    INGEST_JOB_DB_PATH,
+    INGEST_JOB_QUEUE_SIZE,
+    INGEST_JOB_MAX_ATTEMPTS,
+    INGEST_JOB_RETRY_DELAY,
+    INGEST_JOB_LEASE,
+    INGEST_JOB_RETENTION
+)
+from app.core.concurrency import Overloaded
+
+# Seconds between writes of the progress of running jobs, which also renew their leases
+HEARTBEAT_INTERVAL = 1.0
+# Seconds an idle worker waits before looking for jobs submitted by other processes
+POLL_INTERVAL = 1.0
+# Errors that would fail the same way on every attempt
+PERMANENT_ERRORS = (ValueError, FileNotFoundError)
+
+logger = logging.getLogger(__name__)
+
+class IngestJobQueue:
+    """A persistent queue of ingestion jobs, kept in SQLite.
+    
+    A worker claims a job by taking a lease on it, which it keeps renewing
+    while the job runs. If the worker's process dies, the lease runs out
+    and another worker picks the job up again, so queued work survives a
+    crash or restart. Failed jobs are retried with exponential backoff up
+    to max_attempts. Several processes can share one queue.
+    
+    Every claim hands out a new lease token, and progress and outcomes are
+    only recorded under the current one, so a worker that lost its job to
+    another can't overwrite what the new owner records. Jobs for the same
+    source run one at a time, in the order they were submitted, so the
+    last version submitted is the one left in the knowledge base.
+    """
+    
+    def __init__(
+        self,
+        path: str = INGEST_JOB_DB_PATH,
+        queue_size: int = INGEST_JOB_QUEUE_SIZE,
+        max_attempts: int = INGEST_JOB_MAX_ATTEMPTS,
+        retry_delay: float = INGEST_JOB_RETRY_DELAY,
+        lease: float = INGEST_JOB_LEASE,
+        retention: float = INGEST_JOB_RETENTION
+    ):
+        self.path = path
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        self.prune()
+        
+        # A SQLite connection must not be shared with a forked worker
+        os.register_at_fork(after_in_child=self._reopen)
+    
+    def _reopen(self):
+        """Give a forked process its own lock and connection."""
+        self._lock = threading.Lock()
+        self._db = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the queue, creating the table if needed."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        # due_at is when a queued job may run next, or when a running job's lease runs out
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, progress REAL NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, due_at REAL NOT NULL, lease TEXT, source_key TEXT)"
+        )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+        for column in ("lease", "source_key"):
+            if column not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, due_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source_key, status)")
+        db.commit()
+        return db
+    
+    def submit(self, kind: str, payload: Dict[str, Any], source_key: Optional[str] = None) -> str:
+        """Queue a job and return its ID, raising Overloaded if the queue is full.
+        
+        Jobs with the same source_key (see DocumentProcessor.source_key) never
+        run at the same time.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._db:
+            waiting = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if waiting >= self.queue_size:
+                raise Overloaded("ingestion")
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at, due_at, source_key) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now, now, source_key)
+            )
+        return job_id
+    
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the oldest job that is due, if any.
+        
+        That is a queued job whose retry delay has passed or a running job
+        whose worker has stopped renewing its lease, skipping jobs whose
+        source has an earlier job still pending or a job running under a
+        live lease. The job comes with the lease token to pass back when
+        recording its progress and outcome.
+        """
+        lease = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._db:
+            # Abandoned jobs that already used up their attempts are given up on
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', updated_at = ?, "
+                "error = COALESCE(error, 'The worker running this job stopped') "
+                "WHERE status = 'running' AND due_at <= ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            # A single statement, so two workers can never claim the same job
+            row = self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, due_at = ?, lease = ? "
+                "WHERE id = (SELECT id FROM jobs AS candidate WHERE status IN ('queued', 'running') AND due_at <= ? "
+                "AND (source_key IS NULL OR NOT EXISTS (SELECT 1 FROM jobs AS other "
+                "WHERE other.source_key = candidate.source_key AND other.id != candidate.id "
+                "AND other.status IN ('queued', 'running') "
+                "AND (other.created_at < candidate.created_at OR (other.status = 'running' AND other.due_at > ?)))) "
+                "ORDER BY created_at LIMIT 1) RETURNING id, kind, payload, attempts",
+                (now, now + self.lease, lease, now, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3], "lease": lease}
+    
+    def heartbeat(self, progress: Dict[str, float]):
+        """Record the progress of running jobs, keyed by lease token, and renew their leases."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE jobs SET progress = ?, updated_at = ?, due_at = ? WHERE lease = ? AND status = 'running'",
+                [(value, now, now + self.lease, lease) for lease, value in progress.items()]
+            )
+    
+    def complete(self, job_id: str, lease: str, ids: List[str]) -> bool:
+        """Record a job's resulting chunk IDs, unless the lease has passed to another worker."""
+        now = time.time()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, result = ?, error = NULL, updated_at = ?, due_at = ?, lease = NULL "
+                "WHERE id = ? AND lease = ? AND status = 'running'",
+                (json.dumps(ids), now, now, job_id, lease)
+            )
+        return cursor.rowcount == 1
+    
+    def fail(self, job_id: str, lease: str, attempts: int, error: Exception) -> bool:
+        """Schedule a failed job for another attempt, or give up on it, unless the lease has passed to another worker."""
+        now = time.time()
+        message = f"{type(error).__name__}: {error}"
+        if attempts < self.max_attempts and not isinstance(error, PERMANENT_ERRORS):
+            status, due_at = "queued", now + self.retry_delay * 2 ** (attempts - 1)
+        else:
+            status, due_at = "failed", now
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, due_at = ?, lease = NULL "
+                "WHERE id = ? AND lease = ? AND status = 'running'",
+                (status, message, now, due_at, job_id, lease)
+            )
+        return cursor.rowcount == 1
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's status, progress and, once done, its chunk IDs."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, attempts, progress, result, error, created_at, updated_at, due_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        job_id, kind, status, attempts, progress, result, error, created_at, updated_at, due_at = row
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "attempts": attempts,
+            "progress": round(progress, 4),
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+        if status == "queued" and attempts:
+            job["retry_at"] = due_at
+        if result is not None:
+            job["ids"] = json.loads(result)
+        return job
+    
+    def counts(self) -> Dict[str, int]:
+        """Return the number of jobs per status."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+    
+    def prune(self):
+        """Forget finished jobs older than the retention period."""
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention,)
+            )
+
+class IngestWorkers:
+    """Threads running the jobs of an ingestion queue.
+    
+    Every process that accepts jobs (the API, the Streamlit UI) runs its own
+    workers; they share the queue, so a job may run in whichever process
+    has a free worker. A separate thread writes the progress of the jobs
+    running here every second, which also keeps their leases alive.
+    """
+    
+    def __init__(self, jobs: IngestJobQueue, processor, workers: int = INGESTION_WORKERS):
+        self.jobs = jobs
+        self.processor = processor
+        self.workers = workers
+        self._progress: Dict[str, float] = {}
+        self._progress_lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+    
+    def start(self):
+        """Start the worker and heartbeat threads."""
+        if self._threads:
+            return
+        self._stopped.clear()
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True))
+        self._threads.append(threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+    
+    def stop(self):
+        """Stop taking jobs. Jobs still running are picked up again once their leases run out."""
+        self._stopped.set()
+        with self._wake:
+            self._wake.notify_all()
+        self._threads = []
+    
+    def submit(self, kind: str, payload: Dict[str, Any], source_key: Optional[str] = None) -> str:
+        """Queue a job and wake a worker in this process."""
+        job_id = self.jobs.submit(kind, payload, source_key)
+        with self._wake:
+            self._wake.notify()
+        return job_id
+    
+    def submit_file(self, path: str, metadata: Dict[str, Any] = None, content_hash: str = None) -> str:
+        """Queue the ingestion of a stored file."""
+        payload = {"path": path, "metadata": metadata or {}, "content_hash": content_hash}
+        # Versions of one document must not be ingested concurrently, or their manifest updates race
+        return self.submit("file", payload, self.processor.source_key(path, metadata))
+    
+    def submit_text(self, text: str, metadata: Dict[str, Any] = None) -> str:
+        """Queue the ingestion of raw text."""
+        return self.submit("text", {"text": text, "metadata": metadata or {}})
+    
+    def _run(self):
+        """Take jobs off the queue until stopped."""
+        while not self._stopped.is_set():
+            try:
+                job = self.jobs.claim()
+            except sqlite3.Error as e:
+                logger.error("Failed to claim an ingestion job: %s", e)
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(POLL_INTERVAL)
+                continue
+            self._execute(job)
+    
+    def _execute(self, job: Dict[str, Any]):
+        """Run one job and record its outcome."""
+        job_id, lease, payload = job["id"], job["lease"], job["payload"]
+        
+        def progress(value: float):
+            with self._progress_lock:
+                self._progress[lease] = value
+        
+        progress(0.0)
+        ids, error = None, None
+        try:
+            if job["kind"] == "file":
+                ids = self.processor.ingest_file(payload["path"], payload["metadata"], payload["content_hash"], progress)
+            elif job["kind"] == "text":
+                ids = self.processor.ingest_text(payload["text"], payload["metadata"])
+            else:
+                raise ValueError(f"Unknown ingestion job kind: {job['kind']}")
+        except Exception as e:
+            logger.exception("Ingestion job %s failed", job_id)
+            error = e
+        finally:
+            self._finish(lease)
+        
+        try:
+            if error is not None:
+                recorded = self.jobs.fail(job_id, lease, job["attempts"], error)
+            else:
+                recorded = self.jobs.complete(job_id, lease, ids)
+        except sqlite3.Error as e:
+            # The lease runs out and the job is retried, so keep the worker going
+            logger.error("Failed to record the outcome of ingestion job %s: %s", job_id, e)
+            recorded = True
+        if not recorded:
+            logger.warning("Ingestion job %s was taken over by another worker; its outcome here is dropped", job_id)
+        
+        # A job of the same source may have been waiting for this one
+        with self._wake:
+            self._wake.notify()
+    
+    def _finish(self, lease: str):
+        with self._progress_lock:
+            self._progress.pop(lease, None)
+    
+    def _heartbeat(self):
+        """Write the progress of running jobs and prune old ones now and then."""
+        last_prune = time.monotonic()
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            with self._progress_lock:
+                progress = dict(self._progress)
+            try:
+                if progress:
+                    self.jobs.heartbeat(progress)
+                if time.monotonic() - last_prune > 3600:
+                    self.jobs.prune()
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                logger.error("Failed to record ingestion progress: %s", e)
@@ -1,23 +1,154 @@
 import os
+import csv
 import sys
-from typing import List, Dict, Any
+import time
+import uuid
+import hashlib
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, Tuple
 from langchain.document_loaders import (
     PyPDFLoader,
     TextLoader,
     CSVLoader
 )
+from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from app.config import CHUNK_SIZE, CHUNK_OVERLAP
+from app.config import CHUNK_SIZE, CHUNK_OVERLAP, INGEST_BATCH_SIZE
 from app.core.memory import MemoryManager
+from app.core.answer_cache import source_identity
+from app.core.metrics import record_stage, INGESTED_CHUNKS
+from app.utils.helpers import file_sha256, remove_older_versions
+
+# Loaders for the supported file types
+LOADERS = {
+    '.pdf': PyPDFLoader,
+    '.txt': TextLoader,
+    '.csv': CSVLoader
+}
+
+def get_loader(file_path: str):
+    """Return the document loader for a file based on its extension."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    # Get the file extension
+    _, extension = os.path.splitext(file_path)
+    extension = extension.lower()
+    
+    if extension not in LOADERS:
+        raise ValueError(f"Unsupported file type: {extension}")
+    
+    return LOADERS[extension](file_path)
+
+# Called with the share of a file parsed so far, from 0 to 1
+Progress = Callable[[float], None]
+
+def iter_pdf_pages(file_path: str, progress: Optional[Progress] = None) -> Iterator[Document]:
+    """Yield a PDF's pages one at a time, as PyPDFLoader would return them."""
+    import pypdf
+    
+    with open(file_path, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        pages = len(reader.pages)
+        for page_number, page in enumerate(reader.pages):
+            yield Document(page_content=page.extract_text(), metadata={"source": file_path, "page": page_number})
+            if progress:
+                progress((page_number + 1) / pages)
+
+def iter_csv_rows(file_path: str, progress: Optional[Progress] = None) -> Iterator[Document]:
+    """Yield a CSV file's rows one at a time, as CSVLoader would return them."""
+    size = os.path.getsize(file_path) or 1
+    with open(file_path, newline="") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            content = "\n".join(f"{k.strip()}: {v.strip() if v is not None else v}" for k, v in row.items())
+            yield Document(page_content=content, metadata={"source": file_path, "row": i})
+            if progress:
+                # The bytes read ahead by the text layer, close enough for progress
+                progress(min(f.buffer.tell() / size, 1.0))
+
+# File types that can be read a page or a row at a time instead of all at once
+LAZY_LOADERS = {
+    '.pdf': iter_pdf_pages,
+    '.csv': iter_csv_rows
+}
+
+def lazy_load(file_path: str, progress: Optional[Progress] = None) -> Iterator[Document]:
+    """Yield a file's documents as they are parsed, so memory doesn't grow with the file."""
+    loader = get_loader(file_path)
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in LAZY_LOADERS:
+        yield from LAZY_LOADERS[extension](file_path, progress)
+    else:
+        # Plain text is a single document anyway
+        yield from loader.load()
+        if progress:
+            progress(1.0)
+
+def base_chunk_metadata(file_path: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Build the metadata shared by every chunk of a file."""
+    # Add file path to metadata
+    base_metadata = {
+        "source": file_path,
+        "file_name": os.path.basename(file_path),
+        # Numeric so searches can filter on a date range
+        "ingested_at": time.time()
+    }
+    base_metadata.update(metadata or {})
+    return base_metadata
+
+def chunk_metadata(base_metadata: Dict[str, Any], chunk: Any, chunk_id: int) -> Dict[str, Any]:
+    """Build the metadata stored with one chunk of a file."""
+    metadata = base_metadata.copy()
+    if hasattr(chunk, 'metadata'):
+        metadata.update(chunk.metadata)
+    metadata["chunk_id"] = chunk_id
+    return metadata
+
+def build_chunk_metadatas(file_path: str, chunks: List[Any], metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """Build the metadata stored with each chunk of a file."""
+    base_metadata = base_chunk_metadata(file_path, metadata)
+    return [chunk_metadata(base_metadata, chunk, i) for i, chunk in enumerate(chunks)]
+
+def load_and_split(file_path: str, metadata: Dict[str, Any] = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Load and split a file into chunk texts and metadatas.
+    
+    This is a module-level function so it can run in a process pool.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    chunks = text_splitter.split_documents(get_loader(file_path).load())
+    return [chunk.page_content for chunk in chunks], build_chunk_metadatas(file_path, chunks, metadata)
+
+def chunk_point_id(source_key: str, text: str, occurrences: Dict[str, int]) -> str:
+    """Derive the deterministic point ID of a source's next chunk from its content.
+    
+    occurrences counts the texts seen so far in the source and is updated.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    # Repeated chunks within one source still need distinct IDs
+    occurrence = occurrences.get(text_hash, 0)
+    occurrences[text_hash] = occurrence + 1
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source_key}\0{text_hash}\0{occurrence}"))
+
+def chunk_point_ids(source_key: str, texts: List[str]) -> List[str]:
+    """Derive deterministic point IDs for a source's chunks from their content.
+    
+    The same text in the same source always maps to the same ID, so re-ingesting
+    a document overwrites its points instead of adding copies.
+    """
+    occurrences: Dict[str, int] = {}
+    return [chunk_point_id(source_key, text, occurrences) for text in texts]
 
 class DocumentProcessor:
     """Processes documents for ingestion into the vector database."""
     
     def __init__(self, memory_manager: MemoryManager):
         self.memory_manager = memory_manager
+        self.manifest = memory_manager.resources.manifest
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=CHUNK_SIZE,
             chunk_overlap=CHUNK_OVERLAP
@@ -25,59 +156,154 @@ class DocumentProcessor:
     
     def process_file(self, file_path: str) -> List[str]:
         """Process a file and return a list of document chunks."""
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        # Get the file extension
-        _, extension = os.path.splitext(file_path)
-        extension = extension.lower()
-        
-        # Load the file using the appropriate loader
-        if extension == '.pdf':
-            loader = PyPDFLoader(file_path)
-        elif extension == '.txt':
-            loader = TextLoader(file_path)
-        elif extension == '.csv':
-            loader = CSVLoader(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {extension}")
-        
-        # Load and split the documents
-        documents = loader.load()
-        chunks = self.text_splitter.split_documents(documents)
-        
-        return chunks
-    
-    def ingest_file(self, file_path: str, metadata: Dict[str, Any] = None) -> List[str]:
-        """Ingest a file into the vector database."""
-        # Process the file
-        chunks = self.process_file(file_path)
-        
-        # Add metadata to each chunk
-        if metadata is None:
-            metadata = {}
+        return list(self.iter_chunks(file_path))
+    
+    def iter_chunks(self, file_path: str, progress: Optional[Progress] = None) -> Iterator[Document]:
+        """Yield a file's chunks as its pages or rows are parsed and split.
         
-        # Add file path to metadata
-        base_metadata = {
-            "source": file_path,
-            "file_name": os.path.basename(file_path)
-        }
-        base_metadata.update(metadata)
+        The chunks are the same as splitting the whole file at once, since
+        the splitter works on one page or row at a time either way. progress
+        is told the share of the file parsed so far.
+        """
+        documents = lazy_load(file_path, progress)
+        load_seconds = split_seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                document = next(documents, None)
+                load_seconds += time.perf_counter() - start
+                if document is None:
+                    break
+                
+                start = time.perf_counter()
+                chunks = self.text_splitter.split_documents([document])
+                split_seconds += time.perf_counter() - start
+                yield from chunks
+        finally:
+            # One observation per file, however many pages it had
+            record_stage("load", load_seconds)
+            record_stage("split", split_seconds)
+    
+    def source_key(self, file_path: str, metadata: Dict[str, Any] = None) -> str:
+        """Identify a document across re-uploads: by its original name if given, else by path."""
+        if metadata and metadata.get("original_name"):
+            return f"upload:{metadata['original_name']}"
+        return os.path.abspath(file_path)
+    
+    def plan_chunks(self, source_key: str, texts: List[str], metadatas: List[Dict[str, Any]]) -> Tuple[List[str], List[int], List[str]]:
+        """Compare a source's chunks with the manifest.
         
-        # Prepare chunks and metadatas
-        texts = [chunk.page_content for chunk in chunks]
-        metadatas = []
+        Returns the IDs of all chunks, the indices of the chunks that still
+        need embedding and the IDs of stored chunks that no longer exist.
+        """
+        ids = chunk_point_ids(source_key, texts)
+        previous = self.manifest.get_chunks(source_key)
+        new_indices = [i for i, point_id in enumerate(ids) if point_id not in previous]
         
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = base_metadata.copy()
-            if hasattr(chunk, 'metadata'):
-                chunk_metadata.update(chunk.metadata)
-            chunk_metadata["chunk_id"] = i
-            metadatas.append(chunk_metadata)
+        # Unchanged chunks only need their metadata refreshed to the new version's
+        self.memory_manager.set_metadatas({point_id: metadatas[i] for i, point_id in enumerate(ids) if point_id in previous})
         
-        # Store in vector database
-        ids = self.memory_manager.add_texts(texts, metadatas)
+        current = set(ids)
+        stale_ids = [point_id for point_id in previous if point_id not in current]
+        return ids, new_indices, stale_ids
+    
+    def commit_chunks(self, source_key: str, content_hash: str, ids: List[str], metadatas: List[Dict[str, Any]], stale_ids: List[str]):
+        """Delete a source's stale chunks and record its new version in the manifest."""
+        self._commit(
+            source_key,
+            content_hash,
+            {point_id: metadata["chunk_id"] for point_id, metadata in zip(ids, metadatas)},
+            {source_identity(metadata) for metadata in metadatas},
+            stale_ids
+        )
+    
+    def _commit(self, source_key: str, content_hash: str, chunk_ids: Dict[str, int], sources: Set[str], stale_ids: List[str]):
+        if stale_ids:
+            self.memory_manager.delete(stale_ids)
+        self.manifest.set_source(source_key, content_hash, chunk_ids)
+        
+        # Cached answers may be built from the old version of this source
+        self.memory_manager.resources.answer_cache.invalidate_sources(sources)
+    
+    def _add_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        """Embed and store a batch of (point ID, text, metadata) chunks."""
+        if batch:
+            ids, texts, metadatas = (list(column) for column in zip(*batch))
+            self.memory_manager.add_texts(texts, metadatas, ids=ids)
+            INGESTED_CHUNKS.inc(len(batch))
+    
+    def _store_chunks(self, source_key: str, content_hash: str, chunks: Iterable[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Embed and store only the new chunks of a source, then drop its stale ones.
+        
+        chunks yields (text, metadata) pairs and is consumed as it goes: new
+        chunks are stored every INGEST_BATCH_SIZE, so the start of a large
+        file is searchable while the rest is still being parsed, and only
+        IDs are kept for the whole file. Chunks already stored keep their
+        vectors but take the new version's metadata (path, ingestion time,
+        position), so a document's chunks always describe one version. The
+        manifest is updated once every chunk is stored.
+        """
+        previous = self.manifest.get_chunks(source_key)
+        occurrences: Dict[str, int] = {}
+        chunk_ids: Dict[str, int] = {}
+        sources: Set[str] = set()
+        batch = []
+        refresh: Dict[str, Dict[str, Any]] = {}
+        
+        for text, metadata in chunks:
+            point_id = chunk_point_id(source_key, text, occurrences)
+            chunk_ids[point_id] = metadata["chunk_id"]
+            sources.add(source_identity(metadata))
+            if point_id not in previous:
+                batch.append((point_id, text, metadata))
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    self._add_batch(batch)
+                    batch = []
+            else:
+                refresh[point_id] = metadata
+                if len(refresh) >= INGEST_BATCH_SIZE:
+                    self.memory_manager.set_metadatas(refresh)
+                    refresh = {}
+        self._add_batch(batch)
+        if refresh:
+            self.memory_manager.set_metadatas(refresh)
+        
+        stale_ids = [point_id for point_id in previous if point_id not in chunk_ids]
+        self._commit(source_key, content_hash, chunk_ids, sources, stale_ids)
+        return list(chunk_ids)
+    
+    def ingest_file(
+        self,
+        file_path: str,
+        metadata: Dict[str, Any] = None,
+        content_hash: str = None,
+        progress: Optional[Progress] = None
+    ) -> List[str]:
+        """Ingest a file into the vector database.
+        
+        Unchanged files are skipped, and for changed files only new or
+        modified chunks are embedded. Pass content_hash (the file's SHA-256)
+        if it is already known, e.g. from save_upload, to skip reading the
+        file just to hash it, and progress to follow the parsing.
+        """
+        source_key = self.source_key(file_path, metadata)
+        content_hash = content_hash or file_sha256(file_path)
         
+        # Skip the file entirely if this exact version is already stored
+        if self.manifest.get_content_hash(source_key) == content_hash:
+            return list(self.manifest.get_chunks(source_key))
+        
+        # Parse, split and store the file a page or row at a time
+        base_metadata = base_chunk_metadata(file_path, metadata)
+        chunks = (
+            (chunk.page_content, chunk_metadata(base_metadata, chunk, i))
+            for i, chunk in enumerate(self.iter_chunks(file_path, progress))
+        )
+        ids = self._store_chunks(source_key, content_hash, chunks)
+        
+        # This version of the upload replaced the earlier ones, so their stored copies can go
+        if metadata and metadata.get("original_name"):
+            remove_older_versions(file_path)
         return ids
     
     def ingest_text(self, text: str, metadata: Dict[str, Any] = None) -> List[str]:
@@ -85,18 +311,24 @@ class DocumentProcessor:
         if metadata is None:
             metadata = {}
         
+        # Identical text is stored once, however often it is submitted
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        source_key = f"text:{content_hash}"
+        if self.manifest.get_content_hash(source_key) == content_hash:
+            return list(self.manifest.get_chunks(source_key))
+        
         # Split the text
         chunks = self.text_splitter.split_text(text)
         
         # Prepare metadatas
+        ingested_at = time.time()
         metadatas = []
         for i in range(len(chunks)):
             chunk_metadata = metadata.copy()
             chunk_metadata["chunk_id"] = i
             chunk_metadata["source"] = "direct_input"
+            chunk_metadata["ingested_at"] = ingested_at
             metadatas.append(chunk_metadata)
         
         # Store in vector database
-        ids = self.memory_manager.add_texts(chunks, metadatas)
-        
-        return ids 
\ No newline at end of file
+        return self._store_chunks(source_key, content_hash, zip(chunks, metadatas))
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import re
+import sys
+import json
+import uuid
+import math
+import sqlite3
+import operator
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from langchain.schema import Document
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import LEXICAL_INDEX_PATH
+
+# Words, plus identifiers joined by - . / : such as ERR-1042 or app.core.memory
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query terms found in more than this share of chunks are ignored when the query has rarer ones
+COMMON_TERM_RATIO = 0.5
+
+RANGE_CHECKS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lowercase terms, keeping compound identifiers and their parts."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = re.split(r"[-./:]", token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+def point_key(point_id: Any) -> str:
+    """Spell a point ID the way Qdrant returns it, so hex and dashed UUIDs match."""
+    try:
+        return str(uuid.UUID(str(point_id)))
+    except ValueError:
+        return str(point_id)
+
+def matches_filter(metadata: Dict[str, Any], filters: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether chunk metadata passes a filter, with the same semantics as memory.build_filter."""
+    for field, value in (filters or {}).items():
+        actual = metadata.get(field)
+        if isinstance(value, dict):
+            if not isinstance(actual, (int, float)):
+                return False
+            if not all(RANGE_CHECKS[op](actual, bound) for op, bound in value.items()):
+                return False
+        elif isinstance(value, list):
+            if actual not in value:
+                return False
+        elif actual != value:
+            return False
+    return True
+
+class LexicalIndex:
+    """BM25 inverted index over the document chunks, kept in SQLite.
+    
+    Chunks are added and removed one by one as they are ingested, updating
+    the postings, document frequencies and length totals in place, so the
+    index never needs rebuilding. It complements the dense vectors with
+    exact matches on identifiers, error codes and names.
+    """
+    
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "point_id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, length INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, point_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, point_id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_point ON postings (point_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), doc_count INTEGER NOT NULL, total_length INTEGER NOT NULL)"
+        )
+        self._db.execute("INSERT OR IGNORE INTO stats (id, doc_count, total_length) VALUES (0, 0, 0)")
+        self._db.commit()
+    
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]] = None):
+        """Index chunks, replacing any already indexed under the same IDs."""
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock, self._db:
+            self._remove(ids)
+            added_length = 0
+            for point_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                added_length += length
+                self._db.execute(
+                    "INSERT INTO documents (point_id, content, metadata, length) VALUES (?, ?, ?, ?)",
+                    (point_key(point_id), text, json.dumps(metadata or {}), length)
+                )
+                self._db.executemany(
+                    "INSERT INTO postings (term, point_id, tf) VALUES (?, ?, ?)",
+                    [(term, point_key(point_id), tf) for term, tf in counts.items()]
+                )
+                self._db.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in counts]
+                )
+            self._db.execute(
+                "UPDATE stats SET doc_count = doc_count + ?, total_length = total_length + ? WHERE id = 0",
+                (len(ids), added_length)
+            )
+    
+    def remove(self, ids: List[str]):
+        """Drop chunks from the index."""
+        with self._lock, self._db:
+            self._remove(ids)
+    
+    def _remove(self, ids: List[str]):
+        """Drop chunks inside the caller's transaction."""
+        for point_id in map(point_key, ids):
+            row = self._db.execute("SELECT length FROM documents WHERE point_id = ?", (point_id,)).fetchone()
+            if row is None:
+                continue
+            self._db.execute(
+                "UPDATE terms SET df = df - 1 WHERE term IN (SELECT term FROM postings WHERE point_id = ?)",
+                (point_id,)
+            )
+            self._db.execute("DELETE FROM postings WHERE point_id = ?", (point_id,))
+            self._db.execute("DELETE FROM documents WHERE point_id = ?", (point_id,))
+            self._db.execute(
+                "UPDATE stats SET doc_count = doc_count - 1, total_length = total_length - ? WHERE id = 0",
+                (row[0],)
+            )
+        self._db.execute("DELETE FROM terms WHERE df <= 0")
+    
+    def set_metadata(self, point_id: str, metadata: Dict[str, Any]):
+        """Replace the stored metadata of a chunk."""
+        self.set_metadatas({point_id: metadata})
+    
+    def set_metadatas(self, metadatas: Dict[str, Dict[str, Any]]):
+        """Replace the stored metadata of chunks, keyed by point ID."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE documents SET metadata = ? WHERE point_id = ?",
+                [(json.dumps(metadata), point_key(point_id)) for point_id, metadata in metadatas.items()]
+            )
+    
+    def clear(self):
+        """Drop every chunk from the index."""
+        with self._lock, self._db:
+            for table in ("documents", "postings", "terms"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.execute("UPDATE stats SET doc_count = 0, total_length = 0 WHERE id = 0")
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT doc_count FROM stats WHERE id = 0").fetchone()[0]
+    
+    def search(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Return the k chunks with the highest BM25 score for a query, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        
+        with self._lock:
+            doc_count, total_length = self._db.execute("SELECT doc_count, total_length FROM stats WHERE id = 0").fetchone()
+            if not doc_count:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            df = dict(self._db.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(terms)))
+            # Terms in most chunks barely affect the ranking but have the longest posting lists
+            rare = {term: n for term, n in df.items() if n <= doc_count * COMMON_TERM_RATIO}
+            df = rare or df
+            if not df:
+                return []
+            placeholders = ",".join("?" * len(df))
+            postings = self._db.execute(
+                "SELECT p.point_id, p.term, p.tf, d.length FROM postings p JOIN documents d ON d.point_id = p.point_id "
+                f"WHERE p.term IN ({placeholders})",
+                list(df)
+            ).fetchall()
+        
+        average_length = total_length / doc_count
+        scores: Dict[str, float] = defaultdict(float)
+        for point_id, term, tf, length in postings:
+            idf = math.log(1 + (doc_count - df[term] + 0.5) / (df[term] + 0.5))
+            scores[point_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        
+        # Fetch chunks best first until k of them pass the filter
+        results = []
+        batch_size = k if not filters else max(k * 4, 64)
+        for start in range(0, len(ranked), batch_size):
+            batch = ranked[start:start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT point_id, content, metadata FROM documents WHERE point_id IN ({placeholders})",
+                    [point_id for point_id, _ in batch]
+                ).fetchall()
+            chunks = {point_id: (content, json.loads(metadata)) for point_id, content, metadata in rows}
+            for point_id, score in batch:
+                # Skip chunks removed since they were scored
+                if point_id not in chunks:
+                    continue
+                content, metadata = chunks[point_id]
+                if matches_filter(metadata, filters):
+                    results.append((Document(page_content=content, metadata=metadata), score))
+                    if len(results) == k:
+                        return results
+        return results
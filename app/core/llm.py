@@ -1,4 +1,3 @@
-from langchain.llms import HuggingFaceHub
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
@@ -7,38 +6,74 @@ import os
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from app.config import HF_API_KEY, LLM_MODEL, EMBEDDING_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS
+from app.config import (
+    HF_API_KEY,
+    LLM_MODEL,
+    LLM_BACKEND,
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    DEFAULT_TEMPERATURE,
+    MAX_TOKENS,
+    EMBEDDING_CACHE_ENABLED,
+    ONNX_QUANTIZE
+)
+from app.core.embedding_cache import CachedEmbeddings
+from app.core.inference_client import InferenceClient, HubLLM
 
 def get_llm():
     """Initialize and return the language model."""
+    if LLM_BACKEND == "local":
+        # Imported lazily so the hub backend doesn't load torch models
+        from app.core.local_llm import LocalLLM
+        return LocalLLM.from_model(LLM_MODEL)
+    if LLM_BACKEND != "hub":
+        raise ValueError(f"Unsupported LLM backend: {LLM_BACKEND}")
+    
     if not HF_API_KEY:
         # Can still work without API key but with rate limits
         print("Warning: Hugging Face API key not set. Using models without authentication.")
     
-    llm = HuggingFaceHub(
-        huggingfacehub_api_token=HF_API_KEY,
-        repo_id=LLM_MODEL,
-        model_kwargs={
-            "temperature": DEFAULT_TEMPERATURE,
-            "max_length": MAX_TOKENS
-        }
+    # Pooled keep-alive connections, retries with backoff and a circuit breaker
+    llm = HubLLM(
+        client=InferenceClient(LLM_MODEL, api_key=HF_API_KEY),
+        temperature=DEFAULT_TEMPERATURE,
+        max_length=MAX_TOKENS
     )
     
     return llm
 
 def get_embeddings():
     """Initialize and return the embeddings model."""
-    # SentenceTransformers can be used locally without an API key
-    return HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL
-    )
+    if EMBEDDING_BACKEND == "onnx":
+        # Imported lazily so the torch backend doesn't need onnxruntime installed
+        from app.core.onnx_embeddings import OnnxEmbeddings
+        embeddings = OnnxEmbeddings(EMBEDDING_MODEL)
+        cache_name = f"{EMBEDDING_MODEL}:onnx{'-int8' if ONNX_QUANTIZE else ''}"
+    elif EMBEDDING_BACKEND == "torch":
+        # SentenceTransformers can be used locally without an API key
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}
+        )
+        cache_name = EMBEDDING_MODEL
+    else:
+        raise ValueError(f"Unsupported embedding backend: {EMBEDDING_BACKEND}")
+    
+    # Serve repeated texts from the persistent cache instead of recomputing them.
+    # The backend is part of the cache key since int8 vectors differ slightly.
+    if EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(embeddings, cache_name)
+    
+    return embeddings
 
-def get_chat_model():
+def get_chat_model(llm=None):
     """
     Create a chat-like interface using a regular LLM.
     This is necessary because many free HF models don't have chat interfaces.
     """
-    llm = get_llm()
+    if llm is None:
+        llm = get_llm()
     
     # Create a chat-like prompt template
     chat_template = """
@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain.llms.base import LLM
+from langchain.llms.utils import enforce_stop_tokens
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    LLM_MODEL,
+    MAX_TOKENS,
+    DEFAULT_TEMPERATURE,
+    LOCAL_LLM_QUANTIZE,
+    LOCAL_LLM_MAX_BATCH_SIZE,
+    LOCAL_LLM_MAX_WAIT_MS,
+    LOCAL_LLM_MAX_INPUT_TOKENS,
+    LOCAL_LLM_THREADS,
+    QUERY_TIMEOUT
+)
+
+class LocalGenerator:
+    """Runs a transformers model on CPU, generating for a batch of prompts at once.
+    
+    Encoder-decoder models (like flan-t5) and decoder-only models are both
+    supported. With quantize=True the linear layers are converted with
+    torch's dynamic int8 quantization.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = LLM_MODEL,
+        quantize: bool = LOCAL_LLM_QUANTIZE,
+        max_input_tokens: int = LOCAL_LLM_MAX_INPUT_TOKENS,
+        num_threads: int = LOCAL_LLM_THREADS
+    ):
+        import torch
+        from transformers import AutoConfig, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoTokenizer
+        
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.encoder_decoder = AutoConfig.from_pretrained(model_name).is_encoder_decoder
+        if self.encoder_decoder:
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        else:
+            model = AutoModelForCausalLM.from_pretrained(model_name)
+            # Decoder-only models continue the prompt, so pad on the left
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+    
+    def generate(self, prompts: List[str], max_new_tokens: int, temperature: float) -> List[str]:
+        """Generate a completion for every prompt in one padded batch."""
+        import torch
+        
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=self.max_input_tokens)
+        sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **sampling
+            )
+        if not self.encoder_decoder:
+            outputs = outputs[:, inputs["input_ids"].shape[1]:]
+        return [text.strip() for text in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+class BatchScheduler:
+    """Collects concurrent generation requests and runs them as batches.
+    
+    The first waiting request holds the batch open for at most max_wait_ms
+    so others can join; a full batch of max_batch_size runs at once. Each
+    request gets a Future, and one cancelled before its batch starts is
+    left out of it.
+    """
+    
+    def __init__(
+        self,
+        generate: Callable[..., List[str]],
+        max_batch_size: int = LOCAL_LLM_MAX_BATCH_SIZE,
+        max_wait_ms: float = LOCAL_LLM_MAX_WAIT_MS
+    ):
+        self.generate = generate
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self.cancelled = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # The worker thread doesn't survive a fork, so a forked process starts its own
+        os.register_at_fork(after_in_child=self._reset)
+    
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def submit(self, prompt: str, **options) -> Future:
+        """Queue a prompt; the Future resolves to its completion."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+                self._worker.start()
+        future: Future = Future()
+        self._queue.put((prompt, options, future))
+        return future
+    
+    def _run(self):
+        """Form batches from the queue and generate them."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            live = [request for request in batch if request[2].set_running_or_notify_cancel()]
+            self.cancelled += len(batch) - len(live)
+            # Requests with different generation options can't share a generate call
+            groups: Dict[Tuple, List[Tuple[str, Dict[str, Any], Future]]] = {}
+            for request in live:
+                groups.setdefault(tuple(sorted(request[1].items())), []).append(request)
+            for requests in groups.values():
+                self._generate(requests)
+    
+    def _generate(self, requests: List[Tuple[str, Dict[str, Any], Future]]):
+        """Run one generate call and hand each request its completion."""
+        try:
+            completions = self.generate([prompt for prompt, _, _ in requests], **requests[0][1])
+        except Exception as e:
+            for _, _, future in requests:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(requests)
+        for (_, _, future), completion in zip(requests, completions):
+            future.set_result(completion)
+    
+    def stats(self) -> Dict[str, float]:
+        """Return the batch counters, the average batch size and the number of queued requests."""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "cancelled": self.cancelled,
+            "queued": self._queue.qsize(),
+            "average_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0
+        }
+
+class LocalLLM(LLM):
+    """LangChain LLM served in-process by a batching scheduler."""
+    
+    scheduler: Any
+    max_new_tokens: int = MAX_TOKENS
+    temperature: float = DEFAULT_TEMPERATURE
+    # Seconds to wait for a completion before cancelling the request
+    timeout: Optional[float] = QUERY_TIMEOUT
+    
+    @classmethod
+    def from_model(cls, model_name: str = LLM_MODEL, **kwargs) -> "LocalLLM":
+        """Load a model and put a scheduler in front of it."""
+        generator = LocalGenerator(model_name)
+        return cls(scheduler=BatchScheduler(generator.generate), **kwargs)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "local-transformers"
+    
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        future = self.scheduler.submit(prompt, max_new_tokens=self.max_new_tokens, temperature=self.temperature)
+        try:
+            text = future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Leaves the batch it hasn't joined yet; one already generating runs to completion
+            future.cancel()
+            raise
+        return enforce_stop_tokens(text, stop) if stop else text
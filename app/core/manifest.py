@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import INGEST_MANIFEST_PATH
+
+class IngestManifest:
+    """Records, per ingested source, its content hash and the IDs of its chunks.
+    
+    This is what lets re-ingestion skip unchanged sources, embed only new
+    chunks and delete the ones that disappeared. It also logs which
+    documents changed, so every process's answer cache can drop answers
+    built from their old versions.
+    """
+    
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "source TEXT PRIMARY KEY, content_hash TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "source TEXT NOT NULL, point_id TEXT NOT NULL, chunk_id INTEGER NOT NULL, "
+            "PRIMARY KEY (source, point_id))"
+        )
+        # Each row is one document change; the generation only ever grows
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "generation INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT NOT NULL, changed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+    
+    def get_content_hash(self, source: str) -> Optional[str]:
+        """Return the content hash recorded for a source, if any."""
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+    
+    def get_chunks(self, source: str) -> Dict[str, int]:
+        """Return the recorded point IDs of a source mapped to their chunk numbers."""
+        with self._lock:
+            rows = self._db.execute("SELECT point_id, chunk_id FROM chunks WHERE source = ? ORDER BY chunk_id", (source,)).fetchall()
+        return dict(rows)
+    
+    def set_source(self, source: str, content_hash: str, chunks: Dict[str, int]):
+        """Replace everything recorded for a source in one transaction."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._db.executemany(
+                "INSERT INTO chunks (source, point_id, chunk_id) VALUES (?, ?, ?)",
+                [(source, point_id, chunk_id) for point_id, chunk_id in chunks.items()]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (source, content_hash, updated_at) VALUES (?, ?, ?)",
+                (source, content_hash, time.time())
+            )
+    
+    def record_changes(self, sources: Iterable[str], keep: float):
+        """Log that documents changed, forgetting changes older than keep seconds."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO changes (source, changed_at) VALUES (?, ?)",
+                [(source, now) for source in set(sources)]
+            )
+            self._db.execute("DELETE FROM changes WHERE changed_at < ?", (now - keep,))
+    
+    def changes_since(self, generation: int) -> Tuple[int, Set[str]]:
+        """Return the latest generation and the documents changed after the given one."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT generation, source FROM changes WHERE generation > ? ORDER BY generation", (generation,)
+            ).fetchall()
+        if not rows:
+            return generation, set()
+        return rows[-1][0], {source for _, source in rows}
@@ -1,76 +1,390 @@
 import os
 import sys
-from langchain.vectorstores import Qdrant
+import uuid
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from langchain.schema import BaseRetriever, Document
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from qdrant_client.models import PointStruct, PointIdsList, Filter, FieldCondition, MatchValue, MatchAny, Range, SearchRequest, SetPayload, SetPayloadOperation
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from app.config import VECTOR_DB_PATH, COLLECTION_NAME
-from app.core.llm import get_llm, get_embeddings, get_chat_model
+from app.config import (
+    COLLECTION_NAME,
+    QDRANT_UPSERT_BATCH_SIZE,
+    RETRIEVAL_DOCUMENT_K,
+    RETRIEVAL_CONVERSATION_K,
+    RETRIEVAL_MODE,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_SPARSE_WEIGHT,
+    RRF_K,
+    RERANK_ENABLED,
+    RERANK_CANDIDATES
+)
+from app.core.resources import SharedResources, get_resources
+from app.core.qdrant_collections import search_params
+from app.core.metrics import stage
+
+# Conversation turns stored in the documents collection by earlier versions
+EXCLUDE_CONVERSATIONS = FieldCondition(key="metadata.type", match=MatchValue(value="conversation"))
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+RETRIEVAL_MODES = ("dense", "hybrid")
+
+# Runs lexical searches while the query is embedded and searched in Qdrant
+_lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+
+def build_filter(filters: Optional[Dict[str, Any]] = None) -> Filter:
+    """Turn a metadata filter into a Qdrant filter over the documents collection.
+    
+    Each key is a chunk metadata field. A value matches exactly, a list
+    matches any of its items and a dict of gt/gte/lt/lte bounds matches a
+    range, e.g. {"file_name": "report.pdf", "ingested_at": {"gte": 1700000000}}.
+    """
+    conditions = []
+    for field, value in (filters or {}).items():
+        key = f"metadata.{field}"
+        if isinstance(value, dict):
+            unknown = set(value) - set(RANGE_OPERATORS)
+            if unknown or not value:
+                raise ValueError(f"Unsupported range for '{field}': use {', '.join(RANGE_OPERATORS)}")
+            conditions.append(FieldCondition(key=key, range=Range(**value)))
+        elif isinstance(value, list):
+            conditions.append(FieldCondition(key=key, match=MatchAny(any=value)))
+        elif isinstance(value, (str, int, bool)):
+            conditions.append(FieldCondition(key=key, match=MatchValue(value=value)))
+        else:
+            raise ValueError(f"Unsupported filter value for '{field}': {value!r}")
+    return Filter(must=conditions or None, must_not=[EXCLUDE_CONVERSATIONS])
+
+def resolve_weights(weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Fill in the configured dense and sparse fusion weights not given for a query."""
+    resolved = {"dense": HYBRID_DENSE_WEIGHT, "sparse": HYBRID_SPARSE_WEIGHT}
+    for name, weight in (weights or {}).items():
+        if name not in resolved:
+            raise ValueError(f"Unsupported retrieval weight '{name}': use dense or sparse")
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"Retrieval weight '{name}' must be a non-negative number")
+        resolved[name] = float(weight)
+    return resolved
+
+def embed_queries(embeddings: Any, queries: List[str]) -> List[List[float]]:
+    """Embed several queries in one batched call."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    # The supported models embed queries and documents alike
+    return embeddings.embed_documents(queries)
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], weights: List[float], k: int = RRF_K) -> List[Document]:
+    """Merge rankings by the weighted sum of 1 / (k + rank) each document gets in them."""
+    scores: Dict[Tuple, float] = {}
+    documents: Dict[Tuple, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            # The same chunk found by both searches arrives as two Document objects
+            key = (doc.metadata.get("source"), doc.metadata.get("chunk_id"), doc.page_content)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+class MergedRetriever(BaseRetriever):
+    """Retriever over both the documents and the conversations collections."""
+    
+    memory_manager: Any
+    
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.memory_manager.retrieve(query)
 
 class MemoryManager:
     """Manages the RAG memory system using a vector database."""
     
-    def __init__(self):
-        self.embeddings = get_embeddings()
-        self.llm = get_llm()
-        self.chat_model = get_chat_model()
-        self.client = self._init_qdrant_client()
-        self.vectorstore = self._init_vector_store()
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+    def __init__(self, resources: SharedResources = None, retrieval_mode: str = RETRIEVAL_MODE, rerank: bool = RERANK_ENABLED):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {retrieval_mode}")
         
-    def _init_qdrant_client(self):
-        """Initialize the Qdrant client."""
-        os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-        return QdrantClient(path=VECTOR_DB_PATH)
-    
-    def _init_vector_store(self):
-        """Initialize the vector store."""
-        collections = self.client.get_collections().collections
-        collection_names = [collection.name for collection in collections]
-        
-        # Get vector dimension from the embedding model
-        vector_size = len(self.embeddings.embed_query("test"))
-        
-        if COLLECTION_NAME not in collection_names:
-            self.client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-            )
-            
-        return Qdrant(
-            client=self.client, 
-            collection_name=COLLECTION_NAME,
-            embeddings=self.embeddings
-        )
+        # Models and clients are shared process-wide; chat memory lives in resources.sessions
+        self.resources = resources or get_resources()
+        self.retrieval_mode = retrieval_mode
+        self.embeddings = self.resources.embeddings
+        self.llm = self.resources.llm
+        self.chat_model = self.resources.chat_model
+        self.client = self.resources.qdrant_client
+        self.vectorstore = self.resources.vectorstore
+        self.conversation_store = self.resources.conversation_store
+        self.lexical_index = self.resources.lexical_index if retrieval_mode == "hybrid" else None
+        self.reranker = self.resources.reranker if rerank else None
     
     def get_retriever(self):
         """Get the retriever for RAG."""
-        return self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}
-        )
+        return MergedRetriever(memory_manager=self)
+    
+    def retrieve(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> List[Document]:
+        """Retrieve documents and past conversation turns relevant to a query."""
+        query_filter, weights = build_filter(filters), resolve_weights(weights)
+        document_k = self._candidate_k(RETRIEVAL_DOCUMENT_K)
+        # The lexical search runs while the query is embedded
+        lexical = self._start_lexical_search(query, document_k, filters, weights)
+        with stage("embed"):
+            embedding = self.embeddings.embed_query(query)
+        dense = self._dense_search(embedding, document_k, RETRIEVAL_CONVERSATION_K, query_filter, filters)
+        return self._rerank(query, self._fuse(dense, lexical, weights))
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> List[List[Document]]:
+        """Retrieve for many queries at once, like retrieve does for one.
+        
+        The queries are embedded in one batch and each collection is searched
+        with a single batch request. BM25 searches run in the background
+        meanwhile; fusion and reranking are still done per query.
+        """
+        if not queries:
+            return []
+        query_filter, weights = build_filter(filters), resolve_weights(weights)
+        document_k = self._candidate_k(RETRIEVAL_DOCUMENT_K)
+        lexical = [self._start_lexical_search(query, document_k, filters, weights) for query in queries]
+        with stage("embed"):
+            embeddings = embed_queries(self.embeddings, queries)
+        dense = self._dense_search_batch(embeddings, document_k, RETRIEVAL_CONVERSATION_K, query_filter, filters)
+        return [
+            self._rerank(query, self._fuse(results, search, weights))
+            for query, results, search in zip(queries, dense, lexical)
+        ]
+    
+    def retrieve_by_vector(
+        self,
+        embedding: List[float],
+        document_k: int = RETRIEVAL_DOCUMENT_K,
+        conversation_k: int = RETRIEVAL_CONVERSATION_K,
+        filters: Optional[Dict[str, Any]] = None,
+        query: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> List[Document]:
+        """Search both collections with their own k and merge the results by score.
+        
+        With filters only matching document chunks are searched; conversation
+        turns have none of the document metadata and are left out. In hybrid
+        mode, given the query text, the chunks are also searched by BM25 and
+        the two rankings fused by weighted reciprocal rank. With a reranker,
+        a wider set of candidates is fetched and reranked against the query.
+        """
+        query_filter, weights = build_filter(filters), resolve_weights(weights)
+        if query:
+            document_k = self._candidate_k(document_k)
+        lexical = self._start_lexical_search(query, document_k, filters, weights) if query else None
+        dense = self._dense_search(embedding, document_k, conversation_k, query_filter, filters)
+        results = self._fuse(dense, lexical, weights)
+        return self._rerank(query, results) if query else results
+    
+    def _candidate_k(self, document_k: int) -> int:
+        """Number of chunks to fetch, widened when they will be reranked."""
+        return max(document_k, RERANK_CANDIDATES) if self.reranker is not None else document_k
+    
+    def _rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """Keep the candidates the cross-encoder scores best, if reranking is on."""
+        if self.reranker is None:
+            return docs
+        with stage("rerank"):
+            return self.reranker.rerank(query, docs)
+    
+    def _dense_search(
+        self,
+        embedding: List[float],
+        document_k: int,
+        conversation_k: int,
+        query_filter: Filter,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search both collections by vector and merge the results by score."""
+        return self._dense_search_batch([embedding], document_k, conversation_k, query_filter, filters)[0]
+    
+    def _dense_search_batch(
+        self,
+        embeddings: List[List[float]],
+        document_k: int,
+        conversation_k: int,
+        query_filter: Filter,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Search both collections for every vector, one batch request per collection."""
+        with stage("search"):
+            results = self._search_store(self.vectorstore, embeddings, document_k, query_filter)
+            if conversation_k > 0 and not filters:
+                for found, turns in zip(results, self._search_store(self.conversation_store, embeddings, conversation_k)):
+                    found.extend(turns)
+        for found in results:
+            found.sort(key=lambda result: result[1], reverse=True)
+        return [[doc for doc, _ in found] for found in results]
+    
+    def _search_store(
+        self,
+        store: Any,
+        embeddings: List[List[float]],
+        k: int,
+        query_filter: Optional[Filter] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """Run one batch search against a LangChain Qdrant store's collection."""
+        params = search_params()
+        requests = [
+            SearchRequest(vector=embedding, filter=query_filter, limit=k, params=params, with_payload=True)
+            for embedding in embeddings
+        ]
+        # The LangChain store has no batch search, so its payloads are converted the way it does itself
+        return [
+            [
+                (store._document_from_scored_point(point, store.content_payload_key, store.metadata_payload_key), point.score)
+                for point in points
+            ]
+            for points in self.client.search_batch(store.collection_name, requests)
+        ]
+    
+    def _start_lexical_search(
+        self,
+        query: str,
+        k: int,
+        filters: Optional[Dict[str, Any]],
+        weights: Dict[str, float]
+    ) -> Optional[Future]:
+        """Start a BM25 search in the background, if this query uses one."""
+        if self.lexical_index is None or not weights["sparse"]:
+            return None
+        # Run in a copy of the request's context, so the search shows in its stage breakdown and carries its trace ID
+        ctx = contextvars.copy_context()
+        return _lexical_pool.submit(ctx.run, self._lexical_search, query, k, filters)
+    
+    def _lexical_search(self, query: str, k: int, filters: Optional[Dict[str, Any]]) -> List[Tuple[Document, float]]:
+        with stage("lexical_search"):
+            return self.lexical_index.search(query, k, filters)
+    
+    def _fuse(self, dense: List[Document], lexical: Optional[Future], weights: Dict[str, float]) -> List[Document]:
+        """Fuse the dense results with the BM25 ones, keeping as many results as either search returned."""
+        if lexical is None:
+            return dense
+        sparse = [doc for doc, _ in lexical.result()]
+        fused = reciprocal_rank_fusion([dense, sparse], [weights["dense"], weights["sparse"]])
+        return fused[:max(len(dense), len(sparse))]
     
     def create_rag_chain(self):
-        """Create a RAG chain for question answering."""
+        """Create a RAG chain for question answering.
+        
+        The chain has no memory of its own: callers pass chat_history with
+        each call, taken from their session's memory.
+        """
         # Using the chat model created with the regular LLM
         return ConversationalRetrievalChain.from_llm(
             llm=self.llm,
             retriever=self.get_retriever(),
-            memory=self.memory,
             return_source_documents=True
         )
     
-    def add_texts(self, texts, metadatas=None):
+    def add_texts(self, texts, metadatas=None, ids=None):
         """Add texts to the vector store."""
-        return self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+        texts = list(texts)
+        with stage("embed"):
+            embeddings = self.embeddings.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+    
+    def delete(self, ids: List[str]):
+        """Delete points from the vector store."""
+        self.client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=PointIdsList(points=ids)
+        )
+        if self.lexical_index is not None:
+            self.lexical_index.remove(ids)
+    
+    def set_metadata(self, point_id: str, metadata: Dict[str, Any]):
+        """Replace the metadata of a stored point without re-embedding it."""
+        self.set_metadatas({point_id: metadata})
+    
+    def set_metadatas(self, metadatas: Dict[str, Dict[str, Any]]):
+        """Replace the metadata of stored points, keyed by point ID, in fixed-size batches."""
+        operations = [
+            SetPayloadOperation(set_payload=SetPayload(payload={self.vectorstore.metadata_payload_key: metadata}, points=[point_id]))
+            for point_id, metadata in metadatas.items()
+        ]
+        for start in range(0, len(operations), QDRANT_UPSERT_BATCH_SIZE):
+            self.client.batch_update_points(
+                collection_name=COLLECTION_NAME,
+                update_operations=operations[start:start + QDRANT_UPSERT_BATCH_SIZE]
+            )
+        if self.lexical_index is not None:
+            self.lexical_index.set_metadatas(metadatas)
+    
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]] = None, ids: List[str] = None) -> List[str]:
+        """Add texts with precomputed embeddings to the vector store in fixed-size batches."""
+        # Filters look inside the metadata, so every point needs some
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in texts]
+        
+        # Use the same payload layout as the LangChain Qdrant store so searches see these points
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    self.vectorstore.content_payload_key: text,
+                    self.vectorstore.metadata_payload_key: metadata
+                }
+            )
+            for point_id, text, vector, metadata in zip(ids, texts, embeddings, metadatas)
+        ]
+        with stage("upsert"):
+            for start in range(0, len(points), QDRANT_UPSERT_BATCH_SIZE):
+                self.client.upsert(
+                    collection_name=COLLECTION_NAME,
+                    points=points[start:start + QDRANT_UPSERT_BATCH_SIZE]
+                )
+            if self.lexical_index is not None:
+                self.lexical_index.add(ids, texts, metadatas)
+        
+        return ids
+    
+    def rebuild_lexical_index(self, batch_size: int = 256, progress=None) -> int:
+        """Index every document chunk already in the collection from scratch.
+        
+        Only needed once, for chunks stored before hybrid retrieval was
+        enabled; new chunks are indexed as they are added.
+        """
+        if self.lexical_index is None:
+            raise ValueError("The lexical index is only kept in hybrid retrieval mode")
+        
+        self.lexical_index.clear()
+        indexed = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                COLLECTION_NAME, scroll_filter=Filter(must_not=[EXCLUDE_CONVERSATIONS]),
+                limit=batch_size, offset=offset, with_payload=True
+            )
+            if points:
+                self.lexical_index.add(
+                    [str(point.id) for point in points],
+                    [point.payload.get(self.vectorstore.content_payload_key) or "" for point in points],
+                    [point.payload.get(self.vectorstore.metadata_payload_key) or {} for point in points]
+                )
+                indexed += len(points)
+                if progress:
+                    progress(indexed)
+            if offset is None:
+                return indexed
     
-    def similarity_search(self, query, k=5):
-        """Perform a similarity search."""
-        return self.vectorstore.similarity_search(query, k=k) 
\ No newline at end of file
+    def similarity_search(self, query, k=5, filters: Optional[Dict[str, Any]] = None):
+        """Perform a similarity search over the documents, optionally restricted by chunk metadata."""
+        # Always filtered, so indexed conversation turns are left out even without filters
+        return self.vectorstore.similarity_search(
+            query, k=k, filter=build_filter(filters), search_params=search_params()
+        ) 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import time
+import uuid
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import METRICS_ENABLED, SERVER_TIMING_ENABLED, LOG_LEVEL
+
+# Latency buckets in seconds, from a cache hit to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Trace IDs accepted from the X-Request-ID header; anything else gets a new one
+TRACE_ID_PATTERN = re.compile(r"[\w.-]{1,64}")
+
+# The current request's trace ID and the stages timed while serving it
+_trace_id: ContextVar[str] = ContextVar("trace_id", default="-")
+_breakdown: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("breakdown", default=None)
+
+logger = logging.getLogger("app.requests")
+
+# Every metric, in the order /metrics lists them
+REGISTRY: List[Any] = []
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format label pairs as {name="value",...}, escaping the values."""
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+    
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+class Histogram:
+    """Observed values counted into cumulative buckets, per label combination."""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label combination: count per bucket (the last one is +Inf), sum of values
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+    
+    def observe(self, value: float, **labels: str):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+    
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+class Collected:
+    """Values read from their owner when /metrics is scraped, so keeping them costs nothing.
+    
+    collect returns a mapping of label values to the current value.
+    """
+    
+    def __init__(self, name: str, help: str, kind: str, labels: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.collect = collect
+        REGISTRY.append(self)
+    
+    def samples(self) -> Iterator[str]:
+        for key, value in self.collect().items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+STAGE_SECONDS = Histogram("assistant_stage_seconds", "Time spent in each stage of ingestion and querying", ["stage"])
+REQUEST_SECONDS = Histogram("assistant_http_request_seconds", "HTTP request latency", ["endpoint", "method", "status"])
+LLM_TOKENS = Counter("assistant_llm_tokens_total", "Estimated tokens sent to and generated by the LLM", ["direction"])
+INGESTED_CHUNKS = Counter("assistant_ingested_chunks_total", "Chunks embedded and stored by ingestion")
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        try:
+            lines.extend(metric.samples())
+        except Exception as e:
+            # A broken collector must not take the other metrics down with it
+            lines.append(f"# {metric.name} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def stage(name: str, timings: Optional[Dict[str, float]] = None):
+    """Time a block as the named stage.
+    
+    The duration goes into the stage histogram, the current request's
+    breakdown and, if given, the timings dict (in seconds). Stages may nest:
+    "embed" inside "retrieve" counts towards both.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start, timings)
+
+def record_stage(name: str, elapsed: float, timings: Optional[Dict[str, float]] = None):
+    """Record a stage timed by the caller, e.g. one whose work is spread over many steps."""
+    if timings is not None:
+        timings[name] = round(elapsed, 4)
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            breakdown.append((name, elapsed))
+
+def current_trace_id() -> str:
+    """The trace ID of the request being served, or "-" outside a request."""
+    return _trace_id.get()
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace ID to every log record as trace_id."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get()
+        return True
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Log to stderr with each line tagged by the trace ID of its request."""
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level)
+    if not app_logger.handlers:
+        app_logger.addHandler(handler)
+    app_logger.propagate = False
+
+def server_timing(breakdown: List[Tuple[str, float]], total: float) -> str:
+    """Format a stage breakdown as a Server-Timing header value, in milliseconds."""
+    durations: Dict[str, float] = {}
+    for name, seconds in list(breakdown):
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+class MetricsMiddleware:
+    """ASGI middleware giving each HTTP request a trace ID and recording its latency.
+    
+    The trace ID is taken from the X-Request-ID header when it looks like
+    one, returned in X-Request-ID and attached to every log line written
+    while serving the request. Work run through EndpointLimiter keeps it.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        requested = Headers(scope=scope).get("x-request-id", "")
+        trace_id = requested if TRACE_ID_PATTERN.fullmatch(requested) else uuid.uuid4().hex
+        breakdown: List[Tuple[str, float]] = []
+        trace_token, breakdown_token = _trace_id.set(trace_id), _breakdown.set(breakdown)
+        start = time.perf_counter()
+        status = 500
+        
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", trace_id)
+                if SERVER_TIMING_ENABLED:
+                    headers.append("Server-Timing", server_timing(breakdown, time.perf_counter() - start))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Label by endpoint function rather than path, so path parameters don't multiply the series
+            endpoint = scope.get("endpoint")
+            if METRICS_ENABLED:
+                REQUEST_SECONDS.observe(
+                    elapsed, endpoint=getattr(endpoint, "__name__", "unmatched"), method=scope["method"], status=str(status)
+                )
+            logger.info("%s %s %s %.1fms", scope["method"], scope["path"], status, elapsed * 1000)
+            _trace_id.reset(trace_token)
+            _breakdown.reset(breakdown_token)
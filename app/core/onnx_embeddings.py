@@ -0,0 +1,157 @@
+import os
+import sys
+import inspect
+import threading
+from typing import List
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_LENGTH,
+    EMBEDDING_THREADS,
+    ONNX_MODEL_DIR,
+    ONNX_QUANTIZE
+)
+
+_export_lock = threading.Lock()
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR, quantize: bool = ONNX_QUANTIZE) -> str:
+    """Export a transformer encoder to ONNX (once) and return the model path.
+    
+    With quantize=True the exported graph is also converted with dynamic
+    int8 quantization, which is what we serve on CPU-only hosts.
+    """
+    target_dir = os.path.join(model_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    int8_path = os.path.join(target_dir, "model.int8.onnx")
+    
+    with _export_lock:
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+            
+            os.makedirs(target_dir, exist_ok=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModel.from_pretrained(model_name, torchscript=True)
+            model.eval()
+            
+            # Graph inputs follow forward()'s parameter order, not the tokenizer's
+            inputs = dict(tokenizer(["export the encoder"], return_tensors="pt"))
+            parameters = inspect.signature(model.forward).parameters
+            input_names = [name for name in parameters if name in inputs]
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+            dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+            
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    args=tuple(inputs[name] for name in input_names),
+                    f=fp32_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14
+                )
+        
+        if quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    
+    return int8_path if quantize else fp32_path
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings computed with ONNX Runtime on CPU.
+    
+    Texts are sorted by token length and encoded in batches so each batch
+    is only padded to its own longest member. Vectors are mean-pooled and
+    L2-normalised, matching sentence-transformers' all-MiniLM-L6-v2.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        model_dir: str = ONNX_MODEL_DIR,
+        quantize: bool = ONNX_QUANTIZE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+        num_threads: int = EMBEDDING_THREADS
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = min(max_length, self.tokenizer.model_max_length)
+        
+        self._options = ort.SessionOptions()
+        self._options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            self._options.intra_op_num_threads = num_threads
+        
+        self._model_path = export_onnx_model(model_name, model_dir, quantize)
+        self._session = None
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        
+        # The session's thread pool doesn't survive a fork, so a forked process opens its own on first use
+        os.register_at_fork(after_in_child=self._drop_session)
+    
+    @property
+    def session(self):
+        """The inference session, created on first use in each process."""
+        if self._session is None:
+            import onnxruntime as ort
+            
+            self._session = ort.InferenceSession(self._model_path, self._options, providers=["CPUExecutionProvider"])
+        return self._session
+    
+    def _drop_session(self):
+        self._session = None
+    
+    def _encode_batch(self, features: dict) -> np.ndarray:
+        """Pad one batch to its longest member, run it through the model and pool it."""
+        lengths = [len(ids) for ids in features["input_ids"]]
+        batch = {}
+        for name, sequences in features.items():
+            pad_value = self.tokenizer.pad_token_id if name == "input_ids" else 0
+            padded = np.full((len(sequences), max(lengths)), pad_value, dtype=np.int64)
+            for row, sequence in enumerate(sequences):
+                padded[row, :len(sequence)] = sequence
+            batch[name] = padded
+        
+        feeds = {name: values for name, values in batch.items() if name in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+        
+        # Mean pooling over the real (non-padding) tokens
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled / norms
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents in length-bucketed batches."""
+        if not texts:
+            return []
+        
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_length)
+        keys = list(encoded.keys())
+        
+        # Group texts of similar length to minimise padding
+        order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+        vectors: List[List[float]] = [None] * len(texts)
+        
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            features = {key: [encoded[key][i] for i in indices] for key in keys}
+            for i, vector in zip(indices, self._encode_batch(features)):
+                vectors[i] = vector.tolist()
+        
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    Distance,
+    HnswConfigDiff,
+    PayloadSchemaType,
+    PointStruct,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams
+)
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    QDRANT_MODE,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_ALWAYS_RAM,
+    QUANTIZATION_RESCORE,
+    QUANTIZATION_OVERSAMPLING,
+    VECTORS_ON_DISK,
+    HNSW_M,
+    HNSW_EF_CONSTRUCT,
+    HNSW_EF
+)
+
+# Chunk metadata fields searches can filter on, indexed so Qdrant prunes candidates itself
+DOCUMENT_PAYLOAD_INDEXES = {
+    "metadata.source": PayloadSchemaType.KEYWORD,
+    "metadata.file_name": PayloadSchemaType.KEYWORD,
+    "metadata.original_name": PayloadSchemaType.KEYWORD,
+    "metadata.type": PayloadSchemaType.KEYWORD,
+    "metadata.chunk_id": PayloadSchemaType.INTEGER,
+    "metadata.page": PayloadSchemaType.INTEGER,
+    "metadata.ingested_at": PayloadSchemaType.FLOAT
+}
+
+def quantization_config(quantization: str = VECTOR_QUANTIZATION, always_ram: bool = QUANTIZATION_ALWAYS_RAM):
+    """Build the quantization settings for a collection, or None for full float32 vectors."""
+    if quantization == "none":
+        return None
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=always_ram))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+    raise ValueError(f"Unsupported vector quantization: {quantization}")
+
+def search_params(
+    quantization: str = VECTOR_QUANTIZATION,
+    rescore: bool = QUANTIZATION_RESCORE,
+    oversampling: float = QUANTIZATION_OVERSAMPLING,
+    hnsw_ef: int = HNSW_EF
+) -> Optional[SearchParams]:
+    """Build the search-time settings matching the collection settings, if any differ from the defaults.
+    
+    Quantized collections search the compressed vectors for oversampling x k
+    candidates and, with rescore, re-rank those with the original vectors.
+    """
+    quantization_params = None
+    if quantization != "none":
+        quantization_params = QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    if quantization_params is None and not hnsw_ef:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef or None, quantization=quantization_params)
+
+def collection_exists(client: QdrantClient, collection_name: str) -> bool:
+    """Whether a collection, or an alias pointing to one, has this name."""
+    if collection_name in {collection.name for collection in client.get_collections().collections}:
+        return True
+    return collection_name in {alias.alias_name for alias in client.get_aliases().aliases}
+
+def create_collection(
+    client: QdrantClient,
+    collection_name: str,
+    vector_size: int,
+    payload_indexes: Dict[str, PayloadSchemaType] = None,
+    quantization: str = VECTOR_QUANTIZATION,
+    on_disk: bool = VECTORS_ON_DISK
+):
+    """Create a collection with the configured vector, index and quantization settings."""
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=on_disk),
+        hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT),
+        quantization_config=quantization_config(quantization)
+    )
+    ensure_payload_indexes(client, collection_name, payload_indexes)
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, payload_indexes: Dict[str, PayloadSchemaType] = None):
+    """Create any missing payload indexes."""
+    # Embedded modes scan every point anyway and have no payload indexes
+    if not payload_indexes or QDRANT_MODE != "remote":
+        return
+    existing = client.get_collection(collection_name).payload_schema
+    for field_name, field_schema in payload_indexes.items():
+        if field_name not in existing:
+            client.create_payload_index(collection_name, field_name, field_schema)
+
+def resolve_alias(client: QdrantClient, name: str) -> Optional[str]:
+    """Return the collection an alias points to, or None if the name isn't an alias."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+def recover_rebuild(client: QdrantClient, name: str) -> Optional[str]:
+    """Finish a first rebuild that stopped between dropping the original collection and creating its alias.
+    
+    In that state the name is neither a collection nor an alias, but the
+    complete copy survives as the newest versioned collection; the alias
+    is pointed at it. Returns the collection recovered, or None.
+    """
+    collections = {collection.name for collection in client.get_collections().collections}
+    if name in collections or resolve_alias(client, name):
+        return None
+    copies = [collection for collection in collections if re.fullmatch(rf"{re.escape(name)}_\d+", collection)]
+    if not copies:
+        return None
+    target = max(copies, key=lambda collection: int(collection.rsplit("_", 1)[1]))
+    client.update_collection_aliases([CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))])
+    return target
+
+def rebuild_collection(
+    client: QdrantClient,
+    name: str,
+    payload_indexes: Dict[str, PayloadSchemaType] = None,
+    batch_size: int = 256,
+    progress: Callable[[int, int], None] = None
+) -> Dict[str, Any]:
+    """Copy a collection into a new one with the current settings and switch its name over.
+    
+    The copy is created as a versioned collection and the original name
+    becomes an alias for it, so later rebuilds switch atomically. The first
+    rebuild has to drop the original collection before the alias can take
+    its name, since Qdrant can't do both in one request; if it stops in
+    between, recover_rebuild restores the alias from the finished copy.
+    Points written during the copy are not carried over, so pause
+    ingestion while it runs.
+    """
+    recover_rebuild(client, name)
+    start = time.perf_counter()
+    source = resolve_alias(client, name) or name
+    info = client.get_collection(source)
+    total = info.points_count or 0
+    target = f"{name}_{int(time.time() * 1000)}"
+    create_collection(client, target, info.config.params.vectors.size, payload_indexes)
+    
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True)
+        if points:
+            client.upsert(target, points=[
+                PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points
+            ])
+            copied += len(points)
+            if progress:
+                progress(copied, total)
+        if offset is None:
+            break
+    
+    if source == name:
+        # The copy is complete before the original goes, so nothing is lost if we stop here
+        client.delete_collection(name)
+        client.update_collection_aliases([CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))])
+    else:
+        client.update_collection_aliases([
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=name)),
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))
+        ])
+        client.delete_collection(source)
+    
+    return {
+        "collection": name,
+        "from": source,
+        "to": target,
+        "points": copied,
+        "quantization": VECTOR_QUANTIZATION,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
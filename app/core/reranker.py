@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import threading
+from typing import Any, Dict, List, Optional
+from langchain.schema import Document
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import RERANK_MODEL, RERANK_TOP_N, RERANK_BATCH_SIZE, RERANK_BUDGET_MS
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks against the query with a small cross-encoder.
+    
+    Candidates are scored best-ranked first in batches on the CPU. Once the
+    next batch would overrun the latency budget, scoring stops and the
+    unscored candidates keep their retrieval order after the scored ones.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        top_n: int = RERANK_TOP_N,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget_ms: float = RERANK_BUDGET_MS,
+        model: Any = None
+    ):
+        if model is None:
+            # Imported lazily so the app runs without reranking when it isn't installed
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name, device="cpu", max_length=512)
+        self.model = model
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self.reranked = 0
+        self.over_budget = 0
+        # Queries are reranked concurrently from the request threads
+        self._lock = threading.Lock()
+    
+    def rerank(self, query: str, docs: List[Document], top_n: Optional[int] = None) -> List[Document]:
+        """Return the top_n candidates by cross-encoder score."""
+        top_n = top_n or self.top_n
+        if len(docs) <= 1:
+            return docs[:top_n]
+        
+        start = time.perf_counter()
+        deadline = start + self.budget
+        scores: List[float] = []
+        over_budget = False
+        while len(scores) < len(docs):
+            if scores:
+                # Stop if the next batch is expected to run past the deadline
+                per_batch = (time.perf_counter() - start) / (len(scores) / self.batch_size)
+                if time.perf_counter() + per_batch > deadline:
+                    over_budget = True
+                    break
+            batch = docs[len(scores):len(scores) + self.batch_size]
+            scores.extend(float(score) for score in self.model.predict(
+                [(query, doc.page_content) for doc in batch], batch_size=len(batch), show_progress_bar=False
+            ))
+        
+        with self._lock:
+            self.reranked += 1
+            self.over_budget += over_budget
+        order = sorted(range(len(scores)), key=scores.__getitem__, reverse=True) + list(range(len(scores), len(docs)))
+        return [docs[i] for i in order[:top_n]]
+    
+    def stats(self) -> Dict[str, int]:
+        """Return how many queries were reranked and how many ran out of budget."""
+        with self._lock:
+            return {"reranked": self.reranked, "over_budget": self.over_budget}
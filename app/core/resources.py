@@ -0,0 +1,250 @@
+import os
+import sys
+import inspect
+import functools
+import threading
+from typing import Any, Callable, Dict, Optional
+import httpx
+from langchain.vectorstores import Qdrant
+from qdrant_client import QdrantClient
+from qdrant_client.models import PayloadSchemaType
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    QDRANT_MODE,
+    QDRANT_URL,
+    QDRANT_API_KEY,
+    QDRANT_PREFER_GRPC,
+    QDRANT_GRPC_PORT,
+    QDRANT_TIMEOUT,
+    QDRANT_POOL_SIZE,
+    VECTOR_DB_PATH,
+    COLLECTION_NAME,
+    CONVERSATION_COLLECTION_NAME,
+    MEMORY_MODE,
+    RERANK_ENABLED
+)
+from app.core.llm import get_llm, get_embeddings, get_chat_model
+from app.core.manifest import IngestManifest
+from app.core.ingest_jobs import IngestJobQueue
+from app.core.lexical_index import LexicalIndex
+from app.core.reranker import CrossEncoderReranker
+from app.core.context import ContextAssembler
+from app.core.answer_cache import AnswerCache
+from app.core.sessions import SessionStore
+from app.core.conversation_index import ConversationIndexer
+from app.core.qdrant_collections import DOCUMENT_PAYLOAD_INDEXES, collection_exists, create_collection, ensure_payload_indexes, recover_rebuild
+
+class SerializedClient(QdrantClient):
+    """A Qdrant client whose public methods run one at a time.
+    
+    The embedded client isn't thread-safe: a search running while the
+    conversation indexer or an ingestion upserts can fail or return
+    mismatched results. Only QdrantClient's public methods are wrapped
+    (below the class), so this doesn't depend on the client's internals,
+    and it still is a QdrantClient as the LangChain vector store requires.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        self._serial_lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+def _serialized(method: Callable) -> Callable:
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        with self._serial_lock:
+            return method(self, *args, **kwargs)
+    return call
+
+for _name, _method in inspect.getmembers(QdrantClient, inspect.isfunction):
+    if not _name.startswith("_"):
+        setattr(SerializedClient, _name, _serialized(_method))
+
+class SharedResources:
+    """Process-wide registry of the models and clients used by every session.
+    
+    Each resource is built lazily on first access, exactly once, and then
+    handed to every MemoryManager/AssistantAgent in the process.
+    """
+    
+    def __init__(
+        self,
+        embeddings_factory: Callable[[], Any] = None,
+        llm_factory: Callable[[], Any] = None,
+        reranker_factory: Callable[[], Any] = None
+    ):
+        self._embeddings_factory = embeddings_factory or get_embeddings
+        self._llm_factory = llm_factory or get_llm
+        self._reranker_factory = reranker_factory or CrossEncoderReranker
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+    
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Return the named resource, building it under the lock if needed."""
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+    
+    def loaded(self, name: str) -> Optional[Any]:
+        """Return the named resource if it has been built, without building it."""
+        return self._instances.get(name)
+    
+    @property
+    def embeddings(self):
+        """The shared embeddings model."""
+        return self._get("embeddings", self._embeddings_factory)
+    
+    @property
+    def llm(self):
+        """The shared LLM client."""
+        return self._get("llm", self._llm_factory)
+    
+    @property
+    def reranker(self) -> CrossEncoderReranker:
+        """The shared cross-encoder reranker."""
+        return self._get("reranker", self._reranker_factory)
+    
+    @property
+    def context_assembler(self) -> ContextAssembler:
+        """The shared packer of retrieved chunks into prompt context."""
+        return self._get("context_assembler", ContextAssembler)
+    
+    @property
+    def chat_model(self):
+        """The chat-style chain built on top of the shared LLM."""
+        return self._get("chat_model", lambda: get_chat_model(self.llm))
+    
+    @property
+    def qdrant_client(self) -> QdrantClient:
+        """The shared Qdrant client."""
+        return self._get("qdrant_client", self._init_qdrant_client)
+    
+    @property
+    def vectorstore(self) -> Qdrant:
+        """The shared vector store for the documents collection."""
+        return self._get("vectorstore", lambda: self._init_vector_store(COLLECTION_NAME, DOCUMENT_PAYLOAD_INDEXES))
+    
+    @property
+    def conversation_store(self) -> Qdrant:
+        """The shared vector store for past conversation turns."""
+        return self._get("conversation_store", lambda: self._init_vector_store(CONVERSATION_COLLECTION_NAME))
+    
+    @property
+    def conversation_indexer(self) -> ConversationIndexer:
+        """The background writer of conversation turns."""
+        return self._get("conversation_indexer", lambda: ConversationIndexer(self.conversation_store))
+    
+    @property
+    def manifest(self) -> IngestManifest:
+        """The shared record of ingested sources and their chunks."""
+        return self._get("manifest", IngestManifest)
+    
+    @property
+    def ingest_jobs(self) -> IngestJobQueue:
+        """The persistent queue of ingestion jobs."""
+        return self._get("ingest_jobs", IngestJobQueue)
+    
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """The shared BM25 index of the document chunks."""
+        return self._get("lexical_index", LexicalIndex)
+    
+    @property
+    def answer_cache(self) -> AnswerCache:
+        """The shared cache of answers to earlier questions."""
+        return self._get("answer_cache", lambda: AnswerCache(self.embeddings, manifest=self.manifest))
+    
+    @property
+    def sessions(self) -> SessionStore:
+        """The shared per-session conversation memories."""
+        return self._get("sessions", lambda: SessionStore(llm=self.llm if MEMORY_MODE == "summary" else None))
+    
+    def _init_qdrant_client(self) -> QdrantClient:
+        """Initialize the Qdrant client for the configured mode."""
+        if QDRANT_MODE in ("local", "memory"):
+            if QDRANT_MODE == "local":
+                # Embedded mode locks the directory, so only one process can use it
+                os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+                return SerializedClient(path=VECTOR_DB_PATH)
+            return SerializedClient(location=":memory:")
+        if QDRANT_MODE == "remote":
+            return QdrantClient(
+                url=QDRANT_URL,
+                api_key=QDRANT_API_KEY or None,
+                prefer_grpc=QDRANT_PREFER_GRPC,
+                grpc_port=QDRANT_GRPC_PORT,
+                timeout=QDRANT_TIMEOUT,
+                # Reuse connections across requests instead of reconnecting every time
+                limits=httpx.Limits(max_connections=QDRANT_POOL_SIZE, max_keepalive_connections=QDRANT_POOL_SIZE)
+            )
+        raise ValueError(f"Unsupported Qdrant mode: {QDRANT_MODE}")
+    
+    def _init_vector_store(self, collection_name: str, payload_indexes: Dict[str, PayloadSchemaType] = None) -> Qdrant:
+        """Initialize a vector store, creating its collection and payload indexes if needed."""
+        client = self.qdrant_client
+        
+        # Don't replace an interrupted migration's copy with an empty collection
+        recover_rebuild(client, collection_name)
+        if not collection_exists(client, collection_name):
+            # Only probe the embedding model for its dimension when we actually need it
+            vector_size = len(self.embeddings.embed_query("test"))
+            create_collection(client, collection_name, vector_size, payload_indexes)
+        else:
+            ensure_payload_indexes(client, collection_name, payload_indexes)
+        
+        return Qdrant(
+            client=client,
+            collection_name=collection_name,
+            embeddings=self.embeddings
+        )
+    
+    def preload(self):
+        """Load the models only, opening no clients, files or threads.
+        
+        Safe to call before forking worker processes, which then share the
+        loaded weights copy-on-write.
+        """
+        self.embeddings
+        self.llm
+        if RERANK_ENABLED:
+            self.reranker
+    
+    def warm_up(self):
+        """Build every resource up front and run one embedding pass."""
+        self.llm
+        if RERANK_ENABLED:
+            self.reranker
+        self.chat_model
+        self.vectorstore
+        self.conversation_store
+        self.embeddings.embed_query("warm up")
+    
+    def close(self):
+        """Write out pending background work."""
+        indexer = self._instances.get("conversation_indexer")
+        if indexer is not None:
+            indexer.close()
+
+_resources: Optional[SharedResources] = None
+_resources_lock = threading.Lock()
+
+def get_resources() -> SharedResources:
+    """Return the process-wide shared resources, creating the registry on first use."""
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = SharedResources()
+    return _resources
+
+def set_resources(resources: SharedResources):
+    """Replace the process-wide shared resources (e.g. with stand-in models)."""
+    global _resources
+    with _resources_lock:
+        _resources = resources
@@ -0,0 +1,212 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain.schema import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    get_buffer_string,
+    messages_from_dict,
+    messages_to_dict
+)
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import (
+    MEMORY_MODE,
+    MEMORY_MAX_TOKENS,
+    SESSION_IDLE_TIMEOUT,
+    SESSION_STORE_PATH,
+    SESSION_RETENTION
+)
+
+# How often idle sessions are looked for, in seconds
+SWEEP_INTERVAL = 60
+
+def count_tokens(text: str) -> int:
+    """Cheaply estimate the number of tokens in a text (words and punctuation)."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+class SessionMemory:
+    """Chat history of one session, kept within a token budget.
+    
+    Once the history exceeds max_tokens the oldest exchanges are dropped, or,
+    when a summarizer is given, folded into a rolling summary. It offers the
+    load_memory_variables/save_context interface of LangChain memories.
+    """
+    
+    def __init__(
+        self,
+        max_tokens: int = MEMORY_MAX_TOKENS,
+        summarize: Callable[[str, List[BaseMessage]], str] = None,
+        messages: List[BaseMessage] = None,
+        summary: str = "",
+        on_change: Callable[["SessionMemory"], None] = None
+    ):
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.messages: List[BaseMessage] = messages or []
+        self.summary = summary
+        self.on_change = on_change
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+    
+    def load_memory_variables(self, inputs: Dict[str, Any] = None) -> Dict[str, List[BaseMessage]]:
+        """Return the chat history, preceded by the summary of older exchanges if any."""
+        with self._lock:
+            self.last_used = time.time()
+            history = list(self.messages)
+            if self.summary:
+                history.insert(0, SystemMessage(content=self.summary))
+        return {"chat_history": history}
+    
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        """Record one exchange and trim the history back within budget."""
+        with self._lock:
+            self.last_used = time.time()
+            self.messages.append(HumanMessage(content=inputs["question"]))
+            self.messages.append(AIMessage(content=outputs["answer"]))
+            
+            dropped = []
+            # Always keep the latest exchange, even if it alone is over budget
+            while len(self.messages) > 2 and self._tokens() > self.max_tokens:
+                dropped.extend(self.messages[:2])
+                del self.messages[:2]
+            
+            if dropped and self.summarize is not None:
+                self.summary = self.summarize(self.summary, dropped)
+        
+        if self.on_change is not None:
+            self.on_change(self)
+    
+    def _tokens(self) -> int:
+        """Number of tokens the history adds to a prompt."""
+        return count_tokens(self.summary) + count_tokens(get_buffer_string(self.messages))
+    
+    def clear(self):
+        """Forget the whole conversation."""
+        with self._lock:
+            self.messages = []
+            self.summary = ""
+        if self.on_change is not None:
+            self.on_change(self)
+
+class SessionStore:
+    """Keeps a bounded conversation memory per session ID.
+    
+    Sessions idle for longer than idle_timeout are evicted from memory. With
+    a path, sessions are also written to SQLite so they survive eviction and
+    restarts; rows idle for longer than the retention period are deleted.
+    """
+    
+    def __init__(
+        self,
+        llm=None,
+        mode: str = MEMORY_MODE,
+        max_tokens: int = MEMORY_MAX_TOKENS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        path: str = SESSION_STORE_PATH,
+        retention: float = SESSION_RETENTION
+    ):
+        if mode not in ("window", "summary"):
+            raise ValueError(f"Unsupported memory mode: {mode}")
+        if mode == "summary" and llm is None:
+            raise ValueError("Summary memory needs an LLM")
+        
+        self.llm = llm
+        self.mode = mode
+        self.max_tokens = max_tokens
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        self._sessions: Dict[str, SessionMemory] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, messages TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    def _summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        """Fold dropped messages into the rolling summary with one LLM call."""
+        return self.llm.invoke(SUMMARY_PROMPT.format(summary=summary, new_lines=get_buffer_string(messages))).strip()
+    
+    def get(self, session_id: str) -> SessionMemory:
+        """Return the memory of a session, creating or reloading it if needed."""
+        self._sweep()
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is None or self._changed_elsewhere(session_id, memory):
+                memory = self._load(session_id)
+                self._sessions[session_id] = memory
+        return memory
+    
+    def _changed_elsewhere(self, session_id: str, memory: SessionMemory) -> bool:
+        """Whether another worker process saved the session since it was loaded here."""
+        if self._db is None:
+            return False
+        row = self._db.execute("SELECT last_used FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None and row[0] > memory.last_used
+    
+    def delete(self, session_id: str):
+        """Forget a session entirely."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def _load(self, session_id: str) -> SessionMemory:
+        """Build a session's memory, from disk if it was stored there."""
+        summary, messages = "", []
+        if self._db is not None:
+            row = self._db.execute("SELECT summary, messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row:
+                summary, messages = row[0], messages_from_dict(json.loads(row[1]))
+        
+        return SessionMemory(
+            max_tokens=self.max_tokens,
+            summarize=self._summarize if self.mode == "summary" else None,
+            messages=messages,
+            summary=summary,
+            on_change=(lambda memory: self._persist(session_id, memory)) if self._db is not None else None
+        )
+    
+    def _persist(self, session_id: str, memory: SessionMemory):
+        """Write a session through to disk."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, summary, messages, last_used) VALUES (?, ?, ?, ?)",
+                (session_id, memory.summary, json.dumps(messages_to_dict(memory.messages)), memory.last_used)
+            )
+    
+    def _sweep(self):
+        """Evict idle sessions from memory and expired ones from disk."""
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        
+        with self._lock:
+            self._last_sweep = now
+            idle = [session_id for session_id, memory in self._sessions.items() if now - memory.last_used > self.idle_timeout]
+            for session_id in idle:
+                del self._sessions[session_id]
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.retention,))
@@ -0,0 +1,76 @@
+import os
+import sys
+import uuid
+import hashlib
+from typing import BinaryIO, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.config import MAX_UPLOAD_MB
+from app.utils.helpers import get_document_path, get_documents_dir
+
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Uploads are copied this many bytes at a time, whatever their size
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+# Room for the multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload is bigger than the configured limit."""
+    
+    def __init__(self, max_bytes: int = MAX_UPLOAD_BYTES):
+        super().__init__(f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit")
+        self.max_bytes = max_bytes
+
+def save_upload(stream: BinaryIO, filename: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str]:
+    """Copy an upload into the documents directory, hashing it on the way.
+    
+    The data is read in fixed-size blocks, so memory use doesn't grow with
+    the file. It's written to a hidden partial file and only renamed into
+    place once complete, under a path that includes the content hash; an
+    upload over max_bytes is discarded and raises UploadTooLarge. Returns
+    the stored path and the SHA-256 of the content.
+    """
+    partial_path = os.path.join(get_documents_dir(), f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(partial_path, "wb") as f:
+            for block in iter(lambda: stream.read(UPLOAD_BLOCK_SIZE), b""):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(block)
+                f.write(block)
+        doc_path = get_document_path(filename, digest.hexdigest())
+        os.replace(partial_path, doc_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+    
+    return doc_path, digest.hexdigest()
+
+class UploadLimitMiddleware:
+    """ASGI middleware rejecting requests whose declared body exceeds the upload limit.
+    
+    This answers 413 before the body is read, so an oversized upload isn't
+    spooled to disk first. Bodies sent without a Content-Length are still
+    capped by save_upload as they are copied.
+    """
+    
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            length = Headers(scope=scope).get("content-length", "")
+            if length.isdigit() and int(length) > self.max_bytes + MULTIPART_OVERHEAD:
+                response = JSONResponse({"detail": str(UploadTooLarge(self.max_bytes))}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
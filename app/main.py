@@ -1,23 +1,47 @@
 import os
 import sys
+import json
+import uuid
+import asyncio
 import uvicorn
 from fastapi import FastAPI, HTTPException, Depends, Request, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.core.agent import AssistantAgent
-from app.core.ingestion import DocumentProcessor
-from app.utils.helpers import get_document_path
-from app.config import create_env_example
+from app.core.ingestion import DocumentProcessor, LOADERS
+from app.core.ingest_jobs import IngestWorkers
+from app.core.memory import MemoryManager, build_filter, resolve_weights
+from app.core.resources import get_resources
+from app.core.concurrency import EndpointLimiter, Overloaded
+from app.core.inference_client import CircuitOpen, InferenceClient
+from app.core.embedding_cache import CachedEmbeddings
+from app.core.metrics import Collected, MetricsMiddleware, configure_logging, render
+from app.core.uploads import UploadLimitMiddleware, UploadTooLarge, save_upload
+from app.config import (
+    create_env_example,
+    WARMUP_ON_STARTUP,
+    INFERENCE_WORKERS,
+    QUERY_MAX_IN_FLIGHT,
+    QUERY_TIMEOUT,
+    QUERY_BATCH_MAX_SIZE,
+    QUERY_BATCH_MAX_IN_FLIGHT,
+    QUERY_BATCH_TIMEOUT,
+    METRICS_ENABLED
+)
 
 # Create .env.example file if it doesn't exist
 create_env_example()
 
+configure_logging()
+
 # Create FastAPI app
 app = FastAPI(
     title="Personal AI Assistant API",
@@ -34,17 +58,124 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the agent and document processor
-agent = AssistantAgent()
+# Reject oversized uploads before their body is read
+app.add_middleware(UploadLimitMiddleware)
+
+# Trace IDs and request latency for every request
+app.add_middleware(MetricsMiddleware)
+
+# Initialize the agent and document processor on top of the shared resources
+resources = get_resources()
+agent = AssistantAgent(MemoryManager(resources))
 document_processor = DocumentProcessor(agent.memory_manager)
+# Ingestion runs as queued jobs, so uploads return as soon as the file is stored
+ingest_workers = IngestWorkers(resources.ingest_jobs, document_processor)
+
+# Blocking work runs on separately sized executors so the event loop stays responsive
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+query_limiter = EndpointLimiter("query", inference_executor, QUERY_MAX_IN_FLIGHT, QUERY_TIMEOUT)
+# Batches get their own threads so a long evaluation run can't hold up interactive queries
+batch_executor = ThreadPoolExecutor(max_workers=QUERY_BATCH_MAX_IN_FLIGHT, thread_name_prefix="batch-query")
+query_batch_limiter = EndpointLimiter("batch query", batch_executor, QUERY_BATCH_MAX_IN_FLIGHT, QUERY_BATCH_TIMEOUT)
+
+def collect_queue_depths() -> Dict[tuple, float]:
+    """Requests and conversation turns waiting or in progress, per queue."""
+    depths = {
+        ("query",): query_limiter.in_flight,
+        ("query_batch",): query_batch_limiter.in_flight
+    }
+    jobs = resources.loaded("ingest_jobs")
+    if jobs is not None:
+        counts = jobs.counts()
+        depths[("ingest_jobs",)] = counts.get("queued", 0) + counts.get("running", 0)
+    # Only report what has been built; a scrape must not load models
+    indexer = resources.loaded("conversation_indexer")
+    if indexer is not None:
+        depths[("conversation_index",)] = indexer.stats()["queued"]
+    scheduler = getattr(resources.loaded("llm"), "scheduler", None)
+    if scheduler is not None:
+        depths[("llm_batch",)] = scheduler.stats()["queued"]
+    return depths
+
+def collect_cache_lookups() -> Dict[tuple, float]:
+    """Hit and miss counts of the answer and embedding caches."""
+    lookups = {}
+    if agent.answer_cache is not None:
+        lookups[("answer", "hit")] = agent.answer_cache.hits
+        lookups[("answer", "miss")] = agent.answer_cache.misses
+    embeddings = resources.loaded("embeddings")
+    if isinstance(embeddings, CachedEmbeddings):
+        lookups[("embedding", "hit")] = embeddings.memory_hits + embeddings.disk_hits
+        lookups[("embedding", "miss")] = embeddings.misses
+    return lookups
+
+def collect_llm_requests() -> Dict[tuple, float]:
+    """Inference API calls, retries and coalesced prompts of the hub backend."""
+    client = getattr(resources.loaded("llm"), "client", None)
+    if not isinstance(client, InferenceClient):
+        return {}
+    stats = client.stats()
+    return {(kind,): stats[kind] for kind in ("requests", "retries", "coalesced")}
+
+Collected("assistant_queue_depth", "Requests in flight per endpoint and items waiting per background queue", "gauge", ["queue"], collect_queue_depths)
+Collected("assistant_cache_lookups_total", "Cache lookups by cache and result", "counter", ["cache", "result"], collect_cache_lookups)
+Collected("assistant_llm_api_requests_total", "Inference API requests, retries and prompts served by another identical request", "counter", ["kind"], collect_llm_requests)
+
+async def run_limited(limiter: EndpointLimiter, func, *args):
+    """Run blocking work through a limiter, mapping overload and timeouts to HTTP errors."""
+    try:
+        return await limiter.run(func, *args)
+    except (Overloaded, CircuitOpen) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"The {limiter.name} request timed out")
+
+@app.on_event("startup")
+async def warm_up():
+    """Load every model and client before the first request arrives."""
+    if WARMUP_ON_STARTUP:
+        await asyncio.get_running_loop().run_in_executor(inference_executor, resources.warm_up)
+
+@app.on_event("startup")
+def start_ingest_workers():
+    """Start working through queued ingestion jobs, including any left over from a previous run."""
+    ingest_workers.start()
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    """Stop accepting work, drop anything still queued and write out pending conversation turns."""
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+    # Queued ingestion jobs stay in the queue for the next start
+    ingest_workers.stop()
+    batch_executor.shutdown(wait=False, cancel_futures=True)
+    resources.close()
 
 # Define request and response models
 class QueryRequest(BaseModel):
     query: str
+    # Omit to start a new conversation; the response carries the ID to continue it
+    session_id: Optional[str] = None
+    # Restrict retrieval by chunk metadata, e.g. {"file_name": "report.pdf", "ingested_at": {"gte": 1700000000}}
+    filter: Optional[Dict[str, Any]] = None
+    # Override the hybrid retrieval fusion weights, e.g. {"dense": 0.5, "sparse": 1.5}
+    weights: Optional[Dict[str, float]] = None
 
 class QueryResponse(BaseModel):
     answer: str
+    session_id: str
     sources: List[Dict[str, Any]]
+    cached: bool = False
+    timings: Dict[str, float] = {}
+    # Token counts of the retrieved chunks and of the context packed from them
+    context: Dict[str, int] = {}
+
+class BatchQueryRequest(BaseModel):
+    # Independent questions: they share no conversation with each other or with any session
+    questions: List[str]
+    filter: Optional[Dict[str, Any]] = None
+    weights: Optional[Dict[str, float]] = None
+    # Skip the LLM and return only the retrieved sources, for fast retrieval evaluations
+    retrieval_only: bool = False
 
 class TextIngestionRequest(BaseModel):
     text: str
@@ -55,63 +186,184 @@ class TextIngestionRequest(BaseModel):
 async def root():
     return {"message": "Welcome to the Personal AI Assistant API"}
 
+@app.get("/metrics")
+async def metrics():
+    """Expose stage latencies, request latencies, token counts, cache hits and queue depths to Prometheus."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+def answer_query(
+    question: str,
+    session_id: str,
+    filters: Optional[Dict[str, Any]] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """Answer a question and remember the exchange (runs on the inference executor)."""
+    response = agent.query(question, session_id, filters, weights)
+    
+    # Add the conversation to memory (a cached answer is already there)
+    if not response.get("cached"):
+        agent.add_conversation_to_memory(question, response["answer"])
+    
+    return {**response, "session_id": session_id}
+
 @app.post("/query", response_model=QueryResponse)
 async def query(request: QueryRequest):
     """Query the assistant with a question."""
     try:
-        response = agent.query(request.query)
-        
-        # Add the conversation to memory
-        agent.add_conversation_to_memory(request.query, response["answer"])
-        
-        return response
+        return await run_limited(
+            query_limiter, answer_query, request.query, request.session_id or uuid.uuid4().hex, request.filter, request.weights
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/ingest/text")
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """Query the assistant and stream the sources and answer as Server-Sent Events."""
+    # Reject a bad filter or weights before the stream starts with a 200
+    try:
+        build_filter(request.filter)
+        resolve_weights(request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        slot = query_limiter.acquire_stream()
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    session_id = request.session_id or uuid.uuid4().hex
+    
+    async def events():
+        try:
+            async for event in query_limiter.stream(slot, agent.stream_query, request.query, session_id, request.filter, request.weights):
+                if event["type"] == "done":
+                    event = {**event, "session_id": session_id}
+                    if not event.get("cached"):
+                        # Queue the conversation for indexing once the full answer exists
+                        agent.add_conversation_to_memory(request.query, event["answer"])
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except asyncio.TimeoutError:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': 'The query request timed out'})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+    
+    # Frees the slot if the client is gone before the stream starts
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(slot.release_if_unused)
+    )
+
+@app.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """Answer many questions, streaming one JSON line per result as they complete.
+    
+    Result lines carry the question's index in the request; a final line
+    of type "done" ends the stream.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(request.questions) > QUERY_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX_SIZE} questions per batch")
+    try:
+        build_filter(request.filter)
+        resolve_weights(request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        slot = query_batch_limiter.acquire_stream()
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    async def lines():
+        try:
+            async for event in query_batch_limiter.stream(
+                slot, agent.query_batch, request.questions, request.filter, request.weights, request.retrieval_only
+            ):
+                yield json.dumps(event) + "\n"
+        except asyncio.TimeoutError:
+            yield json.dumps({"type": "error", "detail": "The batch query request timed out"}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+    
+    # Frees the slot if the client is gone before the stream starts
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+        background=BackgroundTask(slot.release_if_unused)
+    )
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a conversation's history."""
+    resources.sessions.delete(session_id)
+    return {"message": "Session deleted", "session_id": session_id}
+
+async def submit_job(submit, *args) -> JSONResponse:
+    """Queue an ingestion job and answer 202 with its ID, or 503 if the queue is full."""
+    try:
+        job_id = await run_in_threadpool(submit, *args)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"/ingest/jobs/{job_id}"},
+        headers={"Location": f"/ingest/jobs/{job_id}"}
+    )
+
+@app.post("/ingest/text", status_code=202)
 async def ingest_text(request: TextIngestionRequest):
-    """Ingest text into the knowledge base."""
+    """Queue text for ingestion into the knowledge base."""
     try:
         metadata = request.metadata or {}
         
-        # Add the text to the knowledge base
-        ids = document_processor.ingest_text(request.text, metadata)
-        
-        return {"message": "Text ingested successfully", "ids": ids}
+        # Add the text to the knowledge base in the background
+        return await submit_job(ingest_workers.submit_text, request.text, metadata)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/ingest/file")
+@app.post("/ingest/file", status_code=202)
 async def ingest_file(file: UploadFile = File(...)):
-    """Ingest a file into the knowledge base."""
+    """Store an uploaded file and queue it for ingestion into the knowledge base."""
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+        # Refuse what can't be parsed before storing anything
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        if extension not in LOADERS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {extension or file.filename}")
         
-        # Get a path to store the document
-        doc_path = get_document_path(file.filename)
+        # Stream the upload into the documents directory once, hashing it as it is written
+        try:
+            doc_path, content_hash = await run_in_threadpool(save_upload, file.file, file.filename)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
         
-        # Copy the file to the documents directory
-        with open(doc_path, "wb") as f:
-            # Seek to the beginning of the file
-            await file.seek(0)
-            content = await file.read()
-            f.write(content)
-        
-        # Ingest the document
+        # Ingest the stored copy in the background
         metadata = {"original_name": file.filename}
-        ids = document_processor.ingest_file(tmp_path, metadata)
-        
-        # Clean up the temporary file
-        os.unlink(tmp_path)
-        
-        return {"message": f"File {file.filename} ingested successfully", "ids": ids}
+        return await submit_job(ingest_workers.submit_file, doc_path, metadata, content_hash)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Report an ingestion job's status, progress and, once done, the IDs of its chunks."""
+    job = await run_in_threadpool(resources.ingest_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job
+
 # Run the application
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
 import os
 import sys
-import tempfile
+import time
+import uuid
 from datetime import datetime
 from typing import List, Dict, Any
 
@@ -9,8 +10,12 @@ from typing import List, Dict, Any
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from app.core.agent import AssistantAgent
 from app.core.ingestion import DocumentProcessor
-from app.utils.helpers import get_document_path, format_sources, save_conversation
-from app.config import LLM_MODEL, EMBEDDING_MODEL
+from app.core.ingest_jobs import IngestWorkers
+from app.core.memory import MemoryManager
+from app.core.resources import get_resources
+from app.core.uploads import save_upload
+from app.utils.helpers import format_sources, save_conversation
+from app.config import LLM_MODEL, EMBEDDING_MODEL, WARMUP_ON_STARTUP
 
 # Set page config
 st.set_page_config(
@@ -19,15 +24,53 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def load_resources():
+    """Load the models and clients once per process and share them across sessions."""
+    resources = get_resources()
+    if WARMUP_ON_STARTUP:
+        resources.warm_up()
+    return resources
+
+@st.cache_resource
+def load_ingest_workers():
+    """Start this process's workers for the shared ingestion job queue."""
+    resources = load_resources()
+    workers = IngestWorkers(resources.ingest_jobs, DocumentProcessor(MemoryManager(resources)))
+    workers.start()
+    return workers
+
+# Seconds between reruns of the page while an ingestion job is running
+JOB_POLL_INTERVAL = 0.5
+
+def show_job_progress(job_id: str, label: str) -> bool:
+    """Show a queued ingestion job's current progress; return whether it is still running."""
+    job = load_resources().ingest_jobs.get(job_id)
+    if job is not None and job["status"] not in ("done", "failed"):
+        status = "retrying" if job["status"] == "queued" and job["attempts"] else job["status"]
+        st.progress(job["progress"], text=f"{label}: {status} ({job['progress']:.0%})")
+        return True
+    
+    if job is None or job["status"] == "failed":
+        st.error(f"Error processing {label}: {job['error'] if job else 'the job was lost'}")
+    else:
+        st.success(f"{label} processed successfully! ({len(job['ids'])} chunks)")
+    # Reruns after this show the result no more
+    del st.session_state.ingest_job
+    return False
+
 # Initialize session state variables
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if "agent" not in st.session_state:
-    st.session_state.agent = AssistantAgent()
+    st.session_state.agent = AssistantAgent(MemoryManager(load_resources()))
 
-if "document_processor" not in st.session_state:
-    st.session_state.document_processor = DocumentProcessor(st.session_state.agent.memory_manager)
+# Start the ingestion workers, which also resume any jobs left over from a previous run
+load_ingest_workers()
 
 # App title
 st.title("🤗 Personal AI Assistant (Hugging Face)")
@@ -38,50 +81,39 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Choose a file", type=["pdf", "txt", "csv"])
     
     if uploaded_file is not None:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp:
-            tmp.write(uploaded_file.getvalue())
-            tmp_path = tmp.name
-        
+        # Nothing is written until the button is clicked, however often the script reruns
         if st.button("Process Document"):
-            with st.spinner("Processing document..."):
-                try:
-                    # Get a path to store the document
-                    doc_path = get_document_path(uploaded_file.name)
-                    
-                    # Copy the file to the documents directory
-                    with open(doc_path, "wb") as f:
-                        f.write(uploaded_file.getvalue())
-                    
-                    # Ingest the document
-                    st.session_state.document_processor.ingest_file(tmp_path, {"original_name": uploaded_file.name})
-                    
-                    # Clean up the temporary file
-                    os.unlink(tmp_path)
-                    
-                    st.success(f"Document {uploaded_file.name} processed successfully!")
-                except Exception as e:
-                    st.error(f"Error processing document: {str(e)}")
+            try:
+                # Stream the upload into the documents directory, hashing it as it is written
+                uploaded_file.seek(0)
+                doc_path, content_hash = save_upload(uploaded_file, uploaded_file.name)
+                
+                # Ingest the stored copy in the background
+                job_id = load_ingest_workers().submit_file(doc_path, {"original_name": uploaded_file.name}, content_hash)
+                st.session_state.ingest_job = (job_id, f"Document {uploaded_file.name}")
+            except Exception as e:
+                st.error(f"Error processing document: {str(e)}")
     
     st.header("Raw Text Input")
     text_input = st.text_area("Enter text to add to the knowledge base")
     
     if st.button("Add Text"):
         if text_input:
-            with st.spinner("Adding text to knowledge base..."):
-                try:
-                    # Create metadata
-                    metadata = {
-                        "type": "manual_input",
-                        "timestamp": str(datetime.now())
-                    }
-                    
-                    # Ingest the text
-                    st.session_state.document_processor.ingest_text(text_input, metadata)
-                    
-                    st.success("Text added to knowledge base successfully!")
-                except Exception as e:
-                    st.error(f"Error adding text: {str(e)}")
+            try:
+                # Create metadata
+                metadata = {
+                    "type": "manual_input",
+                    "timestamp": str(datetime.now())
+                }
+                
+                # Ingest the text in the background
+                job_id = load_ingest_workers().submit_text(text_input, metadata)
+                st.session_state.ingest_job = (job_id, "Text")
+            except Exception as e:
+                st.error(f"Error adding text: {str(e)}")
+    
+    # Follow the last submitted job; it keeps running if the page is left or reloaded
+    job_running = "ingest_job" in st.session_state and show_job_progress(*st.session_state.ingest_job)
     
     # Display model information
     st.header("Models")
@@ -126,42 +158,61 @@ if prompt := st.chat_input("Ask a question..."):
     with st.chat_message("user"):
         st.write(prompt)
     
-    # Generate response
+    # Generate response, rendering the answer as it streams in
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = st.session_state.agent.query(prompt)
-            answer = response["answer"]
-            sources = response["sources"]
-            
-            # Display the response
-            st.write(answer)
-            
-            # Display sources in an expander
-            with st.expander("View Sources"):
-                if sources:
-                    for i, source in enumerate(sources, 1):
-                        st.write(f"{i}. {source['file_name']}" + (f" (Page {source['page']})" if source.get('page') else ""))
-                        st.text(source['content'])
-                else:
-                    st.write("No specific sources used.")
-            
-            # Save conversation
-            save_conversation(prompt, answer, sources)
-            
-            # Add assistant response to chat history
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": answer,
-                "sources": sources
-            })
-            
-            # Update the agent's memory
+        placeholder = st.empty()
+        placeholder.markdown("_Thinking..._")
+        answer = ""
+        sources = []
+        cached = False
+        
+        for event in st.session_state.agent.stream_query(prompt, st.session_state.session_id):
+            if event["type"] == "sources":
+                sources = event["sources"]
+            elif event["type"] == "token":
+                answer += event["text"]
+                placeholder.markdown(answer + "▌")
+            elif event["type"] == "done":
+                answer = event["answer"]
+                cached = event.get("cached", False)
+        
+        # Display the response
+        placeholder.markdown(answer)
+        if cached:
+            st.caption("Answered from cache")
+        
+        # Display sources in an expander
+        with st.expander("View Sources"):
+            if sources:
+                for i, source in enumerate(sources, 1):
+                    st.write(f"{i}. {source['file_name']}" + (f" (Page {source['page']})" if source.get('page') else ""))
+                    st.text(source['content'])
+            else:
+                st.write("No specific sources used.")
+        
+        # Save conversation
+        save_conversation(prompt, answer, sources)
+        
+        # Add assistant response to chat history
+        st.session_state.messages.append({
+            "role": "assistant", 
+            "content": answer,
+            "sources": sources
+        })
+        
+        # Update the agent's memory (a cached answer is already there)
+        if not cached:
             st.session_state.agent.add_conversation_to_memory(prompt, answer)
 
 # Add a footer
 st.markdown("---")
 st.markdown("Built with LangChain, Hugging Face, and Qdrant")
 
+# Poll a running job by rerunning once the whole page is drawn, so the chat stays usable meanwhile
+if job_running:
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
+
 if __name__ == "__main__":
     # This is used when running the file directly
     pass
\ No newline at end of file
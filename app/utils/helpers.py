@@ -1,5 +1,6 @@
 import os
 import sys
+import hashlib
 from datetime import datetime
 from typing import List, Dict, Any
 
@@ -11,23 +12,51 @@ def sanitize_filename(filename: str) -> str:
         filename = filename.replace(char, '_')
     return filename
 
-def get_document_path(filename: str) -> str:
-    """Get the path to store a document."""
-    # Get the documents directory
+def get_documents_dir() -> str:
+    """Get the directory uploaded documents are stored in, creating it if needed."""
     docs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'documents')
-    
-    # Create the directory if it doesn't exist
     os.makedirs(docs_dir, exist_ok=True)
+    return docs_dir
+
+def get_document_path(filename: str, content_hash: str) -> str:
+    """Get the path to store a document.
     
-    # Sanitize the filename
-    filename = sanitize_filename(filename)
-    
-    # Add a timestamp to make the filename unique
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    base, ext = os.path.splitext(filename)
-    unique_filename = f"{base}_{timestamp}{ext}"
+    Each version is stored under its content hash, so different files
+    uploaded under the same name never overwrite each other's copies
+    while their ingestion is queued. In the knowledge base a re-upload
+    under the same name is intentionally a new version of the same
+    document, replacing its chunks (see DocumentProcessor.source_key).
+    """
+    version_dir = os.path.join(get_documents_dir(), content_hash[:16])
+    os.makedirs(version_dir, exist_ok=True)
+    return os.path.join(version_dir, sanitize_filename(filename))
+
+def remove_older_versions(doc_path: str):
+    """Delete the stored copies of earlier uploads under the same name as a stored document."""
+    docs_dir = get_documents_dir()
+    version_dir, filename = os.path.split(os.path.abspath(doc_path))
+    if os.path.dirname(version_dir) != docs_dir:
+        return
     
-    return os.path.join(docs_dir, unique_filename)
+    modified = os.path.getmtime(doc_path)
+    for entry in os.listdir(docs_dir):
+        other = os.path.join(docs_dir, entry, filename)
+        # Copies newer than this one may still be waiting to be ingested
+        if other != doc_path and os.path.isfile(other) and os.path.getmtime(other) < modified:
+            os.unlink(other)
+            try:
+                os.rmdir(os.path.dirname(other))
+            except OSError:
+                # Still holds a copy of the same content under another name
+                pass
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 def format_sources(sources: List[Dict[str, Any]]) -> str:
     """Format source documents for display."""
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Compare the torch and ONNX embedding backends.
+Checks that the ONNX vectors stay within the cosine threshold of the torch
+vectors for the same chunks and reports throughput for both in chunks/sec.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from typing import List
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP
+from app.core.onnx_embeddings import OnnxEmbeddings
+
+SAMPLE_SENTENCES = [
+    "The quarterly report shows revenue growth across all regions.",
+    "Error code E1042 means the upload exceeded the configured size limit.",
+    "Meeting notes: discuss the migration plan and assign owners for each step.",
+    "Qdrant stores vectors together with a JSON payload for filtering.",
+    "Remember to renew the passport before the trip in March.",
+]
+
+def load_texts(input_path: str, limit: int) -> List[str]:
+    """Split the text files under input_path into chunks, or build synthetic ones."""
+    if not input_path:
+        # Synthetic chunks of varying length so bucketing has something to do
+        return [" ".join(SAMPLE_SENTENCES[: (i % len(SAMPLE_SENTENCES)) + 1] * ((i % 7) + 1)) for i in range(limit)]
+    
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    texts = []
+    for root, _, files in os.walk(input_path):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in (".txt", ".md"):
+                continue
+            with open(os.path.join(root, name), encoding="utf-8", errors="ignore") as f:
+                texts.extend(splitter.split_text(f.read()))
+            if len(texts) >= limit:
+                return texts[:limit]
+    return texts
+
+def measure_throughput(embeddings, texts: List[str]) -> float:
+    """Return chunks/sec for embedding all texts once, after a short warm-up."""
+    embeddings.embed_documents(texts[:8])
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+def cosine_similarities(a: List[List[float]], b: List[List[float]]) -> np.ndarray:
+    """Row-wise cosine similarity between two sets of vectors."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the torch and ONNX embedding backends")
+    parser.add_argument('--model', default=EMBEDDING_MODEL, help='Embedding model to compare')
+    parser.add_argument('--input', help='Directory of .txt/.md files to use as chunks')
+    parser.add_argument('--limit', type=int, default=512, help='Number of chunks to embed')
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE, help='Batch size for both backends')
+    parser.add_argument('--min-cosine', type=float, default=0.99, help='Minimum per-chunk cosine similarity')
+    parser.add_argument('--no-quantize', action='store_true', help='Compare the fp32 ONNX model instead of int8')
+    args = parser.parse_args()
+    
+    texts = load_texts(args.input, args.limit)
+    torch_embeddings = HuggingFaceEmbeddings(model_name=args.model, encode_kwargs={"batch_size": args.batch_size})
+    onnx_embeddings = OnnxEmbeddings(model_name=args.model, quantize=not args.no_quantize, batch_size=args.batch_size)
+    
+    similarities = cosine_similarities(
+        torch_embeddings.embed_documents(texts),
+        onnx_embeddings.embed_documents(texts)
+    )
+    torch_rate = measure_throughput(torch_embeddings, texts)
+    onnx_rate = measure_throughput(onnx_embeddings, texts)
+    
+    passed = bool(similarities.min() >= args.min_cosine)
+    print(json.dumps({
+        "model": args.model,
+        "quantized": not args.no_quantize,
+        "chunks": len(texts),
+        "parity": {
+            "min_cosine": float(similarities.min()),
+            "mean_cosine": float(similarities.mean()),
+            "threshold": args.min_cosine,
+            "passed": passed
+        },
+        "throughput_chunks_per_sec": {
+            "torch": round(torch_rate, 2),
+            "onnx": round(onnx_rate, 2),
+            "speedup": round(onnx_rate / torch_rate, 2)
+        }
+    }, indent=2))
+    
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+"""
+Benchmark the app's own code paths end to end, without the models.
+Deterministic stand-ins replace the embedding model and the LLM, so the
+numbers reflect ingestion, search, prompt assembly and serving overhead and
+are comparable between runs:
+
+- ingest: DocumentProcessor chunks/sec for generated .txt, .csv and .pdf files
+- search: MemoryManager.similarity_search latency and recall@k against an
+  exact brute-force search over the same vectors
+- agent: AssistantAgent.query latency per stage with an instant LLM
+- api: /query requests/sec and latency with N concurrent clients
+
+Everything runs on a throwaway in-memory collection (set QDRANT_MODE=remote
+to measure a server instead). Results are printed as JSON; pass --compare
+with an earlier run to fail on regressions.
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+# Keep the benchmark's data away from the app's own stores
+WORK_DIR = tempfile.mkdtemp(prefix="benchmark_")
+os.environ.setdefault("QDRANT_MODE", "memory")
+os.environ.update({
+    "VECTOR_DB_PATH": os.path.join(WORK_DIR, "vector_db"),
+    "COLLECTION_NAME": "benchmark_documents",
+    "CONVERSATION_COLLECTION_NAME": "benchmark_conversations",
+    "LEXICAL_INDEX_PATH": os.path.join(WORK_DIR, "lexical_index.db"),
+    "INGEST_MANIFEST_PATH": os.path.join(WORK_DIR, "ingest_manifest.db"),
+    "EMBEDDING_CACHE_PATH": os.path.join(WORK_DIR, "embedding_cache.db"),
+    "SESSION_STORE_PATH": "",
+    "ANSWER_CACHE_ENABLED": "false",
+    "WARMUP_ON_STARTUP": "false"
+})
+
+from langchain.embeddings.base import Embeddings
+from langchain.llms.base import LLM
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import QDRANT_MODE, COLLECTION_NAME, CONVERSATION_COLLECTION_NAME
+from app.core.resources import SharedResources, set_resources
+from app.core.lexical_index import tokenize
+
+# Generated documents are built from these topics so related chunks share words
+TOPICS = {
+    "billing": "invoice payment refund charge account card subscription plan renewal receipt tax currency",
+    "deploy": "release rollout server cluster container image pipeline build rollback canary region node",
+    "support": "ticket customer escalation reply priority agent queue response outage incident status",
+    "security": "password token access role permission audit breach key certificate login session firewall",
+    "hiring": "candidate interview offer salary role team manager onboarding contract recruiter feedback",
+}
+FILLER = "the a of to and in for with on by from after before during while when this that each every".split()
+
+class HashEmbeddings(Embeddings):
+    """Deterministic stand-in embedder: hashed bag of words, L2-normalised.
+    
+    Texts sharing words get similar vectors, so searches return sensible
+    neighbours, and embedding costs almost nothing.
+    """
+    
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        # An empty text still needs a valid vector for cosine distance
+        return (vector / norm if norm else np.full(self.dim, self.dim ** -0.5, dtype=np.float32)).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class EchoLLM(LLM):
+    """Stand-in LLM that answers instantly with the end of its prompt."""
+    
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+    
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return prompt[-200:]
+
+def generate_text(rng: np.random.Generator, topic: str, words: int) -> str:
+    """Sentences of topic words mixed with filler, with an occasional identifier."""
+    vocabulary = TOPICS[topic].split()
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentence = [rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(FILLER) for _ in range(rng.integers(8, 16))]
+        if rng.random() < 0.2:
+            sentence.append(f"{topic[:3].upper()}-{rng.integers(1000, 9999)}")
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+def write_pdf(path: str, text: str, line_chars: int = 90, page_lines: int = 50):
+    """Write a plain-text PDF readable by the PDF loader, without a PDF library."""
+    words, lines, line = text.split(), [], ""
+    for word in words:
+        if len(line) + len(word) + 1 > line_chars:
+            lines.append(line)
+            line = ""
+        line = f"{line} {word}".strip()
+    lines.append(line)
+    pages = [lines[i:i + page_lines] for i in range(0, len(lines), page_lines)]
+    
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in page) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    
+    content, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as f:
+        f.write(content)
+
+def generate_files(directory: str, files: int, words: int, seed: int) -> Dict[str, List[str]]:
+    """Write files of every supported type; return their paths by extension."""
+    rng = np.random.default_rng(seed)
+    paths: Dict[str, List[str]] = {".txt": [], ".csv": [], ".pdf": []}
+    for i in range(files):
+        topic = list(TOPICS)[i % len(TOPICS)]
+        for extension in paths:
+            path = os.path.join(directory, f"{topic}_{i}{extension}")
+            if extension == ".txt":
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(generate_text(rng, topic, 120) for _ in range(max(1, words // 120))))
+            elif extension == ".csv":
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("id,topic,note\n")
+                    for row in range(max(1, words // 20)):
+                        f.write(f"{row},{topic},{generate_text(rng, topic, 16).replace(',', '')}\n")
+            else:
+                write_pdf(path, generate_text(rng, topic, words))
+            paths[extension].append(path)
+    return paths
+
+def percentiles(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in milliseconds."""
+    values = np.asarray(seconds) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(values, q)), 2) for q in (50, 95, 99)}
+
+def bench_ingest(processor, paths: Dict[str, List[str]]) -> Dict[str, Dict]:
+    """Ingest every file, timing each file type separately."""
+    results = {}
+    for extension, files in paths.items():
+        chunks = 0
+        start = time.perf_counter()
+        for path in files:
+            chunks += len(processor.ingest_file(path))
+        elapsed = time.perf_counter() - start
+        results[extension.lstrip(".")] = {
+            "files": len(files),
+            "chunks": chunks,
+            "chunks_per_s": round(chunks / elapsed, 1),
+            "seconds": round(elapsed, 3)
+        }
+    return results
+
+def bench_search(memory_manager, embeddings: HashEmbeddings, queries: int, k: int, seed: int) -> Dict:
+    """Time similarity_search and compare its results with an exact search."""
+    texts, offset = [], None
+    while True:
+        points, offset = memory_manager.resources.qdrant_client.scroll(COLLECTION_NAME, limit=256, offset=offset, with_payload=True)
+        texts.extend(point.payload["page_content"] for point in points)
+        if offset is None:
+            break
+    matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    
+    # Queries are short phrases taken from stored chunks, like a user recalling a passage
+    rng = np.random.default_rng(seed)
+    latencies, hits = [], 0
+    for _ in range(queries):
+        words = texts[rng.integers(len(texts))].split()
+        start_word = rng.integers(max(1, len(words) - 8))
+        query = " ".join(words[start_word:start_word + 8])
+        
+        start = time.perf_counter()
+        docs = memory_manager.similarity_search(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        
+        scores = matrix @ np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        expected = {texts[i] for i in np.argsort(-scores)[:k]}
+        hits += len(expected & {doc.page_content for doc in docs})
+    
+    return {"chunks": len(texts), "queries": queries, "k": k, **percentiles(latencies), f"recall@{k}": round(hits / (k * queries), 4)}
+
+def bench_agent(agent, queries: int, seed: int) -> Dict:
+    """Time AssistantAgent.query with the instant LLM, per stage."""
+    rng = np.random.default_rng(seed)
+    stages: Dict[str, List[float]] = {}
+    for i in range(queries):
+        question = generate_text(rng, list(TOPICS)[i % len(TOPICS)], 10)
+        # A new session per question keeps chat history from growing across the run
+        response = agent.query(question, session_id=f"benchmark-{i}")
+        for stage, seconds in response["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    return {"queries": queries, "stages": {stage: percentiles(values) for stage, values in stages.items()}}
+
+async def bench_api(app, clients: int, requests: int, seed: int) -> Dict:
+    """Send /query requests from concurrent clients through the ASGI app."""
+    import httpx
+    
+    rng = np.random.default_rng(seed)
+    questions = [generate_text(rng, list(TOPICS)[i % len(TOPICS)], 10) for i in range(requests)]
+    latencies, statuses = [], {}
+    pending = iter(questions)
+    
+    async def client(http: httpx.AsyncClient):
+        for question in pending:
+            start = time.perf_counter()
+            response = await http.post("/query", json={"query": question})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed, 2),
+        **percentiles(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())}
+    }
+
+def flatten(results: Any, prefix: str = "") -> Dict[str, float]:
+    """Map each numeric result to a dotted path, for comparing runs."""
+    if isinstance(results, dict):
+        return {key: value for name, item in results.items() for key, value in flatten(item, f"{prefix}{name}.").items()}
+    if isinstance(results, list):
+        return {key: value for i, item in enumerate(results) for key, value in flatten(item, f"{prefix}{i}.").items()}
+    return {prefix.rstrip("."): results} if isinstance(results, (int, float)) and not isinstance(results, bool) else {}
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List the metrics that got worse than the baseline by more than tolerance."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in current.items():
+        before = previous.get(key)
+        if not before:
+            continue
+        if key.endswith("_ms") and value > before * (1 + tolerance):
+            regressions.append(f"{key}: {before} -> {value}")
+        elif (key.endswith("_per_s") or "recall@" in key) and value < before * (1 - tolerance):
+            regressions.append(f"{key}: {before} -> {value}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, search, the agent and the API with stand-in models")
+    parser.add_argument('--files', type=int, default=10, help='Generated files per file type')
+    parser.add_argument('--words', type=int, default=1500, help='Words per generated file')
+    parser.add_argument('--queries', type=int, default=200, help='Searches and agent queries to time')
+    parser.add_argument('--k', type=int, default=5, help='Results per search')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16], help='Concurrent API clients to try')
+    parser.add_argument('--requests', type=int, default=200, help='API requests per client count')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated files and queries')
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Results of an earlier run; exit with status 1 if any metric regressed')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression for --compare')
+    args = parser.parse_args()
+    
+    embeddings = HashEmbeddings()
+    set_resources(SharedResources(embeddings_factory=lambda: embeddings, llm_factory=EchoLLM))
+    # Imported after the stand-ins are in place, since the app builds its agent on import
+    from app import main as api
+    
+    try:
+        os.makedirs(os.path.join(WORK_DIR, "documents"))
+        paths = generate_files(os.path.join(WORK_DIR, "documents"), args.files, args.words, args.seed)
+        results = {
+            "qdrant_mode": QDRANT_MODE,
+            "ingest": bench_ingest(api.document_processor, paths),
+            "search": bench_search(api.agent.memory_manager, embeddings, args.queries, args.k, args.seed),
+            "agent": bench_agent(api.agent, args.queries, args.seed),
+            "api": {f"clients_{clients}": asyncio.run(bench_api(api.app, clients, args.requests, args.seed)) for clients in args.clients}
+        }
+    finally:
+        api.resources.close()
+        if QDRANT_MODE == "remote":
+            for collection in (COLLECTION_NAME, CONVERSATION_COLLECTION_NAME):
+                api.resources.qdrant_client.delete_collection(collection)
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
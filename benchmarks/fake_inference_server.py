@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+A fake Hugging Face Inference API for trying the LLM client offline.
+Answers POST /models/{model} with a canned completion after a configurable
+latency, and can be told to rate-limit, report the model as loading or
+stall, so retries, the circuit breaker and timeouts can be exercised.
+Point LLM_API_URL at http://127.0.0.1:8088/models to use it.
+"""
+import time
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake inference server")
+settings = {"latency": 0.05, "fail_rate": 0.0, "stall_rate": 0.0, "echo": False}
+counters = {"requests": 0, "failed": 0, "stalled": 0}
+
+@app.post("/models/{model:path}")
+async def generate(model: str, request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+    if random.random() < settings["stall_rate"]:
+        # Hold the connection long enough for the client's read timeout to fire
+        counters["stalled"] += 1
+        await asyncio.sleep(3600)
+    await asyncio.sleep(settings["latency"])
+    if random.random() < settings["fail_rate"]:
+        counters["failed"] += 1
+        if random.random() < 0.5:
+            return JSONResponse(status_code=429, content={"error": "Rate limit reached"}, headers={"Retry-After": "0"})
+        return JSONResponse(status_code=503, content={"error": f"Model {model} is currently loading", "estimated_time": 0.1})
+    
+    completion = f"Answer from {model} to a {len(body['inputs'])} character prompt."
+    text = body["inputs"] + completion if settings["echo"] else completion
+    return [{"generated_text": text}]
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+@app.post("/settings")
+async def update_settings(request: Request):
+    """Change the latency or failure rates while the server runs."""
+    settings.update({key: float(value) for key, value in (await request.json()).items() if key in settings})
+    return settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Hugging Face Inference API")
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on')
+    parser.add_argument('--port', type=int, default=8088, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds to take per completion')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 429 or 503')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='Share of requests that never answer')
+    parser.add_argument('--echo', action='store_true', help='Start completions with the prompt, like text-generation models')
+    args = parser.parse_args()
+    
+    settings.update(latency=args.latency, fail_rate=args.fail_rate, stall_rate=args.stall_rate, echo=args.echo)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Measure the throughput of the local LLM backend with and without batching.
+Runs the same prompts from a number of concurrent callers, once with one
+request per generate call and once with dynamic batching, and reports
+requests/sec, latency percentiles and the average batch size.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import numpy as np
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import LLM_MODEL, LOCAL_LLM_MAX_BATCH_SIZE, LOCAL_LLM_MAX_WAIT_MS, LOCAL_LLM_QUANTIZE
+from app.core.local_llm import BatchScheduler, LocalGenerator, LocalLLM
+
+PROMPTS = [
+    "Summarize: the quarterly report shows revenue growth in every region.",
+    "Translate to German: where is the train station?",
+    "Answer the question: what is the capital of France?",
+    "Explain why the sky is blue in one sentence.",
+    "List three uses of a paperclip.",
+    "What does the error code ERR-1042 usually mean?",
+]
+
+def measure(generator: LocalGenerator, concurrency: int, requests: int, max_batch_size: int, max_wait_ms: float, max_new_tokens: int) -> Dict:
+    """Send the requests from concurrency callers through one scheduler."""
+    scheduler = BatchScheduler(generator.generate, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    llm = LocalLLM(scheduler=scheduler, max_new_tokens=max_new_tokens, temperature=0)
+    llm.invoke(PROMPTS[0])
+    
+    def call(i: int) -> float:
+        start = time.perf_counter()
+        llm.invoke(PROMPTS[i % len(PROMPTS)])
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.asarray(list(pool.map(call, range(requests)))) * 1000
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "max_batch_size": max_batch_size,
+        "requests_per_s": round(requests / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "average_batch_size": scheduler.stats()["average_batch_size"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure local LLM throughput with and without batching")
+    parser.add_argument('--model', default=LLM_MODEL, help='Model name or path')
+    parser.add_argument('--quantize', action='store_true', default=LOCAL_LLM_QUANTIZE, help='Use int8 dynamic quantization')
+    parser.add_argument('--requests', type=int, default=48, help='Requests per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Concurrent callers to try')
+    parser.add_argument('--max-batch-size', type=int, default=LOCAL_LLM_MAX_BATCH_SIZE, help='Batch size limit for the batched runs')
+    parser.add_argument('--max-wait-ms', type=float, default=LOCAL_LLM_MAX_WAIT_MS, help='Batch collection window')
+    parser.add_argument('--max-new-tokens', type=int, default=32, help='Tokens generated per request')
+    args = parser.parse_args()
+    
+    generator = LocalGenerator(args.model, quantize=args.quantize)
+    runs = []
+    for concurrency in args.concurrency:
+        for max_batch_size in (1, args.max_batch_size):
+            runs.append(measure(generator, concurrency, args.requests, max_batch_size, args.max_wait_ms, args.max_new_tokens))
+    
+    print(json.dumps({
+        "model": args.model,
+        "quantize": args.quantize,
+        "max_new_tokens": args.max_new_tokens,
+        "runs": runs
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
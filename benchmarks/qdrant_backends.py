@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Measure vector search throughput for the Qdrant backends.
+Loads random vectors into a collection and runs searches from one or more
+client processes, reporting queries/sec and latency percentiles per process
+count. Only the remote backend can be shared between processes; start a
+Qdrant server (or benchmarks/qdrant_standin.py) and pass its URL to try it.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import multiprocessing
+from typing import Dict, List, Tuple
+import numpy as np
+import httpx
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import QDRANT_URL, QDRANT_GRPC_PORT, QDRANT_TIMEOUT, QDRANT_POOL_SIZE
+
+COLLECTION = "benchmark_qdrant_backends"
+
+# Client of each search process
+_client = None
+
+def make_client(mode: str, url: str, prefer_grpc: bool, path: str = None) -> QdrantClient:
+    """Build a client for one of the backends."""
+    if mode == "local":
+        return QdrantClient(path=path)
+    if mode == "memory":
+        return QdrantClient(location=":memory:")
+    return QdrantClient(
+        url=url,
+        prefer_grpc=prefer_grpc,
+        grpc_port=QDRANT_GRPC_PORT,
+        timeout=QDRANT_TIMEOUT,
+        limits=httpx.Limits(max_connections=QDRANT_POOL_SIZE, max_keepalive_connections=QDRANT_POOL_SIZE)
+    )
+
+def load_points(client: QdrantClient, points: int, dim: int):
+    """Recreate the benchmark collection with random unit vectors."""
+    client.recreate_collection(COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    rng = np.random.default_rng(0)
+    for start in range(0, points, 256):
+        vectors = rng.standard_normal((min(256, points - start), dim)).astype(np.float32)
+        client.upsert(COLLECTION, points=[
+            PointStruct(id=start + i, vector=vector.tolist(), payload={"n": start + i})
+            for i, vector in enumerate(vectors)
+        ])
+
+def init_worker(mode: str, url: str, prefer_grpc: bool):
+    """Give each search process its own client."""
+    global _client
+    _client = make_client(mode, url, prefer_grpc)
+
+def run_searches(args) -> Tuple[float, float, List[float]]:
+    """Run a share of the queries; return the wall-clock window and the latencies in seconds."""
+    seed, queries, dim = args
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((queries, dim)).astype(np.float32)
+    # One untimed search so connection setup isn't counted
+    _client.search(COLLECTION, query_vector=vectors[0].tolist(), limit=5)
+    
+    latencies = []
+    window_start = time.time()
+    for vector in vectors:
+        start = time.perf_counter()
+        _client.search(COLLECTION, query_vector=vector.tolist(), limit=5)
+        latencies.append(time.perf_counter() - start)
+    return window_start, time.time(), latencies
+
+def measure(client: QdrantClient, processes: int, queries: int, dim: int, mode: str, url: str, prefer_grpc: bool) -> Dict:
+    """Run the queries spread over a number of processes."""
+    global _client
+    per_process = max(1, queries // processes)
+    if processes == 1:
+        _client = client
+        parts = [run_searches((1, per_process, dim))]
+    else:
+        with multiprocessing.get_context("spawn").Pool(processes, initializer=init_worker, initargs=(mode, url, prefer_grpc)) as pool:
+            parts = pool.map(run_searches, [(i + 1, per_process, dim) for i in range(processes)])
+    
+    # Process start-up is left out: only the span in which searches ran counts
+    elapsed = max(end for _, end, _ in parts) - min(start for start, _, _ in parts)
+    latencies = np.asarray([latency for _, _, part in parts for latency in part]) * 1000
+    return {
+        "processes": processes,
+        "queries": len(latencies),
+        "qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure vector search throughput for the Qdrant backends")
+    parser.add_argument('--mode', choices=['local', 'memory', 'remote'], default='memory', help='Backend to measure')
+    parser.add_argument('--url', default=QDRANT_URL, help='Server URL for the remote backend')
+    parser.add_argument('--prefer-grpc', action='store_true', help='Use gRPC for the remote backend')
+    parser.add_argument('--points', type=int, default=10000, help='Number of vectors to load')
+    parser.add_argument('--dim', type=int, default=384, help='Vector dimension')
+    parser.add_argument('--queries', type=int, default=1000, help='Total number of searches per run')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Client process counts to try')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as path:
+        client = make_client(args.mode, args.url, args.prefer_grpc, path)
+        load_points(client, args.points, args.dim)
+        
+        # Embedded backends live inside this process and can't be shared
+        processes = args.processes if args.mode == "remote" else [1]
+        results = [measure(client, count, args.queries, args.dim, args.mode, args.url, args.prefer_grpc) for count in processes]
+        client.delete_collection(COLLECTION)
+    
+    print(json.dumps({
+        "mode": args.mode,
+        "prefer_grpc": args.prefer_grpc if args.mode == "remote" else None,
+        "points": args.points,
+        "dim": args.dim,
+        "runs": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+A local stand-in for a Qdrant server.
+Serves the subset of Qdrant's REST API the app uses, backed by qdrant-client's
+in-memory mode, so QDRANT_MODE=remote and multi-worker serving can be tried
+without a real server. It is single-process and not meant for production.
+"""
+import time
+import argparse
+from typing import Any, Callable
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from qdrant_client import QdrantClient, models
+
+app = FastAPI(title="Qdrant stand-in")
+client = QdrantClient(location=":memory:")
+
+def respond(operation: Callable[[], Any]) -> JSONResponse:
+    """Run an operation and wrap its result the way Qdrant does."""
+    start = time.perf_counter()
+    try:
+        result = operation()
+    except (ValueError, KeyError) as e:
+        return JSONResponse(status_code=404 if "not found" in str(e).lower() else 400, content={"status": {"error": str(e)}})
+    return JSONResponse(content={"result": jsonable_encoder(result), "status": "ok", "time": time.perf_counter() - start})
+
+@app.get("/collections")
+async def list_collections():
+    return respond(client.get_collections)
+
+@app.get("/aliases")
+async def list_aliases():
+    return respond(client.get_aliases)
+
+@app.post("/collections/aliases")
+async def update_aliases(request: Request):
+    body = models.ChangeAliasesOperation(**await request.json())
+    return respond(lambda: client.update_collection_aliases(body.actions))
+
+@app.get("/collections/{name}")
+async def get_collection(name: str):
+    return respond(lambda: client.get_collection(name))
+
+@app.put("/collections/{name}")
+async def create_collection(name: str, request: Request):
+    body = models.CreateCollection(**await request.json())
+    return respond(lambda: client.create_collection(name, vectors_config=body.vectors))
+
+@app.patch("/collections/{name}")
+async def update_collection(name: str):
+    # Index and quantization settings have no effect on the in-memory backend
+    return respond(lambda: True)
+
+@app.delete("/collections/{name}")
+async def delete_collection(name: str):
+    return respond(lambda: client.delete_collection(name))
+
+@app.put("/collections/{name}/index")
+async def create_index(name: str, request: Request):
+    body = models.CreateFieldIndex(**await request.json())
+    return respond(lambda: client.create_payload_index(name, body.field_name, body.field_schema))
+
+@app.put("/collections/{name}/points")
+async def upsert(name: str, request: Request):
+    data = await request.json()
+    body = models.PointsList(**data) if "points" in data else models.PointsBatch(**data)
+    points = body.points if isinstance(body, models.PointsList) else body.batch
+    return respond(lambda: client.upsert(name, points=points))
+
+@app.post("/collections/{name}/points")
+async def retrieve(name: str, request: Request):
+    body = models.PointRequest(**await request.json())
+    return respond(lambda: client.retrieve(
+        name, ids=body.ids, with_payload=body.with_payload, with_vectors=body.with_vector
+    ))
+
+@app.post("/collections/{name}/points/delete")
+async def delete_points(name: str, request: Request):
+    data = await request.json()
+    selector = models.PointIdsList(**data) if "points" in data else models.FilterSelector(**data)
+    return respond(lambda: client.delete(name, points_selector=selector))
+
+@app.post("/collections/{name}/points/payload")
+async def set_payload(name: str, request: Request):
+    body = models.SetPayload(**await request.json())
+    return respond(lambda: client.set_payload(name, payload=body.payload, points=body.points or body.filter))
+
+@app.post("/collections/{name}/points/count")
+async def count(name: str, request: Request):
+    body = models.CountRequest(**await request.json())
+    return respond(lambda: client.count(name, count_filter=body.filter, exact=body.exact))
+
+@app.post("/collections/{name}/points/scroll")
+async def scroll(name: str, request: Request):
+    body = models.ScrollRequest(**await request.json())
+    return respond(lambda: dict(zip(("points", "next_page_offset"), client.scroll(
+        name, scroll_filter=body.filter, limit=body.limit or 10, offset=body.offset,
+        with_payload=body.with_payload, with_vectors=body.with_vector
+    ))))
+
+def search_request(name: str, body: models.SearchRequest):
+    """Run one search against the in-memory backend."""
+    return client.search(
+        name,
+        query_vector=body.vector,
+        query_filter=body.filter,
+        limit=body.limit,
+        offset=body.offset or 0,
+        with_payload=body.with_payload,
+        with_vectors=body.with_vector or False,
+        score_threshold=body.score_threshold
+    )
+
+@app.post("/collections/{name}/points/search")
+async def search(name: str, request: Request):
+    body = models.SearchRequest(**await request.json())
+    return respond(lambda: search_request(name, body))
+
+@app.post("/collections/{name}/points/search/batch")
+async def search_batch(name: str, request: Request):
+    body = models.SearchRequestBatch(**await request.json())
+    return respond(lambda: [search_request(name, search) for search in body.searches])
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for a Qdrant server")
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on')
+    parser.add_argument('--port', type=int, default=6333, help='Port to listen on')
+    args = parser.parse_args()
+    
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
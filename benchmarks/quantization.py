@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Compare collection compression settings against the uncompressed baseline.
+Loads the same vectors into one collection per setting and reports the
+estimated vector memory, p50/p99 search latency and recall@k against an
+exact search. Quantization only takes effect on a real Qdrant server; the
+embedded modes and benchmarks/qdrant_standin.py accept and ignore it.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from typing import Dict, List
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, HnswConfigDiff, PointStruct, SearchParams, VectorParams
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import QDRANT_URL, QDRANT_API_KEY, QDRANT_TIMEOUT, COLLECTION_NAME
+from app.core.qdrant_collections import quantization_config, search_params
+
+COLLECTION = "benchmark_quantization"
+
+# Settings compared against the float32 baseline
+VARIANTS = [
+    {"quantization": "none", "on_disk": False, "m": 16, "ef_construct": 100, "oversampling": 1.0, "rescore": False},
+    {"quantization": "scalar", "on_disk": False, "m": 16, "ef_construct": 100, "oversampling": 1.0, "rescore": False},
+    {"quantization": "scalar", "on_disk": True, "m": 16, "ef_construct": 100, "oversampling": 2.0, "rescore": True},
+    {"quantization": "binary", "on_disk": True, "m": 16, "ef_construct": 100, "oversampling": 1.0, "rescore": False},
+    {"quantization": "binary", "on_disk": True, "m": 16, "ef_construct": 100, "oversampling": 3.0, "rescore": True},
+    {"quantization": "scalar", "on_disk": True, "m": 8, "ef_construct": 64, "oversampling": 2.0, "rescore": True},
+]
+
+def load_vectors(client: QdrantClient, source: str, points: int, dim: int) -> np.ndarray:
+    """Take vectors from an existing collection, or make clustered random ones like real embeddings."""
+    if source:
+        vectors, offset = [], None
+        while len(vectors) < points:
+            batch, offset = client.scroll(source, limit=256, offset=offset, with_vectors=True)
+            vectors.extend(point.vector for point in batch)
+            if offset is None:
+                break
+        return np.asarray(vectors[:points], dtype=np.float32)
+    
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, points // 100), dim))
+    vectors = centers[rng.integers(0, len(centers), points)] + 0.5 * rng.standard_normal((points, dim))
+    return vectors.astype(np.float32)
+
+def estimate_memory(points: int, dim: int, variant: Dict) -> Dict[str, int]:
+    """Estimate the bytes kept in RAM for the vectors and the HNSW graph."""
+    quantized = {"none": 0, "scalar": points * dim, "binary": points * dim // 8}[variant["quantization"]]
+    originals = 0 if variant["on_disk"] else points * dim * 4
+    graph = points * variant["m"] * 2 * 4
+    return {"vectors_bytes": originals + quantized, "graph_bytes": graph, "total_bytes": originals + quantized + graph}
+
+def build(client: QdrantClient, vectors: np.ndarray, variant: Dict):
+    """Recreate the benchmark collection with one variant's settings."""
+    client.recreate_collection(
+        COLLECTION,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE, on_disk=variant["on_disk"]),
+        hnsw_config=HnswConfigDiff(m=variant["m"], ef_construct=variant["ef_construct"]),
+        quantization_config=quantization_config(variant["quantization"], always_ram=True)
+    )
+    for start in range(0, len(vectors), 256):
+        client.upsert(COLLECTION, points=[
+            PointStruct(id=start + i, vector=vector.tolist()) for i, vector in enumerate(vectors[start:start + 256])
+        ])
+    # Let the server finish indexing so the search timings are steady
+    while client.get_collection(COLLECTION).status.value != "green":
+        time.sleep(0.5)
+
+def measure(client: QdrantClient, queries: np.ndarray, truth: List[set], k: int, variant: Dict) -> Dict:
+    """Search with one variant's search-time settings; return latency and recall."""
+    params = search_params(variant["quantization"], variant["rescore"], variant["oversampling"], hnsw_ef=0)
+    latencies, hits = [], 0
+    for vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = client.search(COLLECTION, query_vector=vector.tolist(), limit=k, search_params=params)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {point.id for point in results})
+    
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        f"recall@{k}": round(hits / (k * len(queries)), 4)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare collection compression settings against the uncompressed baseline")
+    parser.add_argument('--url', default=QDRANT_URL, help='Qdrant server URL')
+    parser.add_argument('--source', nargs='?', const=COLLECTION_NAME, help='Take vectors from this collection instead of random ones')
+    parser.add_argument('--points', type=int, default=20000, help='Number of vectors to load')
+    parser.add_argument('--dim', type=int, default=384, help='Vector dimension of random vectors')
+    parser.add_argument('--queries', type=int, default=200, help='Number of searches per setting')
+    parser.add_argument('--k', type=int, default=10, help='Results per search')
+    args = parser.parse_args()
+    
+    client = QdrantClient(url=args.url, api_key=QDRANT_API_KEY or None, timeout=QDRANT_TIMEOUT)
+    vectors = load_vectors(client, args.source, args.points, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    
+    results = []
+    truth = None
+    for variant in VARIANTS:
+        build(client, vectors, variant)
+        if truth is None:
+            # Ground truth is an exact search over the uncompressed vectors
+            truth = [
+                {point.id for point in client.search(COLLECTION, query_vector=vector.tolist(), limit=args.k, search_params=SearchParams(exact=True))}
+                for vector in queries
+            ]
+        results.append({**variant, **estimate_memory(len(vectors), vectors.shape[1], variant), **measure(client, queries, truth, args.k, variant)})
+    client.delete_collection(COLLECTION)
+    
+    print(json.dumps({
+        "url": args.url,
+        "source": args.source or "random",
+        "points": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "k": args.k,
+        "runs": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
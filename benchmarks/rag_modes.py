@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Compare the RAG answer pipelines.
+Runs the same conversations through "condense" mode and through "single"
+mode with each query rewrite, and reports per-stage latency and the answers
+side by side so their quality can be compared.
+"""
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.core.agent import AssistantAgent, QUERY_REWRITES
+from app.core.memory import MemoryManager
+
+SAMPLE_CONVERSATIONS = [
+    ["What documents do I have about the migration plan?", "Who owns the first step?", "When is it due?"],
+    ["What does error code E1042 mean?", "How do I fix that?"],
+]
+
+def load_conversations(input_path: str) -> List[List[str]]:
+    """Read conversations from a file: one question per line, blank lines between conversations."""
+    if not input_path:
+        return SAMPLE_CONVERSATIONS
+    
+    conversations = [[]]
+    with open(input_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                conversations[-1].append(line)
+            elif conversations[-1]:
+                conversations.append([])
+    return [conversation for conversation in conversations if conversation]
+
+def run_mode(rag_mode: str, query_rewrite: str, conversations: List[List[str]]) -> Dict:
+    """Answer every conversation with a fresh agent and collect timings and answers."""
+    stages: Dict[str, List[float]] = {}
+    transcripts = []
+    for conversation in conversations:
+        agent = AssistantAgent(MemoryManager(), rag_mode=rag_mode, query_rewrite=query_rewrite)
+        # Measure the pipeline itself, not the answer cache
+        agent.answer_cache = None
+        turns = []
+        for question in conversation:
+            response = agent.query(question)
+            for stage, seconds in response["timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+            turns.append({"question": question, "answer": response["answer"], "timings": response["timings"]})
+        transcripts.append(turns)
+    
+    return {
+        "rag_mode": rag_mode,
+        "query_rewrite": query_rewrite if rag_mode == "single" else None,
+        "mean_seconds": {stage: round(sum(values) / len(values), 4) for stage, values in stages.items()},
+        "conversations": transcripts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the RAG answer pipelines")
+    parser.add_argument('--input', help='File of questions, one per line, conversations separated by blank lines')
+    parser.add_argument('--rewrites', nargs='+', default=list(QUERY_REWRITES), choices=QUERY_REWRITES,
+                        help='Query rewrites to try in single mode')
+    args = parser.parse_args()
+    
+    conversations = load_conversations(args.input)
+    results = [run_mode("condense", "none", conversations)]
+    results.extend(run_mode("single", rewrite, conversations) for rewrite in args.rewrites)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
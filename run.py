@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import os
 import sys
+import signal
+import socket
 import argparse
 import subprocess
 
@@ -22,33 +24,136 @@ def setup_environment():
     os.makedirs('data/documents', exist_ok=True)
     os.makedirs('data/vector_db', exist_ok=True)
 
-def run_api():
+def run_api(workers=None, host="0.0.0.0", port=8000):
     """Run the FastAPI server."""
+    if workers and workers > 1:
+        run_api_workers(workers, host, port)
+        return
+    
     print("Starting API server...")
-    subprocess.run(["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000", "--reload"])
+    subprocess.run(["uvicorn", "app.main:app", "--host", host, "--port", str(port), "--reload"])
+
+def run_api_workers(workers, host="0.0.0.0", port=8000):
+    """Run several API worker processes on one port.
+    
+    The models are loaded once in this process before forking, so every
+    worker shares their memory copy-on-write instead of loading its own.
+    Clients, connections and threads are only created inside the workers.
+    """
+    import uvicorn
+    from app.config import QDRANT_MODE
+    from app.core.resources import get_resources
+    
+    if QDRANT_MODE != "remote":
+        print(f"Error: {workers} workers need QDRANT_MODE=remote; '{QDRANT_MODE}' mode can't be shared between processes.")
+        sys.exit(1)
+    
+    print(f"Loading models before starting {workers} workers...")
+    get_resources().preload()
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            server = uvicorn.Server(uvicorn.Config("app.main:app", host=host, port=port))
+            server.run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    
+    print(f"Started API workers {children} on http://{host}:{port}")
+    
+    def stop(signum, _frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
 
 def run_ui():
     """Run the Streamlit UI."""
     print("Starting Streamlit UI...")
     subprocess.run(["streamlit", "run", "app/ui/streamlit_app.py"])
 
+def run_ingest(directory, workers=None):
+    """Bulk-ingest a directory of documents into the knowledge base."""
+    from app.core.bulk_ingest import BulkIngestor
+    from app.core.memory import MemoryManager
+    
+    print(f"Ingesting documents from {directory}...")
+    ingestor = BulkIngestor(MemoryManager(), workers=workers)
+    summary = ingestor.ingest_directory(directory)
+    
+    print(f"Ingested {summary['ingested']} files ({summary['chunks']} chunks) in {summary['seconds']}s, "
+          f"skipped {summary['skipped']} already ingested, {len(summary['failed'])} failed")
+    for path, error in summary['failed'].items():
+        print(f"  {path}: {error}")
+
+def run_migrate():
+    """Rebuild the collections with the current collection settings, and the lexical index."""
+    from app.config import COLLECTION_NAME, CONVERSATION_COLLECTION_NAME, VECTOR_QUANTIZATION, VECTORS_ON_DISK, RETRIEVAL_MODE
+    from app.core.resources import get_resources
+    from app.core.memory import MemoryManager
+    from app.core.qdrant_collections import DOCUMENT_PAYLOAD_INDEXES, collection_exists, rebuild_collection, recover_rebuild
+    
+    client = get_resources().qdrant_client
+    print(f"Rebuilding collections with quantization={VECTOR_QUANTIZATION}, on_disk={VECTORS_ON_DISK}...")
+    for name, payload_indexes in ((COLLECTION_NAME, DOCUMENT_PAYLOAD_INDEXES), (CONVERSATION_COLLECTION_NAME, None)):
+        recovered = recover_rebuild(client, name)
+        if recovered:
+            print(f"  {name}: restored the alias to {recovered} left by an interrupted migration")
+        if not collection_exists(client, name):
+            print(f"  {name}: not found, skipped")
+            continue
+        
+        summary = rebuild_collection(
+            client, name, payload_indexes,
+            progress=lambda done, total: print(f"\r  {name}: {done}/{total} points", end="", flush=True)
+        )
+        print(f"\r  {name}: copied {summary['points']} points from {summary['from']} to {summary['to']} in {summary['seconds']}s")
+    
+    if RETRIEVAL_MODE == "hybrid":
+        indexed = MemoryManager().rebuild_lexical_index(progress=lambda done: print(f"\r  lexical index: {done} chunks", end="", flush=True))
+        print(f"\r  lexical index: {indexed} chunks indexed")
+
 def main():
     parser = argparse.ArgumentParser(description="Run the Personal AI Assistant")
     parser.add_argument('--api', action='store_true', help='Run the FastAPI server')
     parser.add_argument('--ui', action='store_true', help='Run the Streamlit UI')
+    parser.add_argument('--ingest', metavar='DIR', help='Bulk-ingest every document in a directory')
+    parser.add_argument('--workers', type=int, help='Number of parser processes for --ingest, or server processes for --api')
+    parser.add_argument('--port', type=int, default=8000, help='Port for the API server')
+    parser.add_argument('--migrate', action='store_true', help='Rebuild the collections and lexical index with the current settings')
     args = parser.parse_args()
     
     setup_environment()
     
     if args.api:
-        run_api()
+        run_api(args.workers, port=args.port)
     elif args.ui:
         run_ui()
+    elif args.ingest:
+        run_ingest(args.ingest, args.workers)
+    elif args.migrate:
+        run_migrate()
     else:
-        print("Please specify either --api or --ui")
+        print("Please specify either --api, --ui, --ingest or --migrate")
         print("Examples:")
-        print("  python run.py --api   # Run the API server")
-        print("  python run.py --ui    # Run the Streamlit UI")
+        print("  python run.py --api              # Run the API server")
+        print("  python run.py --api --workers 4  # Run 4 API workers (needs QDRANT_MODE=remote)")
+        print("  python run.py --ui               # Run the Streamlit UI")
+        print("  python run.py --ingest ./docs    # Bulk-ingest a directory of documents")
+        print("  python run.py --migrate          # Rebuild collections after changing collection settings")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
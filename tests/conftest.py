@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+import numpy as np
+import pytest
+
+# Keep every store the app opens away from ./data; set before app.config is imported
+DATA_DIR = tempfile.mkdtemp(prefix="assistant-tests-")
+os.environ.update({
+    "QDRANT_MODE": "memory",
+    "VECTOR_DB_PATH": os.path.join(DATA_DIR, "vector_db"),
+    "WARMUP_ON_STARTUP": "false",
+    "RERANK_ENABLED": "false"
+})
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain.embeddings.base import Embeddings
+from langchain.llms.base import LLM
+from app.core.resources import SharedResources, set_resources
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from the text, optionally slowed down."""
+    
+    def __init__(self, size: int = 16, delay: float = 0.0):
+        self.size = size
+        self.delay = delay
+    
+    def _vector(self, text: str):
+        rng = np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16))
+        vector = rng.standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+    
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return [self._vector(text) for text in texts]
+    
+    def embed_query(self, text):
+        return self._vector(text)
+
+class FakeLLM(LLM):
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+    
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs) -> str:
+        return "answer"
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+@pytest.fixture
+def resources(embeddings):
+    """Fresh shared resources with stand-in models and an in-memory Qdrant."""
+    resources = SharedResources(embeddings_factory=lambda: embeddings, llm_factory=FakeLLM)
+    set_resources(resources)
+    yield resources
+    resources.close()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.core.answer_cache import AnswerCache
+from app.core.manifest import IngestManifest
+
+def test_invalidation_reaches_caches_sharing_the_manifest(embeddings, tmp_path):
+    path = str(tmp_path / "manifest.db")
+    ingesting = AnswerCache(embeddings, similarity=1, manifest=IngestManifest(path))
+    serving = AnswerCache(embeddings, similarity=1, manifest=IngestManifest(path))
+    serving.put("what is in the report?", {"answer": "report"}, ["report.pdf"])
+    serving.put("what is in the memo?", {"answer": "memo"}, ["memo.pdf"])
+    serving.put("anything about rockets?", {"answer": "nothing found"}, [])
+    
+    # A change with no documents still reaches the other cache's answers without sources
+    ingesting.invalidate_sources([])
+    assert serving.get("anything about rockets?") is None
+    assert serving.get("what is in the report?") == {"answer": "report"}
+    
+    ingesting.invalidate_sources(["report.pdf"])
+    assert serving.get("what is in the report?") is None
+    assert serving.get("what is in the memo?") == {"answer": "memo"}
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.core.inference_client import CircuitBreaker, CircuitOpen, InferenceClient, InferenceError
+
+def make_client(handler, breaker: CircuitBreaker) -> InferenceClient:
+    client = InferenceClient(api_url="http://inference.test", max_retries=0, breaker=breaker)
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return client
+
+def test_rejected_trial_call_closes_the_circuit():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    
+    client = make_client(lambda request: httpx.Response(400, text="bad parameters"), breaker)
+    with pytest.raises(InferenceError, match="rejected"):
+        client.generate("prompt")
+    
+    # The service answered, so the trial is settled and the circuit is closed again
+    assert breaker.state == "closed"
+    client._client = httpx.Client(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json=[{"generated_text": "prompt\nanswer"}])
+    ))
+    assert client.generate("prompt") == "\nanswer"
+
+def test_unexpected_error_on_trial_call_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    
+    def handler(request):
+        raise RuntimeError("boom")
+    
+    client = make_client(handler, breaker)
+    with pytest.raises(RuntimeError):
+        client.generate("prompt")
+    
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    # A new trial call is let through once the cooldown has passed again
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
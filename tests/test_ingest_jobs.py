@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import COLLECTION_NAME
+from app.core.ingest_jobs import IngestJobQueue, IngestWorkers
+from app.core.ingestion import DocumentProcessor
+from app.core.memory import MemoryManager
+
+def write_version(directory, paragraphs):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "notes.txt")
+    with open(path, "w") as f:
+        f.write("\n\n".join(paragraphs))
+    return path
+
+def wait_for(jobs, job_ids, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        statuses = [jobs.get(job_id)["status"] for job_id in job_ids]
+        if all(status in ("done", "failed") for status in statuses):
+            return statuses
+        time.sleep(0.05)
+    raise TimeoutError(f"Jobs still unfinished: {statuses}")
+
+def stored_chunks(resources, original_name):
+    points, _ = resources.qdrant_client.scroll(COLLECTION_NAME, limit=1000, with_payload=True)
+    return {
+        str(point.id): point.payload["page_content"]
+        for point in points if point.payload["metadata"].get("original_name") == original_name
+    }
+
+def test_versions_of_one_upload_leave_only_the_latest(resources, embeddings, tmp_path):
+    # Slow enough that two unserialized jobs would both read the manifest before either commits
+    embeddings.delay = 0.2
+    shared = [f"Shared paragraph {i}. " + "unchanged text " * 60 for i in range(3)]
+    first = write_version(tmp_path / "v1", shared + [f"First only {i}. " + "old text " * 100 for i in range(3)])
+    second = write_version(tmp_path / "v2", shared + [f"Second only {i}. " + "new text " * 100 for i in range(3)])
+    
+    processor = DocumentProcessor(MemoryManager())
+    jobs = IngestJobQueue(str(tmp_path / "jobs.db"))
+    workers = IngestWorkers(jobs, processor, workers=2)
+    job_ids = [
+        workers.submit_file(first, {"original_name": "notes.txt"}),
+        workers.submit_file(second, {"original_name": "notes.txt"})
+    ]
+    workers.start()
+    try:
+        assert wait_for(jobs, job_ids) == ["done", "done"]
+    finally:
+        workers.stop()
+    
+    stored = stored_chunks(resources, "notes.txt")
+    assert set(stored) == set(processor.manifest.get_chunks("upload:notes.txt"))
+    assert set(stored) == set(jobs.get(job_ids[1])["ids"])
+    assert not any("First only" in text for text in stored.values())
+    assert sum("Second only" in text for text in stored.values()) == 3
+
+def test_claim_skips_sources_with_a_job_in_progress(tmp_path):
+    jobs = IngestJobQueue(str(tmp_path / "jobs.db"))
+    first = jobs.submit("file", {"path": "a"}, "upload:a.txt")
+    second = jobs.submit("file", {"path": "a"}, "upload:a.txt")
+    other = jobs.submit("file", {"path": "b"}, "upload:b.txt")
+    
+    claimed = jobs.claim()
+    assert claimed["id"] == first
+    # The second version waits for the first; other sources don't
+    assert jobs.claim()["id"] == other
+    assert jobs.claim() is None
+    
+    jobs.complete(first, claimed["lease"], [])
+    assert jobs.claim()["id"] == second
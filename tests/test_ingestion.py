@@ -0,0 +1,42 @@
+import io
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import COLLECTION_NAME
+from app.core import uploads
+from app.core.ingestion import DocumentProcessor
+from app.core.memory import MemoryManager
+from app.utils import helpers
+
+def test_reupload_moves_every_chunk_to_the_new_version(resources, tmp_path, monkeypatch):
+    documents_dir = str(tmp_path / "documents")
+    os.makedirs(documents_dir)
+    monkeypatch.setattr(helpers, "get_documents_dir", lambda: documents_dir)
+    monkeypatch.setattr(uploads, "get_documents_dir", lambda: documents_dir)
+    
+    paragraphs = [f"Paragraph {i}. " + "steady text " * 80 for i in range(5)]
+    processor = DocumentProcessor(MemoryManager())
+    metadata = {"original_name": "handbook.txt"}
+    
+    first_path, first_hash = uploads.save_upload(io.BytesIO("\n\n".join(paragraphs).encode()), "handbook.txt")
+    first_ids = processor.ingest_file(first_path, metadata, first_hash)
+    
+    # A small edit to the last paragraph leaves the other chunks unchanged
+    paragraphs[-1] = "Paragraph 4, revised. " + "steady text " * 80
+    second_path, second_hash = uploads.save_upload(io.BytesIO("\n\n".join(paragraphs).encode()), "handbook.txt")
+    second_ids = processor.ingest_file(second_path, metadata, second_hash)
+    
+    assert second_path != first_path
+    assert set(first_ids) & set(second_ids)
+    assert not os.path.exists(first_path)
+    
+    points, _ = resources.qdrant_client.scroll(COLLECTION_NAME, limit=1000, with_payload=True)
+    stored = [point.payload["metadata"] for point in points if point.payload["metadata"].get("original_name") == "handbook.txt"]
+    assert len(stored) == len(second_ids)
+    assert {metadata["source"] for metadata in stored} == {second_path}
+    assert len({metadata["ingested_at"] for metadata in stored}) == 1
+    
+    # The lexical index carries the same metadata
+    lexical = resources.lexical_index.search("steady text", k=20, filters={"original_name": "handbook.txt"})
+    assert {document.metadata["source"] for document, _ in lexical} == {second_path}